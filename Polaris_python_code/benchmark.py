@@ -0,0 +1,215 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+import polarislib
+from fake_polaris import FakePolaris, make_issue
+from sarif_builder import SarifBuilder, SarifWriter
+from provision_users import Provisioner
+
+# Benchmarks for polarislib and the SARIF conversion, run against a local
+# fake Polaris API (fake_polaris.py).
+#
+#     python benchmark.py --issues 20000 --latency 20 --repeat 3
+#     python benchmark.py --only getIssues,sarif --json before.json
+#
+# Every benchmark runs in a fresh process, so its peak RSS is its own. For
+# each one the median wall time, throughput (items per second), the number
+# of HTTP requests per run and the p50/p99 request latency are reported.
+
+# Benchmark functions take a context dict and return the number of items
+# they handled
+def bench_apigetitems(ctx):
+    return len(polarislib.apigetitems(ctx["session"], ctx["url"], "/api/findings/issues",
+      {"projectId": ctx["project_id"]}))
+
+def bench_getIssues(ctx):
+    return len(polarislib.getIssues(ctx["session"], ctx["url"], ctx["project_id"], None))
+
+# Only the issue parts the SARIF output needs, in pages of 500
+def bench_getIssuesSarif(ctx):
+    return len(polarislib.getIssues(ctx["session"], ctx["url"], ctx["project_id"], None,
+      pageSize=500, profile="sarif"))
+
+# Without dismissed and informational issues, filtered by the server
+def bench_getIssuesFiltered(ctx):
+    return len(polarislib.getIssues(ctx["session"], ctx["url"], ctx["project_id"], None,
+      pageSize=500, profile="sarif", skipDismissed=True, skipInformational=True))
+
+def bench_iterIssues(ctx):
+    count = 0
+    for issue in polarislib.iterIssues(ctx["session"], ctx["url"], ctx["project_id"], None):
+        count += 1
+    return count
+
+# Paginated through the broken "/users" next links
+def bench_getUsers(ctx):
+    return len(polarislib.getUsers(ctx["session"], ctx["url"]))
+
+def bench_sarif(ctx):
+    builder = SarifBuilder(ctx["portfolio_id"], ctx["application_id"], ctx["project_id"])
+    builder.add_issues(ctx["issues"])
+    json.dumps(builder.document(), indent=2)
+    return len(ctx["issues"])
+
+def bench_sarifWriter(ctx):
+    builder = SarifBuilder(ctx["portfolio_id"], ctx["application_id"], ctx["project_id"])
+    with tempfile.TemporaryDirectory() as tmp:
+        with SarifWriter(os.path.join(tmp, "polaris_issues.sarif"), builder) as writer:
+            for issue in ctx["issues"]:
+                writer.add_issue(issue)
+    return len(ctx["issues"])
+
+def bench_entitlements(ctx):
+    polarislib.getEntitlements(ctx["session"], ctx["url"])
+    polarislib.getExecutionMode(ctx["session"], ctx["url"])
+    return 1
+
+# 50 new applications per run; the entitlement lookups are cached after the first
+def bench_createApplication(ctx):
+    run = ctx.setdefault("runs", 0)
+    ctx["runs"] = run + 1
+    for n in range(50):
+        polarislib.createApplication(ctx["session"], ctx["url"], f"benchmark-{run}-{n}")
+    return 50
+
+def bench_triageBulk(ctx):
+    issueIds = [issue["id"] for issue in ctx["issues"]]
+    polarislib.setTriageBulk(ctx["session"], ctx["url"], issueIds, ctx["project_id"],
+      ctx["branch_id"], {"triageProperties": [{"key": "comment", "value": "benchmark"}]})
+    return len(issueIds)
+
+def bench_provision(ctx):
+    roster = [{"email": f"user{n}@example.com", "firstName": "User", "lastName": str(n),
+               "role": "Observer", "groups": [f"group-{n % 20}"],
+               "applications": {ctx["application_id"]: "Application Observer"}}
+              for n in range(ctx["users"])]
+    with contextlib.redirect_stdout(io.StringIO()):
+        Provisioner(ctx["session"], ctx["url"], rate=10000).provision(roster)
+    return len(roster)
+
+BENCHMARKS = {
+    "apigetitems": bench_apigetitems,
+    "getIssues": bench_getIssues,
+    "getIssuesSarif": bench_getIssuesSarif,
+    "getIssuesFiltered": bench_getIssuesFiltered,
+    "iterIssues": bench_iterIssues,
+    "getUsers": bench_getUsers,
+    "sarif": bench_sarif,
+    "sarifWriter": bench_sarifWriter,
+    "entitlements": bench_entitlements,
+    "createApplication": bench_createApplication,
+    "triageBulk": bench_triageBulk,
+    "provision": bench_provision,
+}
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+# Run one benchmark "repeat" times (in a child process)
+def run_benchmark(name, settings, queue):
+    session = polarislib.createSession(settings["url"], "benchmark-token")
+    latencies = []
+    polarislib.addRequestHook(
+        lambda method, api, status, seconds, size, attempt: latencies.append(seconds))
+    ctx = dict(settings, session=session,
+               issues=[make_issue(n) for n in range(settings["issues"])])
+    times = []
+    items = 0
+    try:
+        for _ in range(settings["repeat"]):
+            polarislib.setLookupCache(polarislib.LookupCache())
+            start = time.perf_counter()
+            items = BENCHMARKS[name](ctx)
+            times.append(time.perf_counter() - start)
+    except Exception as e:
+        queue.put({"name": name, "error": f"{type(e).__name__}: {e}"})
+        return
+    seconds = statistics.median(times)
+    queue.put({
+        "name": name,
+        "items": items,
+        "seconds": seconds,
+        "itemsPerSecond": items / seconds if seconds else None,
+        "requests": len(latencies) / settings["repeat"],
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "peakRssMb": peak_rss_mb(),
+    })
+
+def print_report(results):
+    print(f"{'benchmark':<17} {'items':>8} {'median s':>9} {'items/s':>10} "
+          f"{'requests':>8} {'p50 ms':>7} {'p99 ms':>7} {'peak MB':>8}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['name']:<17} FAILED: {r['error']}")
+            continue
+        p50 = f"{r['p50'] * 1000:7.1f}" if r["p50"] is not None else f"{'-':>7}"
+        p99 = f"{r['p99'] * 1000:7.1f}" if r["p99"] is not None else f"{'-':>7}"
+        print(f"{r['name']:<17} {r['items']:>8} {r['seconds']:>9.3f} "
+              f"{r['itemsPerSecond']:>10.0f} {r['requests']:>8.0f} {p50} {p99} "
+              f"{r['peakRssMb']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark polarislib against a fake Polaris API.")
+    parser.add_argument("--issues", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=100,
+        help="Largest page the fake server returns (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+        help="Milliseconds the fake server adds to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+        help="Share of requests failing with a retryable 503")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", help="Comma separated benchmarks: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to PATH")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}")
+
+    # Children are spawned (not forked) so they do not share the server's memory
+    mp = multiprocessing.get_context("spawn")
+    results = []
+    with FakePolaris(args.issues, args.users, page_size=args.page_size,
+                     latency=args.latency / 1000, error_rate=args.error_rate) as server:
+        settings = {
+            "url": server.url, "repeat": args.repeat, "issues": args.issues,
+            "users": args.users, "portfolio_id": server.portfolio_id,
+            "application_id": server.application_id, "project_id": server.project_id,
+            "branch_id": server.branch_id,
+        }
+        for name in names:
+            queue = mp.Queue()
+            child = mp.Process(target=run_benchmark, args=(name, settings, queue))
+            child.start()
+            result = queue.get()
+            child.join()
+            results.append(result)
+        print_report(results)
+        print(f"\nServer: {server.requests} requests, {server.errors} injected failures")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,292 +1,327 @@
-import requests
+import argparse
+import os
 import sys
-import json
-import re
+import jsoncodec
+from concurrent.futures import ThreadPoolExecutor
 
-#Added functions from polarislib.py to avoid import issues (now we dont need polarislib.py)
-def getresp(session, api, params=None, headers=None):
-    if params == None:
-        params = {}
-    if headers == None:
-        headers = {}
-    response = session.get(api, params=params, headers=headers)
-    if (response.status_code >= 300):
-        print("ERROR: GET failed: ", api)
-        print("Response: ", response)
-        try: 
-            print(response.json())
-        except: 
-            print("No json data returned")
-        sys.exit(1)
-    return(response.json())
+from polarislib import (createSession, iterIssues, getPortfolioProjects, setHttpCache,
+    enableMetrics, PortfolioIndex, PolarisError, PolarisNotFoundError,
+    MAX_PAGE_WORKERS, ISSUE_PROFILES)
+from issue_sync import sync_issues, has_changes, load_state, save_state
+from sarif_builder import (SarifBuilder, SarifWriter, ShardedSarifWriter, sarif_outputs,
+    ShardLimitError, MAX_SHARDS, RULE_MODES, SPLIT_BY)
+from issue_store import write_store
 
-def getNextAndFirst(links):
-    nextlink = None
-    firstlink = None
-    for l in links:
-        if l['rel'] == 'next':
-            nextlink = l['href']
-        if l['rel'] == 'first':
-            firstlink = l['href']
-    return nextlink, firstlink
+# Number of projects extracted at the same time in portfolio mode
+DEFAULT_PROJECT_WORKERS = 4
 
-def fixAuthUrl(url, nextUrl):
-    regex = re.escape(url) + r'/users(.*)'
-    match = re.match(regex, nextUrl)
-    if match is None: 
-        return(nextUrl)
-    fixedUrl =  url + "/api/auth/users" + match.group(1)
-    return fixedUrl
+# Write one element of a JSON array so the file ends up byte-identical to
+# json.dump(list, f, indent=2), without holding the whole list in memory
+def write_json_item(f, item, first):
+    f.write("[\n  " if first else ",\n  ")
+    f.write(jsoncodec.dumps(item, indent=2).replace("\n", "\n  "))
 
-def apigetitems(session, url, endpoint, params=None, headers=None):
-    if params == None:
-        params = {}
-    api = url+endpoint
-    json = getresp(session, api, params, headers)
-    
-    data = json['_items']
-    nextpage, firstpage = getNextAndFirst(json['_links'])
-    while nextpage:
-        if nextpage == firstpage:
-            
-            return(data)
-        nextpage = fixAuthUrl(url, nextpage)
-        json = getresp(session, nextpage)
-       
-        data.extend(json['_items'])
-        nextpage, firstpage = getNextAndFirst(json['_links'])
-    return(data)
+# Stream issues (any iterable) to a JSON dump. Returns the number written.
+def write_json(path, issues):
+    count = 0
+    with open(path, "w") as f:
+        for issue in issues:
+            write_json_item(f, issue, count == 0)
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count
 
-def getIssues(session, url, pid, params=None):
-    if params is None:
-        params = {}
-    params['projectId'] = pid
-    params['_includeIssueProperties'] = 'true'
-    params['_includeType'] = 'true'
-    params['_includeTriageProperties'] = 'true'
-    params['_includeOccurrenceProperties'] = 'true'
-    params['_includeContext'] = 'true' 
-    resp = apigetitems(session, url, "/api/findings/issues", params)
-    try:
-        return(resp)
-    except:
-        print(f"ERROR: No issues found")
-        sys.exit(1)
+# Options that change the output files for the same issues. --incremental
+# records them in the sync state and rewrites the outputs when they change.
+OUTPUT_OPTIONS = ("store", "compact", "gzip", "rule_mode", "max_results",
+                  "max_bytes", "split_by", "shards")
 
-def createSession(url, token):
-    headers = {'API-TOKEN': token}
-    s = requests.Session()
-    s.headers.update(headers)
-    return s
+def output_options(options, category):
+    return dict({name: getattr(options, name) for name in OUTPUT_OPTIONS},
+                category=category)
 
-def fetch_projects(session, url, portfolio_id, limit=100):
-    endpoint = f"/api/portfolios/{portfolio_id}/projects?_limit={limit}"
-    headers = {
-        "accept": "application/vnd.polaris.portfolios.projects-1+json"
-    }
-    response = session.get(url + endpoint, headers=headers)
-    if response.status_code != 200:
-        print("Failed to fetch projects:", response.status_code)
-        print(response.text)
-        sys.exit(1)
-    return response.json()
+# The SARIF writer for the output options: one file, gzipped or not, or
+# shards within the --max-results/--max-bytes budget
+def sarif_writer(sarif_path, builder, options, category):
+    if options.max_results or options.max_bytes or options.split_by or options.shards:
+        return ShardedSarifWriter(sarif_path, builder, options.max_results,
+            options.max_bytes, options.split_by, options.compact, options.gzip,
+            category, options.shards)
+    if options.gzip:
+        sarif_path += ".gz"
+    return SarifWriter(sarif_path, builder, options.compact, options.gzip)
 
 
-def main():
-    if len(sys.argv) < 4:
-        print("Usage: python extract_findings.py <polaris_url> <api_token> <portfolio_id> [project_id]")
-        sys.exit(1)
-
-    url = sys.argv[1]
-    token = sys.argv[2]
-    portfolio_id = sys.argv[3]
-
-    session = createSession(url, token)
-    projects_data = fetch_projects(session, url, portfolio_id)
-    projects = projects_data.get('_items', [])
-    if not projects:
-        print("No projects found.")
-        sys.exit(1)
-
-    if len(sys.argv) > 4:
-        project_id = sys.argv[4]
-    else:
-        project_id = projects[0].get('id')
-
-    project_ids = [proj.get('id') for proj in projects]
-    if project_id not in project_ids:
-        print(f"Invalid project_id {project_id}. Not found in available projects.")
-        sys.exit(1)
-    selected_proj = next(proj for proj in projects if proj.get('id') == project_id)
+# Fetch every issue of one project and write its issue dump and SARIF file.
+# Output files are named issues_output<suffix>.json (or .zip with
+# --store) and polaris_issues<suffix>.sarif.
+# With --incremental the fetch goes through issue_sync.py: outputs are left
+# untouched when neither the issues nor the output options changed since the
+# last sync.
+def extract_project(session, url, portfolio_id, selected_proj, suffix, options):
+    project_id = selected_proj.get('id')
     project_name = selected_proj.get('name')
-    
+    issues_path = f"issues_output{suffix}" + (".zip" if options.store else ".json")
+    sarif_path = f"polaris_issues{suffix}.sarif"
+    state_path = f"issues_state{suffix}.json" if options.incremental else None
+
     # Extract application ID for building issue links
     application_id = selected_proj.get('application', {}).get('id')
     if not application_id:
         print(f"Error: No application ID found for project '{project_name}'. Please check the project Id input")
-        sys.exit(1) 
+        sys.exit(1)
+
+    # Every project of a multi-project run needs categories of its own
+    category = options.category and options.category + suffix
+    outputs = output_options(options, category)
+
+    fetch_options = {"pageSize": options.page_size, "profile": options.profile}
+    if options.server_filter:
+        fetch_options.update(skipDismissed=True, skipInformational=True)
+    if state_path:
+        previous_outputs = load_state(state_path).get("outputs")
+        issues, changes, state = sync_issues(session, url, project_id,
+            issues_path, state_path, options.since_filter, fetch_options)
+        state["outputs"] = outputs
+        print(f"\n'{project_name}': {len(changes['added'])} new, "
+              f"{len(changes['changed'])} changed, "
+              f"{len(changes['removed'])} removed issues since last sync")
+        if previous_outputs != outputs:
+            print("Output options changed, rewriting the outputs")
+        elif not has_changes(changes) and sarif_outputs(sarif_path):
+            print(f"No changes, keeping {issues_path} and {sarif_path}")
+            save_state(state_path, state)
+            return
+    else:
+        issues = iterIssues(session, url, project_id, None, **fetch_options)
 
     # Remove old output files if they exist
-    import os
-    json_path = "issues_output.json"
-    sarif_path = "polaris_issues.sarif"
-    for path in [json_path, sarif_path]:
+    for path in [issues_path] + sarif_outputs(sarif_path):
         if os.path.exists(path):
             os.remove(path)
 
-    # Fetch issues from the selected project
-    issues = getIssues(session, url, project_id, None)
-    print(f"\nFound {len(issues)} issues for project '{project_name}':")
-    with open(json_path, "w") as f:
-        json.dump(issues, f, indent=2)
-    print(f"Issues written to {json_path}")
+    builder = SarifBuilder(portfolio_id, application_id, project_id,
+                           rule_mode=options.rule_mode,
+                           automation_id=category and f"{category}/")
 
-    # Build SARIF file in the requested format
-    sarif = {
-        "version": "2.1.0",
-        "runs": [{
-            "tool": {
-                "driver": {
-                    "name": "DAST-Scanner",
-                    "rules": []
-                }
-            },
-            "artifacts": [],
-            "results": []
-        }]
-    }
+    write_issues = write_store if options.store else write_json
+    writer = sarif_writer(sarif_path, builder, options, category)
+    try:
+        if options.jobs > 1 and isinstance(writer, SarifWriter):
+            # Store the issues first, then convert them from disk in parallel
+            issue_count = write_issues(issues_path, issues)
+            with writer:
+                writer.add_dump(issues_path, options.jobs)
+        else:
+            # Fetch issues from the selected project. Issues are streamed page
+            # by page: each one is stored and converted to SARIF as it arrives.
+            with writer:
+                def converted(issues):
+                    for issue in issues:
+                        writer.add_issue(issue)
+                        yield issue
+                issue_count = write_issues(issues_path, converted(issues))
+    except ShardLimitError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"\nFound {issue_count} issues for project '{project_name}':")
+    print(f"Issues written to {issues_path}")
+    sarif_paths = writer.paths if isinstance(writer, ShardedSarifWriter) else [writer.path]
+    for path in sarif_paths:
+        print(f"SARIF file written to {path}")
+    if state_path:
+        save_state(state_path, state)
 
-    rule_id_map = {}  # Map rule_id to ruleIndex
-    artifact_map = {}  # Map file_path to artifact index
-    rules = sarif["runs"][0]["tool"]["driver"]["rules"]
-    artifacts = sarif["runs"][0]["artifacts"]
-    results = sarif["runs"][0]["results"]
 
-    for issue in issues:
-        # Skip dismissed issues
-        triage_props = issue.get("triageProperties", [])
-        is_dismissed = False
-        for prop in triage_props:
-            if prop.get("key") == "is-dismissed" and prop.get("value") is True:
-                is_dismissed = True
-                break
-        if is_dismissed:
-            continue
+# ID of the project named "Application/Project", or just "Project" if that
+# name is unique in the portfolio. None if there is no such project.
+def project_by_name(index, name):
+    application, sep, project = name.rpartition("/")
+    try:
+        if sep:
+            return index.projectId(index.applicationId(application), project)
+    except PolarisNotFoundError:
+        return None
+    matches = [proj['id'] for proj in index.projectList() if proj['name'] == name]
+    if len(matches) > 1:
+        print(f"Project name {name} is ambiguous, use 'Application/{name}' or the project ID.")
+        sys.exit(1)
+    return matches[0] if matches else None
 
-        # Skip informational severity and extract needed properties
-        occurrence_props = issue.get("occurrenceProperties", [])
-        is_informational = False
-        severity = None
-        cwe = None
-        overall_score = None
-        for prop in occurrence_props:
-            if prop.get("key") == "severity":
-                severity = str(prop.get("value", ""))
-                if severity.lower() == "informational":
-                    is_informational = True
-            elif prop.get("key") == "cwe":
-                cwe = prop.get("value")
-            elif prop.get("key") == "overall-score":
-                overall_score = prop.get("value")
-        if is_informational:
-            continue
+# Pick the projects to extract from the portfolio project list.
+# selection is a single project, a comma separated list of them, "all", or
+# None for the first project in the portfolio. Projects are given by ID, or
+# by name through resolve(name) -> ID (see project_by_name).
+def select_projects(projects, selection, resolve=None):
+    if selection is None:
+        return projects[:1]
+    if selection == "all":
+        return projects
+    by_id = {proj.get('id'): proj for proj in projects}
+    selected = []
+    for project_id in selection.split(","):
+        project_id = project_id.strip()
+        if project_id not in by_id and resolve is not None:
+            project_id = resolve(project_id) or project_id
+        if project_id not in by_id:
+            print(f"Invalid project_id {project_id}. Not found in available projects.")
+            sys.exit(1)
+        selected.append(by_id[project_id])
+    return selected
 
-        # Use issue ID as rule id, but include CWE in rule name if present
-        rule_id = str(issue.get("id", "PolarisIssueID"))[:255]
-        issue_type = issue.get("type", {})
-        base_rule_name = issue_type.get("altName", "Polaris Issue")
-        rule_name = f"{base_rule_name} ({cwe})" if cwe else base_rule_name
-        description = None
-        localized = issue_type.get("_localized", {})
-        if isinstance(localized, dict):
-            other_details = localized.get("otherDetails", [])
-            if isinstance(other_details, list):
-                for detail in other_details:
-                    if detail.get("key") == "description":
-                        description = detail.get("value")
-                        break
 
-        # Use a human-readable message
-        message = issue.get("message")
-        if not message:
-            message = rule_name
+def run(args):
+    url = args.url
+    portfolio_id = args.portfolio_id
+    workers = max(1, args.workers)
+    if args.http_cache:
+        setHttpCache(args.http_cache)
 
-        location = issue.get("location", {})
-        file_path = location.get("filePath", "POLARIS")
-        line = location.get("line", 1)
-        logical_name = issue.get("function", None) or issue.get("logicalLocation", None)
+    # One session (and connection pool) shared by every project; big enough
+    # for each project worker to prefetch its pages concurrently
+    session = createSession(url, args.token, poolSize=workers * MAX_PAGE_WORKERS,
+                            http2=args.http2)
+    projects = getPortfolioProjects(session, url, portfolio_id)
+    if not projects:
+        print("No projects found.")
+        sys.exit(1)
 
-        # Add artifact if not already present
-        if file_path not in artifact_map:
-            artifact_index = len(artifacts)
-            artifact_map[file_path] = artifact_index
-            artifacts.append({
-                "location": {
-                    "uri": file_path,
-                    "uriBaseId": "SRCROOT"
-                },
-                "sourceLanguage": "python"
-            })
-        else:
-            artifact_index = artifact_map[file_path]
+    # Project names are looked up in a portfolio index, only built (in bulk)
+    # when the selection has a name in it
+    index = None
+    def resolve(name):
+        nonlocal index
+        if index is None:
+            index = PortfolioIndex(session, url, portfolioId=portfolio_id)
+        return project_by_name(index, name)
+    selected = select_projects(projects, args.project_id, resolve)
 
-        # Add rule if not already present
-        if rule_id not in rule_id_map:
-            rule_index = len(rules)
-            rule_id_map[rule_id] = rule_index
-            
-            # Build direct link to the specific issue in Polaris
-            issue_url = f"https://eu.polaris.blackduck.com/portfolio/portfolios/{portfolio_id}/portfolio-items/{application_id}/projects/{project_id}/issues/{rule_id}?filter=triage%3Astatus%3Dnot-dismissed%2Cto-be-fixed"
-            
-            rule_entry = {
-                "id": rule_id,
-                "name": rule_name,
-                "shortDescription": {
-                    "text": rule_name
-                },
-                "fullDescription": {
-                    "text": (description if description else rule_name)
-                },
-                "helpUri": issue_url,
-                "help": {
-                    "text": "Detailed explanation of the issue.",
-                    "markdown": f"[View issue details in Polaris]({issue_url}) \n {(description if description else rule_name)}"
-                }
-            }
-            if overall_score is not None:
-                rule_entry["properties"] = {"security-severity": str(overall_score)}
-            rules.append(rule_entry)
-        else:
-            rule_index = rule_id_map[rule_id]
+    # A single project keeps the historical file names, several projects get
+    # one pair of files each, named after the project ID
+    if len(selected) == 1:
+        extract_project(session, url, portfolio_id, selected[0], "", args)
+        return
+    # A failing project does not stop the others: their outputs are still
+    # written, and the run fails at the end
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(extract_project, session, url, portfolio_id, proj,
+                       f"_{proj.get('id')}", args)
+                   for proj in selected]
+        for proj, future in zip(selected, futures):
+            try:
+                future.result()
+            except SystemExit:
+                # extract_project printed why
+                failed.append(proj)
+            except PolarisError as e:
+                print(f"ERROR: Project '{proj.get('name')}': {e}")
+                failed.append(proj)
+    if failed:
+        print(f"ERROR: {len(failed)} of {len(selected)} projects failed: "
+              + ", ".join(str(proj.get('id')) for proj in failed))
+        sys.exit(1)
 
-       
 
-        result = {
-            "ruleId": rule_id,
-            "ruleIndex": rule_index,
-            "message": {
-                "text": message
-            },
-            "locations": [{
-                "physicalLocation": {
-                    "artifactLocation": {
-                        "uri": file_path,
-                        "uriBaseId": "SRCROOT",
-                        "index": artifact_index
-                    },
-                    "region": {
-                        "startLine": line
-                    }
-                }
-            }],
-        
-        }
-        if logical_name:
-            result["locations"][0]["logicalLocations"] = [{"fullyQualifiedName": logical_name}]
-        results.append(result)
-    with open(sarif_path, "w") as f:
-        json.dump(sarif, f, indent=2)
-    print("SARIF file written to polaris_issues.sarif")
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract Polaris issues to JSON and SARIF.")
+    parser.add_argument("url", help="Polaris URL")
+    parser.add_argument("token", help="Polaris API token")
+    parser.add_argument("portfolio_id", help="Portfolio ID")
+    parser.add_argument("project_id", nargs="?",
+        help="Project ID or 'Application/Project' name, a comma separated "
+             "list of them, or 'all' for every project in the portfolio "
+             "(default: first project)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_PROJECT_WORKERS,
+        help="Number of projects extracted in parallel (default: %(default)s)")
+    parser.add_argument("--incremental", action="store_true",
+        help="Keep a sync state file next to the outputs and only rewrite them "
+             "when issues were added, changed or removed, or the output "
+             "options (--compact, --gzip, --max-results, ...) changed. Without "
+             "--since-filter all issues are still downloaded on every run")
+    parser.add_argument("--since-filter",
+        help="With --incremental: RSQL filter template selecting issues changed "
+             "since the last sync, e.g. 'context.date=gt={since}'. Only those "
+             "are fetched and merged into the stored issues")
+    parser.add_argument("--compact", action="store_true",
+        help="Write the SARIF file without indentation")
+    parser.add_argument("--rule-mode", choices=RULE_MODES, default="issue",
+        help="One SARIF rule per 'issue' or per issue 'type'. 'type' writes "
+             "each description once and keeps the Polaris issue links in the "
+             "result properties, for much smaller files (default: %(default)s)")
+    parser.add_argument("--gzip", action="store_true",
+        help="Gzip the SARIF output (polaris_issues.sarif.gz)")
+    parser.add_argument("--max-results", type=int,
+        help="Split the SARIF output into files of at most this many results, "
+             "each with its own rules (polaris_issues-001.sarif, ...). Issues "
+             "are assigned to files by a hash of their ID. Without --shards "
+             "the number of files grows as needed, moving about half the "
+             "issues to new files, and code scanning categories, each time")
+    parser.add_argument("--shards", type=int,
+        help="Split the SARIF output into this many files (per --split-by "
+             "group), so every issue keeps its file and code scanning "
+             "category between runs. Fails if a file would break "
+             "--max-results/--max-bytes")
+    parser.add_argument("--max-bytes", type=int,
+        help="Split the SARIF output into files of at most this many "
+             "(uncompressed) bytes")
+    parser.add_argument("--category",
+        help="Code scanning category of the SARIF output (automationDetails.id); "
+             "split output gets '<category>/<file>/' per file, and with several "
+             "projects '_<project ID>' is appended to it "
+             "(default: none, split output: the file name)")
+    parser.add_argument("--split-by", choices=SPLIT_BY,
+        help="Also split the SARIF output by issue severity or by top-level "
+             "directory of the issue files. Split output is converted in one "
+             "process per project, --jobs only applies to unsplit output")
+    parser.add_argument("--store", action="store_true",
+        help="Write the issues to a compressed issue store (issues_output.zip, "
+             "see issue_store.py) instead of issues_output.json")
+    parser.add_argument("--http-cache", metavar="DIR",
+        help="Keep GET responses in DIR and revalidate them with ETag / "
+             "Last-Modified on later runs (also: POLARIS_HTTP_CACHE)")
+    parser.add_argument("--http2", action="store_true",
+        help="Talk HTTP/2 to the API, multiplexing the concurrent page fetches "
+             "over one connection. Experimental, not benchmarked "
+             "(needs: pip install 'httpx[http2]')")
+    parser.add_argument("--jobs", type=int, default=1,
+        help="Processes converting the issues to SARIF, per project. Above 1 "
+             "the issues are written first and converted from disk (default: %(default)s)")
+    parser.add_argument("--page-size", type=int,
+        help="Issues per API page (default: the server's)")
+    parser.add_argument("--profile", choices=list(ISSUE_PROFILES), default="full",
+        help="Issue parts to request: 'sarif' only fetches what the SARIF "
+             "output needs, so issues_output.json lacks the rest "
+             "(default: %(default)s)")
+    parser.add_argument("--server-filter", action="store_true",
+        help="Leave dismissed and informational issues out of the fetch (the "
+             "SARIF output skips them anyway), filtered by the server where it "
+             "can; issues_output.json then lacks them too")
+    parser.add_argument("--metrics", metavar="PATH",
+        help="Write a JSON summary of the API requests (per endpoint counts, "
+             "latency, bytes, retries, pages) to PATH at the end of the run")
+    parser.add_argument("--openmetrics", metavar="PATH",
+        help="Write the same request metrics to PATH in OpenMetrics text format")
+    args = parser.parse_args()
+    if args.shards is not None and not 1 <= args.shards <= MAX_SHARDS:
+        parser.error(f"--shards must be between 1 and {MAX_SHARDS}")
+    metrics = enableMetrics() if args.metrics or args.openmetrics else None
+    try:
+        run(args)
+    except PolarisError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        # Also written for failed runs, where they matter most
+        if args.metrics:
+            metrics.writeJson(args.metrics)
+        if args.openmetrics:
+            metrics.writeOpenMetrics(args.openmetrics)
+        if metrics:
+            summary = metrics.summary()
+            print(f"{summary['requests']} API requests ({summary['retries']} retries), "
+                  f"{summary['bytes']} bytes received")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,456 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode, unquote
+
+# Local stand-in for the parts of the Polaris API used by polarislib, for
+# benchmark.py and for trying scripts out without a tenant.
+#
+# Collections answer with "_items", "_links" (first/next) and
+# "_collection.itemCount", paginated with _offset/_limit like the real API.
+# The user listing hands out the broken "next" links (without "/api/auth")
+# that polarislib.fixAuthUrl repairs. GET answers carry an ETag and a
+# matching If-None-Match gets 304 Not Modified. Latency, the largest page
+# size and a share of failing requests (503 with Retry-After: 0) can be
+# configured.
+#
+#     with FakePolaris(issues=10000, latency=0.02) as server:
+#         session = createSession(server.url, "token")
+#         getIssues(session, server.url, server.project_id, None)
+#
+# Or stand-alone: python fake_polaris.py --port 8080 --issues 5000
+
+PORTFOLIO_ID = "portfolio-1"
+APPLICATION_ID = "application-1"
+PROJECT_ID = "project-1"
+BRANCH_ID = "branch-1"
+TENANT_ID = "tenant-1"
+
+SEVERITIES = ["critical", "high", "medium", "low", "informational"]
+
+# Bulk triage filter, and the limits of one bulk triage request
+TRIAGE_FILTER = re.compile(r"issueProperties:family-id=in=\((.*)\)$")
+MAX_TRIAGE_FAMILIES = 500
+MAX_TRIAGE_FILTER_LENGTH = 16000
+
+# Like real issues, every issue has a type.id of its own; issues of the same
+# kind share weaknessId and the type names and descriptions
+def make_issue(n):
+    kind = n % 40
+    return {
+        "id": f"issue-{n:08d}",
+        "weaknessId": f"weakness-{kind}",
+        "type": {
+            "id": f"type-{n:08d}",
+            "altName": f"Issue type {kind}",
+            "_localized": {
+                "name": f"Issue type {kind}",
+                "otherDetails": [
+                    {"key": "description", "value": f"Description of issue type {kind}. " * 8},
+                    {"key": "remediation", "value": f"How to fix issue type {kind}. " * 16},
+                ],
+            },
+        },
+        "occurrenceProperties": [
+            {"key": "severity", "value": SEVERITIES[n % len(SEVERITIES)]},
+            {"key": "cwe", "value": f"CWE-{79 + kind}"},
+            {"key": "overall-score", "value": round(1 + (n % 90) / 10, 1)},
+        ],
+        "triageProperties": [
+            {"key": "is-dismissed", "value": n % 17 == 0},
+            {"key": "status", "value": "not-dismissed"},
+        ],
+        "location": {"filePath": f"src/module_{n % 250}.py", "line": 1 + n % 400},
+        "context": {
+            "_links": [{
+                "href": f"/api/portfolios/{PORTFOLIO_ID}/applications/{APPLICATION_ID}"
+                        f"/projects/{PROJECT_ID}",
+                "rel": "context",
+            }],
+        },
+        "_cursor": f"cursor-{n}",
+    }
+
+def make_user(n):
+    return {"id": f"user-{n}", "email": f"user{n}@example.com",
+            "firstName": "User", "lastName": str(n)}
+
+def make_group(n):
+    return {"id": f"group-{n}", "name": f"group-{n}"}
+
+ROLES = [{"id": f"role-{name}", "name": name}
+         for name in ("Tenant Admin", "Contributor", "Observer")]
+ENTITLEMENTS = [{"id": "entitlement-1", "executionMode": "parallel", "isActive": True}]
+SUBSCRIPTIONS = [{"id": "subscription-1", "isActive": True}]
+APP_ROLES = [{"id": f"app-role-{name}", "name": name}
+             for name in ("Application Administrator", "Application Contributor",
+                          "Application Observer")]
+
+
+class FakePolaris:
+    def __init__(self, issues=1000, users=200, groups=20, page_size=100,
+                 latency=0.0, error_rate=0.0, seed=0, host="127.0.0.1", port=0):
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.issues = [make_issue(n) for n in range(issues)]
+        self.users = [make_user(n) for n in range(users)]
+        self.groups = [make_group(n) for n in range(groups)]
+        self.group_users = {group["id"]: [] for group in self.groups}
+        # user id -> global role id (users start as Observer), and
+        # (application id, application role id) -> user ids
+        self.user_roles = {}
+        self.app_role_users = {}
+        self.applications = [{"id": APPLICATION_ID, "name": "Application 1"}]
+        # RSQL terms answered with 400 Bad Request, like a server that
+        # does not support filtering on them
+        self.unsupported_filters = set()
+        # Issue families selected by each bulk triage request
+        self.triage_requests = []
+        self.requests = 0
+        self.errors = 0
+        self.portfolio_id = PORTFOLIO_ID
+        self.application_id = APPLICATION_ID
+        self.project_id = PROJECT_ID
+        self.branch_id = BRANCH_ID
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_port}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Whether the next request fails (counting it either way)
+    def fail(self):
+        with self.lock:
+            self.requests += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+            return False
+
+    # GET routes: path pattern -> function(match) returning the item list, or
+    # a single object for non-collection resources
+    def collections(self):
+        project = {"id": PROJECT_ID, "name": "Project 1",
+                   "application": {"id": APPLICATION_ID}}
+        return [
+            (r"/api/portfolio/portfolios", lambda m: [{"id": PORTFOLIO_ID}]),
+            (r"/api/portfolio/portfolios/[^/]+/portfolio-items",
+                lambda m: self.applications),
+            (r"/api/portfolio/portfolio-items/[^/]+/portfolio-sub-items",
+                lambda m: [project]),
+            (r"/api/portfolio/portfolio-sub-items/[^/]+/branches",
+                lambda m: [{"id": BRANCH_ID, "name": "main", "isDefault": True}]),
+            (r"/api/portfolios/[^/]+/projects", lambda m: [project]),
+            (r"/api/findings/issues", lambda m: self.issues),
+            (r"/api/(?:ciam|auth)/users", lambda m: self.users),
+            (r"/api/ciam/users/(?P<user>[^/]+)/roles",
+                lambda m: [role for role in ROLES if role["id"] == self.user_role(
+                    m.group("user"))]),
+            (r"/api/ciam/groups", lambda m: self.groups),
+            (r"/api/ciam/groups/(?P<group>[^/]+)/users",
+                lambda m: [{"userId": user_id}
+                           for user_id in self.group_users.get(m.group("group"), [])]),
+            (r"/api/ciam/roles", lambda m: ROLES),
+            (r"/api/ciam/resources/applications/roles", lambda m: APP_ROLES),
+            (r"/api/ciam/openid-connect/userinfo",
+                lambda m: {"sub": "user-0", "email": "user0@example.com",
+                           "organization": {"id": TENANT_ID, "name": "Tenant 1"}}),
+            (r"/api/entitlement-service/tenants/[^/]+/entitlements",
+                lambda m: ENTITLEMENTS),
+            (r"/api/entitlement-service/tenants/[^/]+/subscriptions",
+                lambda m: SUBSCRIPTIONS),
+        ]
+
+    def user_role(self, user_id):
+        return self.user_roles.get(user_id, ROLES[2]["id"])
+
+    def user_exists(self, user_id):
+        return any(user["id"] == user_id for user in self.users)
+
+    def handler(self):
+        fake = self
+        routes = [(re.compile(pattern + "$"), fn) for pattern, fn in self.collections()]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            # Headers and body go out in separate writes: without this,
+            # Nagle's algorithm holds the body back until the client's
+            # delayed ACK of the headers (~40 ms per response)
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def send(self, status, obj=None, headers=()):
+                body = json.dumps(obj).encode() if obj is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            # Shared start of every request: latency, error injection and
+            # reading the body. Returns False if the request was answered.
+            def begin(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.body = self.rfile.read(length) if length else b""
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.fail():
+                    self.send(503, {"detail": "injected failure"}, [("Retry-After", "0")])
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self.begin():
+                    return
+                parts = urlsplit(self.path)
+                query = dict(parse_qsl(parts.query))
+                for pattern, fn in routes:
+                    match = pattern.match(parts.path)
+                    if match:
+                        break
+                else:
+                    return self.send(404, {"detail": f"no route for {parts.path}"})
+                rsql = query.get("_filter", "")
+                if any(term in rsql for term in fake.unsupported_filters):
+                    return self.send(400, {"detail": f"unsupported filter {rsql}"})
+                items = fn(match)
+                if not isinstance(items, dict):
+                    items = self.page(parts.path, query, items)
+                etag = '"%s"' % hashlib.sha1(
+                    json.dumps(items, sort_keys=True).encode()).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send(304, headers=[("ETag", etag)])
+                self.send(200, items, [("ETag", etag)])
+
+            def page(self, path, query, items):
+                items = filter_items(items, query.get("_filter"))
+                if "name" in query:
+                    # The portfolio item listings also filter with ?name=
+                    items = [item for item in items if item.get("name") == query["name"]]
+                offset = int(query.get("_offset", 0))
+                limit = min(int(query.get("_limit", fake.page_size)), fake.page_size)
+
+                def link(rel, start):
+                    href_path = path
+                    if path in ("/api/ciam/users", "/api/auth/users"):
+                        # The real user listing links to "/users" without the
+                        # "/api/auth" prefix
+                        href_path = "/users"
+                    return {"rel": rel, "href": fake.url + href_path + "?" + urlencode(
+                        dict(query, _offset=start, _limit=limit))}
+                links = [link("first", 0)]
+                if offset + limit < len(items):
+                    links.append(link("next", offset + limit))
+                page_items = items[offset:offset + limit]
+                if path == "/api/findings/issues":
+                    page_items = [project_issue(issue, query) for issue in page_items]
+                return {
+                    "_items": page_items,
+                    "_links": links,
+                    "_collection": {
+                        "itemCount": len(items),
+                        "pageCount": (len(items) + limit - 1) // limit,
+                    },
+                }
+
+            def do_POST(self):
+                if not self.begin():
+                    return
+                path = unquote(urlsplit(self.path).path)
+                data = json.loads(self.body or b"{}")
+                with fake.lock:
+                    if path == "/api/ciam/users":
+                        user = make_user(len(fake.users))
+                        user["email"] = data.get("email", user["email"])
+                        if any(other["email"].lower() == user["email"].lower()
+                               for other in fake.users):
+                            return self.send(409, {"detail": "user exists"})
+                        fake.users.append(user)
+                        return self.send(201, user)
+                    match = re.match(r"/api/ciam/users/([^/]+)/roles$", path)
+                    if match:
+                        if not fake.user_exists(match.group(1)):
+                            return self.send(404, {"detail": "no such user"})
+                        fake.user_roles[match.group(1)] = data["roles"][0]["id"]
+                        return self.send(204)
+                    match = re.match(r"/api/ciam/resources/applications/([^/]+)"
+                                     r"/roles/([^/]+)/users$", path)
+                    if match:
+                        if not all(fake.user_exists(user_id) for user_id in data["userIds"]):
+                            return self.send(404, {"detail": "no such user"})
+                        fake.app_role_users.setdefault(match.groups(), set()).update(
+                            data["userIds"])
+                        return self.send(204)
+                    if path == "/api/ciam/groups":
+                        if any(group["name"] == data.get("name") for group in fake.groups):
+                            return self.send(409, {"detail": "group exists"})
+                        group = {"id": f"group-{len(fake.groups)}", "name": data.get("name")}
+                        fake.groups.append(group)
+                        fake.group_users[group["id"]] = []
+                        return self.send(201, group)
+                    if re.match(r"/api/portfolio/portfolios/[^/]+/portfolio-items$", path):
+                        if any(app["name"] == data.get("name") for app in fake.applications):
+                            return self.send(409, {"detail": "application exists"})
+                        application = {"id": f"application-{len(fake.applications) + 1}",
+                                       "name": data.get("name")}
+                        fake.applications.append(application)
+                        return self.send(201, application)
+                self.send(204)
+
+            def do_PATCH(self):
+                if not self.begin():
+                    return
+                path = unquote(urlsplit(self.path).path)
+                match = re.match(r"/api/ciam/groups/([^/]+)/users$", path)
+                if match:
+                    with fake.lock:
+                        entries = json.loads(self.body or b"[]")
+                        if match.group(1) not in fake.group_users or not all(
+                                fake.user_exists(entry["userId"]) for entry in entries):
+                            return self.send(404, {"detail": "no such group or user"})
+                        members = fake.group_users[match.group(1)]
+                        for entry in entries:
+                            if entry["userId"] not in members:
+                                members.append(entry["userId"])
+                    return self.send(200, {})
+                if path == "/api/specialization-layer-service/issue-families":
+                    return self.triage(dict(parse_qsl(urlsplit(self.path).query)))
+                self.send(404, {"detail": f"no route for {path}"})
+
+            # Bulk triage: set the triage properties of the issues whose
+            # family (the issue ID here) the filter selects
+            def triage(self, query):
+                if query.get("projectId") != PROJECT_ID or query.get("branchId") != BRANCH_ID:
+                    return self.send(404, {"detail": "no such project or branch"})
+                data = json.loads(self.body or b"{}")
+                match = TRIAGE_FILTER.match(data.get("filter", ""))
+                if not match:
+                    return self.send(400, {"detail": "unsupported filter"})
+                families = re.findall(r"'([^']*)'", match.group(1))
+                if (len(families) > MAX_TRIAGE_FAMILIES
+                        or len(data["filter"]) > MAX_TRIAGE_FILTER_LENGTH):
+                    return self.send(400, {"detail": "too many issue families"})
+                with fake.lock:
+                    fake.triage_requests.append(families)
+                    wanted = set(families)
+                    for issue in fake.issues:
+                        if issue["id"] in wanted:
+                            set_properties(issue["triageProperties"],
+                                           data.get("triageProperties", []))
+                self.send(200, {"count": len(families)})
+
+        return Handler
+
+
+# Issue fields only sent when their _include flag is set, and that flag
+ISSUE_INCLUDE_FIELDS = {
+    "type": "_includeType",
+    "triageProperties": "_includeTriageProperties",
+    "occurrenceProperties": "_includeOccurrenceProperties",
+    "context": "_includeContext",
+}
+
+# Update or add key/value properties
+def set_properties(properties, updates):
+    for update in updates:
+        for prop in properties:
+            if prop["key"] == update["key"]:
+                prop["value"] = update["value"]
+                break
+        else:
+            properties.append(dict(update))
+
+def project_issue(issue, query):
+    return {key: value for key, value in issue.items()
+            if ISSUE_INCLUDE_FIELDS.get(key) is None
+            or query.get(ISSUE_INCLUDE_FIELDS[key]) == "true"}
+
+# The subset of RSQL filters polarislib sends: "key==value" terms joined
+# by ";" (email==..., search=="...", name==...), and "==" / "!=" terms on
+# issue properties ("triageProperties:is-dismissed==false"). Anything else
+# is ignored.
+def filter_items(items, rsql):
+    if not rsql:
+        return items
+    for term in rsql.split(";"):
+        term = term.strip("()")
+        negate = "!=" in term
+        key, sep, value = term.partition("!=" if negate else "==")
+        if not sep or "." in key:
+            continue
+        value = value.strip('"')
+        if ":" in key:
+            items = [item for item in items
+                     if (property_value(item, key) == value) != negate]
+            continue
+        if key == "search":
+            key = "name"
+        items = [item for item in items if rsql_text(item.get(key)) == value]
+    return items
+
+# How a value is spelled in RSQL: booleans in lower case
+def rsql_text(value):
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+# "occurrenceProperties:severity" -> the value of that property, as RSQL text
+def property_value(item, key):
+    group, _, name = key.partition(":")
+    for prop in item.get(group, ()):
+        if prop.get("key") == name:
+            value = prop.get("value")
+            return rsql_text(value)
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Polaris API.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--issues", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0,
+        help="Seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+        help="Share of requests failing with 503")
+    args = parser.parse_args()
+    server = FakePolaris(args.issues, args.users, page_size=args.page_size,
+                         latency=args.latency, error_rate=args.error_rate,
+                         port=args.port)
+    print(f"Fake Polaris API on {server.url} (portfolio {server.portfolio_id}, "
+          f"project {server.project_id})")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,20 @@
-import requests
 import sys
 import json
 
-def createSession(url, token):
-    headers = {'API-TOKEN': token}
-    s = requests.Session()
-    s.headers.update(headers)
-    return s
+from polarislib import createSession, getPortfolioProjects, PolarisError
 
-def fetch_projects(session, url, limit=100):
-    endpoint = f"/api/portfolios/074b4f38-ece1-4091-aa9e-637925491dbc/projects?_limit={limit}"
-    headers = {
-        "accept": "application/vnd.polaris.portfolios.projects-1+json"
-    }
-    response = session.get(url + endpoint, headers=headers)
-    if response.status_code != 200:
-        print("Failed to fetch projects:", response.status_code)
-        print(response.text)
-        sys.exit(1)
-    return response.json()
+PORTFOLIO_ID = "074b4f38-ece1-4091-aa9e-637925491dbc"
 
-if __name__ == "__main__":
+def main():
     polaris_url = "https://eu.polaris.blackduck.com"
     api_token = input("Enter your Polaris API token: ").strip()
     session = createSession(polaris_url, api_token)
-    projects_data = fetch_projects(session, polaris_url)
-    projects = projects_data.get('_items', [])
+    # Goes through polarislib so POLARIS_HTTP_CACHE can serve unchanged lists
+    try:
+        projects = getPortfolioProjects(session, polaris_url, PORTFOLIO_ID)
+    except PolarisError as e:
+        print("Failed to fetch projects:", e)
+        sys.exit(1)
     if not projects:
         print("No projects found.")
         sys.exit(1)
@@ -35,3 +24,5 @@ if __name__ == "__main__":
         print(json.dumps(proj, indent=2))
         print("-" * 50)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import json
+import os
+
+import jsoncodec
+
+# Incremental reader for issues_output.json dumps.
+#
+# json.load needs the whole dump (and every issue in it) in memory before the
+# first issue can be used. iter_json_issues walks the top-level array instead
+# and decodes one issue at a time from a sliding read buffer, so memory use is
+# bounded by the largest single issue, not by the size of the dump.
+#
+# The localized details of an issue type (type._localized.otherDetails) are
+# by far its biggest part. Pass details=() to drop them, or a collection of
+# detail keys to keep only those, e.g. details=("description",) for the SARIF
+# conversion.
+#
+#     for issue in iter_json_issues("issues_output.json", details=("description",)):
+#         ...
+#
+# split_json_dump cuts a dump into byte ranges of whole issues that can be
+# decoded independently (read_json_range), e.g. by several processes.
+
+# Characters read from the file at a time
+CHUNK_SIZE = 1 << 20
+
+WHITESPACE = " \t\n\r"
+# Characters that can follow an element of the top-level array
+DELIMITERS = WHITESPACE + ",]"
+
+# In a dump written with indent=2 (extract_findings.py, json.dump) only the
+# top-level issues start and end on a line indented by exactly two spaces,
+# and JSON strings cannot contain raw newlines, so this only matches between
+# two issues
+DUMP_HEAD = b"[\n  {"
+ISSUE_SEPARATOR = b"\n  },\n  {"
+
+# Trim type._localized.otherDetails of an issue in place (see above)
+def prune_details(issue, details):
+    localized = (issue.get("type") or {}).get("_localized")
+    if not isinstance(localized, dict) or "otherDetails" not in localized:
+        return issue
+    if not details:
+        del localized["otherDetails"]
+    elif isinstance(localized["otherDetails"], list):
+        localized["otherDetails"] = [detail for detail in localized["otherDetails"]
+                                     if detail.get("key") in details]
+    return issue
+
+# Yield the elements of the top-level JSON array in path, one at a time.
+# details=None keeps every issue as it was written, see prune_details.
+def iter_json_issues(path, details=None, chunk_size=CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        # Position of the next non-whitespace character, reading more as
+        # needed; None at the end of the file
+        def next_token():
+            nonlocal buffer, pos, eof
+            while True:
+                while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if eof:
+                    return None
+                buffer = f.read(chunk_size)
+                pos = 0
+                eof = not buffer
+
+        if next_token() != "[":
+            raise ValueError(f"{path}: not a JSON array")
+        pos += 1
+        if next_token() == "]":
+            return
+        read_size = chunk_size
+        while True:
+            if next_token() is None:
+                raise ValueError(f"{path}: unexpected end of file")
+            try:
+                issue, end = decoder.raw_decode(buffer, pos)
+                # A bare number may go on in the next chunk, and one cut off
+                # after "1." or "1e" decodes as 1: only take it when the
+                # element visibly ends here
+                if not eof and (end == len(buffer) or (
+                        isinstance(issue, (int, float))
+                        and buffer[end] not in DELIMITERS)):
+                    raise json.JSONDecodeError("Incomplete value", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Incomplete element: grow the buffer and try again. The read
+                # size doubles so a huge element is not decoded over and over.
+                more = f.read(read_size)
+                read_size *= 2
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            read_size = chunk_size
+            pos = end
+            if details is not None:
+                prune_details(issue, details)
+            yield issue
+            token = next_token()
+            if token == "]":
+                return
+            if token != ",":
+                raise ValueError(f"{path}: expected ',' or ']' between issues")
+            pos += 1
+            # Drop what has been decoded so the buffer does not grow
+            if pos > chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+# Split a dump into at most parts byte ranges, each holding whole issues
+# separated by commas. Returns a list of (start, end) offsets, or None if the
+# file is not an indent=2 dump and has to be read with iter_json_issues.
+def split_json_dump(path, parts, chunk_size=CHUNK_SIZE):
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if f.read(len(DUMP_HEAD)) != DUMP_HEAD:
+            return None
+        f.seek(max(0, size - 64))
+        tail = f.read().rstrip()
+        if not tail.endswith(b"]"):
+            return None
+        end = size - 64 + len(tail) - 1 if size > 64 else len(tail) - 1
+
+        ranges = []
+        start = 1
+        for part in range(1, parts):
+            offset = max(start, part * size // parts)
+            f.seek(offset)
+            window = b""
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                window += data
+                found = window.find(ISSUE_SEPARATOR)
+                if found >= 0:
+                    break
+                # Keep enough to match a separator cut in two
+                offset += len(window) - len(ISSUE_SEPARATOR) + 1
+                window = window[-(len(ISSUE_SEPARATOR) - 1):]
+            if not data:
+                break
+            comma = offset + found + len(b"\n  }")
+            if comma >= end:
+                break
+            ranges.append((start, comma))
+            start = comma + 1
+        ranges.append((start, end))
+    return ranges
+
+# Decode the issues in a byte range from split_json_dump
+def read_json_range(path, start, end, details=None):
+    with open(path, "rb") as f:
+        f.seek(start)
+        issues = jsoncodec.loads(b"[" + f.read(end - start) + b"]")
+    if details is not None:
+        for issue in issues:
+            prune_details(issue, details)
+    return issues
@@ -0,0 +1,258 @@
+import jsoncodec
+import zipfile
+
+from issue_loader import iter_json_issues, prune_details
+
+# Compact local store for fetched issues, as an alternative to the
+# pretty-printed issues_output.json dump.
+#
+# The store is a zip file (deflate compressed) with one member per part:
+#   meta.json       format version and issue count
+#   types.jsonl     table of the distinct issue "type" objects (with their
+#                   long localized descriptions), one per line. The fields
+#                   that differ per issue of a type (see TYPE_OWN_FIELDS) are
+#                   left as null here and kept in the row instead
+#   contexts.jsonl  table of the distinct "context" objects, one per line
+#   col-<name>.json one column per scan field (see SCAN_COLUMNS), as a JSON
+#                   array with one value per issue
+#   rows.jsonl      every issue, one per line, with "context" replaced by
+#                   its index in the table above and "type" by a list of its
+#                   table index followed by the issue's own type fields
+#
+# Filtered scans (severity, CWE, dismissed, ...) only read the small column
+# members; full issues are only decoded for the rows that are asked for.
+#
+#     write_store("issues_output.zip", issues)
+#     store = IssueStore("issues_output.zip")
+#     for issue in store.issues(store.scan(severity="high", dismissed=False)):
+#         ...
+
+FORMAT_VERSION = 2
+
+# Scan columns, and how to read them from an issue
+def _occurrence(key):
+    def get(issue):
+        for prop in issue.get("occurrenceProperties", ()):
+            if prop.get("key") == key:
+                return prop.get("value")
+        return None
+    return get
+
+def _dismissed(issue):
+    for prop in issue.get("triageProperties", ()):
+        if prop.get("key") == "is-dismissed":
+            return prop.get("value") is True
+    return False
+
+SCAN_COLUMNS = {
+    "id": lambda issue: issue.get("id"),
+    "weaknessId": lambda issue: issue.get("weaknessId"),
+    "typeName": lambda issue: (issue.get("type") or {}).get("altName"),
+    "severity": _occurrence("severity"),
+    "cwe": _occurrence("cwe"),
+    "overall-score": _occurrence("overall-score"),
+    "dismissed": _dismissed,
+}
+
+# Objects deduplicated into lookup tables
+TABLES = ("type", "context")
+
+# Fields of an issue "type" that are specific to the issue rather than its
+# type: the ID (unique per issue in Polaris) and the localized details
+# written about this particular finding ("Cookie dtCookie is not Secure")
+TYPE_OWN_FIELDS = ("id",)
+TYPE_OWN_DETAILS = ("additional-information",)
+
+
+def _table_member(name):
+    return f"{name}s.jsonl"
+
+def _column_member(name):
+    return f"col-{name}.json"
+
+def _key(obj):
+    return jsoncodec.dumps(obj, sort_keys=True)
+
+def _own_details(issue_type):
+    localized = issue_type.get("_localized")
+    if isinstance(localized, dict) and isinstance(localized.get("otherDetails"), list):
+        return localized
+    return None
+
+# (shared, own) parts of an issue type: shared is the type with its own
+# fields set to null, own the list of their values in a fixed order
+def _split_type(issue_type):
+    if not isinstance(issue_type, dict):
+        return issue_type, []
+    shared = dict(issue_type)
+    own = []
+    for name in TYPE_OWN_FIELDS:
+        if name in shared:
+            own.append(shared[name])
+            shared[name] = None
+    localized = _own_details(shared)
+    if localized is not None:
+        details = []
+        for detail in localized["otherDetails"]:
+            if isinstance(detail, dict) and detail.get("key") in TYPE_OWN_DETAILS:
+                own.append(detail.get("value"))
+                detail = dict(detail, value=None)
+            details.append(detail)
+        shared["_localized"] = dict(localized, otherDetails=details)
+    return shared, own
+
+# Inverse of _split_type. Copies shared, which other issues refer to as well.
+def _join_type(shared, own):
+    if not isinstance(shared, dict):
+        return shared
+    issue_type = dict(shared)
+    own = iter(own)
+    for name in TYPE_OWN_FIELDS:
+        if name in issue_type:
+            issue_type[name] = next(own)
+    localized = _own_details(issue_type)
+    if localized is not None:
+        details = []
+        for detail in localized["otherDetails"]:
+            if isinstance(detail, dict) and detail.get("key") in TYPE_OWN_DETAILS:
+                detail = dict(detail, value=next(own))
+            details.append(detail)
+        issue_type["_localized"] = dict(localized, otherDetails=details)
+    return issue_type
+
+
+# Write issues (any iterable, consumed once) to a store at path.
+# Returns the number of issues written.
+def write_store(path, issues):
+    # per table: key -> index, and the entries as written (in index order,
+    # with their original key order)
+    tables = {name: {} for name in TABLES}
+    entries = {name: [] for name in TABLES}
+    columns = {name: [] for name in SCAN_COLUMNS}
+    count = 0
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("rows.jsonl", "w", force_zip64=True) as rows:
+            for issue in issues:
+                for name, get in SCAN_COLUMNS.items():
+                    columns[name].append(get(issue))
+                row = dict(issue)
+                for name in TABLES:
+                    if name in row:
+                        value, own = row[name], None
+                        if name == "type":
+                            value, own = _split_type(value)
+                        table = tables[name]
+                        key = _key(value)
+                        index = table.get(key)
+                        if index is None:
+                            index = table[key] = len(table)
+                            entries[name].append(jsoncodec.dumps(value))
+                        row[name] = index if own is None else [index] + own
+                rows.write(jsoncodec.dumps(row).encode("utf-8"))
+                rows.write(b"\n")
+                count += 1
+        for name in TABLES:
+            zf.writestr(_table_member(name), "".join(
+                entry + "\n" for entry in entries[name]))
+        for name, values in columns.items():
+            zf.writestr(_column_member(name), jsoncodec.dumps(values))
+        zf.writestr("meta.json", jsoncodec.dumps({
+            "version": FORMAT_VERSION,
+            "count": count,
+            "columns": list(SCAN_COLUMNS),
+            "tables": list(TABLES),
+        }))
+    return count
+
+
+class IssueStore:
+    def __init__(self, path):
+        self.path = path
+        self.zf = zipfile.ZipFile(path)
+        self.meta = jsoncodec.loads(self.zf.read("meta.json"))
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported issue store version "
+                             f"{self.meta.get('version')}")
+        self.columns = {}
+        self.tables = {}
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def close(self):
+        self.zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # All values of one scan column, in issue order
+    def column(self, name):
+        if name not in self.columns:
+            if name not in self.meta["columns"]:
+                raise KeyError(f"{name} is not a stored column")
+            self.columns[name] = jsoncodec.loads(self.zf.read(_column_member(name)))
+        return self.columns[name]
+
+    def table(self, name):
+        if name not in self.tables:
+            with self.zf.open(_table_member(name)) as f:
+                self.tables[name] = [jsoncodec.loads(line) for line in f]
+        return self.tables[name]
+
+    # Row numbers of the issues matching every given condition. A condition
+    # is a column name with either a single value or a list/set/tuple of
+    # accepted values, e.g. scan(severity=["high", "critical"], dismissed=False).
+    # String comparisons are case-insensitive.
+    def scan(self, **conditions):
+        rows = range(len(self))
+        for name, wanted in conditions.items():
+            if not isinstance(wanted, (list, set, tuple, frozenset)):
+                wanted = (wanted,)
+            accepted = {_fold(value) for value in wanted}
+            values = self.column(name)
+            rows = [row for row in rows if _fold(values[row]) in accepted]
+        return list(rows)
+
+    # Yield the issues at the given row numbers (all issues if rows is None),
+    # in store order, rebuilt exactly as they were written
+    def issues(self, rows=None):
+        wanted = None if rows is None else set(rows)
+        tables = {name: self.table(name) for name in self.meta["tables"]}
+        with self.zf.open("rows.jsonl") as f:
+            for row_number, line in enumerate(f):
+                if wanted is not None and row_number not in wanted:
+                    continue
+                issue = jsoncodec.loads(line)
+                for name, table in tables.items():
+                    if name in issue:
+                        if name == "type":
+                            index, *own = issue[name]
+                            issue[name] = _join_type(table[index], own)
+                        else:
+                            issue[name] = table[issue[name]]
+                yield issue
+
+    def __iter__(self):
+        return self.issues()
+
+
+def _fold(value):
+    return value.lower() if isinstance(value, str) else value
+
+def is_store(path):
+    return zipfile.is_zipfile(path)
+
+# Yield every issue from either an issue store or a JSON dump, one at a time.
+# details trims the localized type details, see issue_loader.prune_details.
+def iter_issues(path, details=None):
+    if is_store(path):
+        with IssueStore(path) as store:
+            for issue in store.issues():
+                if details is not None:
+                    prune_details(issue, details)
+                yield issue
+    else:
+        yield from iter_json_issues(path, details)
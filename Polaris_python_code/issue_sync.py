@@ -0,0 +1,143 @@
+import hashlib
+import jsoncodec
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from polarislib import iterIssues, skipIssue
+from issue_store import iter_issues
+
+# Incremental issue sync for extract_findings.py
+#
+# The state file remembers, per project, a content hash for every issue and
+# the time of the last successful sync. On the next run the freshly fetched
+# issues are compared against it, so the caller knows whether anything was
+# added, changed or removed and can skip rewriting outputs when nothing was.
+#
+# If the API can narrow the fetch down to recently changed issues, pass an
+# RSQL filter template with a "{since}" placeholder (for example
+# "context.date=gt={since}"). Only matching issues are then downloaded and
+# merged into the previously stored issue set. Issues that disappear
+# server-side cannot be seen that way, so run without a filter now and then
+# to pick up removals. Without a filter every run downloads all issues; the
+# sync then only saves rewriting unchanged outputs.
+#
+# Issues are not held in memory: they are hashed on the way into a temporary
+# spool file, which the returned iterator reads back. Only the hashes, and
+# in delta mode the (small) set of changed issues, stay in memory.
+
+# Keys that change on every fetch without the issue itself changing
+VOLATILE_KEYS = ("_cursor",)
+
+def now_timestamp():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+def issue_hash(issue):
+    content = {k: v for k, v in issue.items() if k not in VOLATILE_KEYS}
+    return hashlib.sha1(
+        jsoncodec.dumps(content, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {"lastSync": None, "hashes": {}}
+    with open(path) as f:
+        return jsoncodec.load(f)
+
+def save_state(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        jsoncodec.dump(state, f)
+    os.replace(tmp_path, path)
+
+def load_stored_issues(path):
+    if not os.path.exists(path):
+        return []
+    return iter_issues(path)
+
+# Yield the issues written to spool (an open temporary file, one JSON issue
+# per line) and close it
+def read_spool(spool):
+    try:
+        spool.seek(0)
+        for line in spool:
+            yield jsoncodec.loads(line)
+    finally:
+        spool.close()
+
+# Fetch the issues of a project and diff them against the last sync.
+# Arguments:
+#  - session, url, project_id: as for polarislib.iterIssues
+#  - store_path: previously written issue dump or store (issues_output.json/.zip)
+#  - state_path: state file of this project
+#  - since_filter: optional RSQL template for delta fetching, see above
+#  - fetch_options: optional keyword arguments for iterIssues (pageSize,
+#    profile, include, skipDismissed, skipInformational). Keep them the same
+#    between runs: a different include set changes the issue hashes, and
+#    filtered out issues count as removed.
+# Returns:
+#  - (issues, changes, state): an iterator over the full, merged issue set
+#    in server order (read it once; it no longer depends on store_path, which
+#    may be overwritten meanwhile), a dict with the "added", "changed" and
+#    "removed" issue IDs, and the new state to hand to save_state once the
+#    outputs have been written
+def sync_issues(session, url, project_id, store_path, state_path, since_filter=None,
+                fetch_options=None):
+    state = load_state(state_path)
+    old_hashes = state.get("hashes", {})
+    sync_started = now_timestamp()
+
+    delta = since_filter is not None and state.get("lastSync") is not None \
+        and os.path.exists(store_path)
+    params = None
+    fetch_options = dict(fetch_options or {})
+    if delta:
+        params = {"_filter": since_filter.format(since=state["lastSync"])}
+        # The delta has to include issues that were dismissed since the last
+        # sync, so they are filtered out after the merge instead
+        skip = (fetch_options.pop("skipDismissed", False),
+                fetch_options.pop("skipInformational", False))
+
+    fetched = iterIssues(session, url, project_id, params, **fetch_options)
+    if delta:
+        issues = merge_delta(load_stored_issues(store_path), fetched)
+        if any(skip):
+            issues = (issue for issue in issues if not skipIssue(issue, *skip))
+    else:
+        issues = fetched
+
+    hashes = {}
+    changes = {"added": [], "changed": [], "removed": []}
+    spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+    try:
+        for issue in issues:
+            issue_id = issue.get("id")
+            hashes[issue_id] = issue_hash(issue)
+            if issue_id not in old_hashes:
+                changes["added"].append(issue_id)
+            elif old_hashes[issue_id] != hashes[issue_id]:
+                changes["changed"].append(issue_id)
+            spool.write(jsoncodec.dumps(issue))
+            spool.write("\n")
+    except BaseException:
+        spool.close()
+        raise
+    changes["removed"] = [issue_id for issue_id in old_hashes
+                          if issue_id not in hashes]
+
+    new_state = {"lastSync": sync_started, "hashes": hashes}
+    return read_spool(spool), changes, new_state
+
+# Merge the changed issues (the delta fetch) into the stored ones, keeping
+# the stored order; new issues come last. Only the delta is held in memory.
+def merge_delta(stored, fetched):
+    fetched = list(fetched)
+    fetched_by_id = {issue.get("id"): issue for issue in fetched}
+    for issue in stored:
+        yield fetched_by_id.pop(issue.get("id"), issue)
+    for issue in fetched:
+        if issue.get("id") in fetched_by_id:
+            yield issue
+
+def has_changes(changes):
+    return any(changes[kind] for kind in ("added", "changed", "removed"))
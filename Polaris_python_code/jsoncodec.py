@@ -0,0 +1,59 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON encoding and decoding for polarislib and the scripts.
+#
+# Uses orjson when it is installed (pip install orjson) and the standard
+# library json module otherwise. Both give the same results: anything orjson
+# does not handle the way json does (non-ASCII text, which json escapes,
+# integers beyond 64 bits, non-string keys, ...) is handed to json instead.
+# What is left: floats that json writes in exponent form are spelled
+# differently (1e-05 vs 0.00001, same value), and NaN/Infinity, which are not
+# valid JSON, are written as null.
+#
+# Set POLARIS_JSON=json to always use the standard library.
+
+BACKEND = "orjson" if orjson is not None and \
+    os.environ.get("POLARIS_JSON", "orjson") != "json" else "json"
+
+JSONDecodeError = json.JSONDecodeError
+
+# Decode a str or bytes JSON document
+def loads(data):
+    if BACKEND == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Let json decide (and report) what orjson rejects
+            pass
+    return json.loads(data)
+
+# Encode obj as a str: compact (no whitespace) by default, or like
+# json.dumps(obj, indent=2) with indent=2. sort_keys sorts object keys.
+def dumps(obj, indent=None, sort_keys=False):
+    if BACKEND == "orjson" and indent in (None, 2):
+        option = 0
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            text = orjson.dumps(obj, option=option)
+        except (TypeError, orjson.JSONEncodeError):
+            text = None
+        if text is not None and text.isascii():
+            return text.decode("ascii")
+    if indent is None:
+        return json.dumps(obj, separators=(",", ":"), sort_keys=sort_keys)
+    return json.dumps(obj, indent=indent, sort_keys=sort_keys)
+
+def load(f):
+    return loads(f.read())
+
+def dump(obj, f, indent=None, sort_keys=False):
+    f.write(dumps(obj, indent, sort_keys))
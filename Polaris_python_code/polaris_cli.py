@@ -0,0 +1,47 @@
+import importlib
+import sys
+
+# Single entry point for the scripts in this directory, installed as the
+# "polaris" command (see pyproject.toml):
+#
+#     polaris extract URL TOKEN PORTFOLIO_ID [PROJECT_ID] [options]
+#     polaris sarif issues_output.json --output polaris_issues.sarif
+#     polaris provision users.csv ...
+#
+# Only the module of the chosen command is imported, so "polaris --help" and
+# each command start without loading the others.
+
+# command -> (module with a main() function, description)
+COMMANDS = {
+    "extract": ("extract_findings", "Extract Polaris issues to JSON and SARIF"),
+    "sarif": ("sarif_converter", "Convert a Polaris issue dump to SARIF"),
+    "provision": ("provision_users", "Provision users, groups and roles in bulk"),
+    "projects": ("get_all_projects", "List the projects of the portfolio"),
+    "benchmark": ("benchmark", "Benchmark polarislib against a fake Polaris API"),
+    "fake-server": ("fake_polaris", "Run a local fake Polaris API"),
+}
+
+def usage():
+    lines = ["usage: polaris COMMAND [options]", "", "commands:"]
+    for name, (module, description) in COMMANDS.items():
+        lines.append(f"  {name:<12} {description}")
+    lines.append("")
+    lines.append("Run 'polaris COMMAND --help' for the options of a command.")
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    if argv[0] not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        print(f"\npolaris: unknown command {argv[0]!r}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(COMMANDS[argv[0]][0])
+    # The commands parse sys.argv themselves
+    sys.argv = [f"polaris {argv[0]}"] + argv[1:]
+    return module.main()
+
+if __name__ == "__main__":
+    sys.exit(main())
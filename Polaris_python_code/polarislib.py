@@ -1,9 +1,15 @@
-import requests
-import pprint
 import json
-import sys
+import jsoncodec
+import math
 import os
 import re
+import time
+import random
+import hashlib
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 '''
 Copyright (c) 2024 Synopsys, Inc. All rights reserved worldwide. The information
 contained in this file is the proprietary and confidential information of
@@ -12,29 +18,588 @@ only by Synopsys customers in accordance with the terms and conditions of a
 previously executed license agreement between Synopsys and that customer.
 '''
 
-pp = pprint.PrettyPrinter(indent=4)
+# requests (with urllib3) takes longer to import than everything else a
+# script needs, so it is only imported once a session is created or a
+# request sent: "--help" and offline runs of the scripts never load it.
+# The module level names below are resolved the same way on first use.
+def __getattr__(name):
+    if name == 'requests':
+        import requests
+        return requests
+    if name == 'pp':
+        import pprint
+        return pprint.PrettyPrinter(indent=4)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def createSession(url, token):
-    headers = {'API-TOKEN': token}
-    s = requests.Session()
-    s.headers.update(headers)
+# Maximum number of pages apigetitems will fetch at the same time once it
+# knows the full page layout of a paginated response
+MAX_PAGE_WORKERS = 8
+
+# Default number of connections a session keeps open per host
+POOL_SIZE = 10
+
+# HTTPAdapter that turns on TCP keep-alive, so idle pooled connections are
+# not silently dropped by firewalls and load balancers between requests
+def keepAliveAdapter(**kwargs):
+    import socket
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection
+    adapter = HTTPAdapter(**kwargs)
+    # Used for every connection pool the adapter creates from now on
+    adapter.poolmanager.connection_pool_kw['socket_options'] = (
+      HTTPConnection.default_socket_options +
+      [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)])
+    return adapter
+
+# Stand-in for requests.Session on top of an httpx.Client with HTTP/2, where
+# concurrent requests to a host share one multiplexed connection. Offers
+# what polarislib uses: headers, request() and close(). request() returns
+# an httpx.Response: status_code, headers, content, text and url work as
+# with requests, but there are no session hooks and raise_for_status()
+# raises httpx errors; instrument with requestHooks instead.
+# Unlike requests' pools, httpx limits connections per client, across all
+# hosts: maxPerHost caps the total. polarislib sessions talk to one host, so
+# that is the same thing here. HTTP/2 has not been benchmarked:
+# fake_polaris.py only speaks HTTP/1.1.
+class Http2Session:
+    def __init__(self, poolSize, maxPerHost):
+        import httpx
+        self.httpx = httpx
+        limits = httpx.Limits(max_connections=maxPerHost,
+          max_keepalive_connections=poolSize)
+        # No timeout, like requests
+        self.client = httpx.Client(http2=True, limits=limits, timeout=None)
+        self.headers = self.client.headers
+
+    def request(self, method, url, params=None, headers=None, data=None,
+                allow_redirects=True, **kwargs):
+        import requests
+        if isinstance(params, dict):
+            # requests leaves out None parameters, httpx sends them empty
+            params = {k: v for k, v in params.items() if v is not None}
+        if params:
+            # requests adds params to the query of url, httpx replaces it
+            # (even with an empty dict): merge them here instead
+            url = self.httpx.URL(url).copy_merge_params(params)
+        try:
+            # requests follows redirects by default, httpx does not
+            return self.client.request(method, url, headers=headers,
+              content=data, follow_redirects=allow_redirects, **kwargs)
+        except self.httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except self.httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Create a session. Requests to a host reuse pooled keep-alive connections,
+# so concurrent fetches do not redo the TLS handshake. Accept-Encoding is
+# left to requests / httpx, which ask for every encoding they can decode
+# (gzip and deflate, br and zstd with brotli / zstandard installed).
+# Arguments:
+#  - Polaris URL
+#  - API token
+#  - poolSize (optional): connections kept open per host (default POOL_SIZE).
+#    Make it at least the number of threads sharing the session: beyond it
+#    connections are opened and thrown away per request.
+#  - maxPerHost (optional): hard limit on connections per host; threads
+#    wait for a free connection instead of opening more (with http2, on
+#    connections in total, see Http2Session)
+#  - http2 (optional): use HTTP/2 through httpx (pip install "httpx[http2]")
+# Returns:
+#  - requests.Session, or an Http2Session with http2=True
+def createSession(url, token, poolSize=None, maxPerHost=None, http2=False):
+    if poolSize == None:
+        poolSize = POOL_SIZE
+    if maxPerHost != None:
+        poolSize = min(poolSize, maxPerHost)
+    if http2:
+        try:
+            s = Http2Session(poolSize, maxPerHost)
+        except ImportError:
+            raise PolarisError("HTTP/2 needs httpx: pip install 'httpx[http2]'")
+    else:
+        import requests
+        s = requests.Session()
+        adapter = keepAliveAdapter(pool_maxsize=maxPerHost or poolSize,
+          pool_block=maxPerHost != None)
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+    s.headers.update({'API-TOKEN': token})
     return s
 
+# Errors raised by this library
+class PolarisError(Exception):
+    pass
+
+# The API answered with an error status (after any retries)
+class PolarisHTTPError(PolarisError):
+    def __init__(self, method, api, status, detail, response=None):
+        import pprint
+        self.method = method
+        self.api = api
+        self.status = status
+        self.detail = detail
+        self.response = response
+        super().__init__(f"{method} {api} failed with status {status}: "
+          f"{pprint.pformat(detail, indent=4)}")
+
+# Build a PolarisHTTPError from a failed requests response
+def httpError(method, api, response):
+    try: detail = jsoncodec.loads(response.content)
+    except ValueError: detail = response.text
+    return PolarisHTTPError(method, api, response.status_code, detail, response)
+
+# A lookup (application, project, branch, ...) did not match anything
+class PolarisNotFoundError(PolarisError):
+    pass
+
+# Pagination stopped part way. "items" holds what was fetched before the
+# failure (filled in by apigetitems), "resumeUrl" is the page to pass as
+# resumeFrom to apigetitems/iterItems to carry on from there.
+class PolarisPaginationError(PolarisError):
+    def __init__(self, resumeUrl, cause):
+        self.resumeUrl = resumeUrl
+        self.cause = cause
+        self.items = []
+        super().__init__(f"Pagination failed, resume from {resumeUrl}: {cause}")
+
+# Retry policy for transient failures: responses with one of RETRY_STATUSES
+# and connection errors are retried up to MAX_RETRIES times, waiting a random
+# time of up to BACKOFF_BASE * 2^attempt seconds (capped at BACKOFF_MAX), or
+# what the server asks for in Retry-After.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# POST is not idempotent: only retry when the server says it did not process
+# the request
+POST_RETRY_STATUSES = (429, 503)
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+# Token bucket: allows "rate" calls per second on average, with bursts of
+# up to "burst" calls
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        if not rate > 0:
+            raise ValueError(f"Rate must be greater than 0, not {rate}")
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Take a token if there is one. Returns 0 if it did, else the seconds to
+    # wait before trying again (polarislib_async waits without blocking).
+    def tryAcquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.tryAcquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+# Client-side rate limit applied to every request (None: unlimited)
+rateLimiter = None
+
+# Limit the requests sent by this library to "rate" per second
+# (None removes the limit)
+def setRateLimit(rate, burst=None):
+    global rateLimiter
+    rateLimiter = RateLimiter(rate, burst) if rate else None
+
+# Request-level instrumentation. Every HTTP exchange sent by request() (one
+# per attempt, so retries show up too) is passed to the functions in
+# requestHooks as fn(method, api, status, seconds, size, attempt), with
+# status None if the server could not be reached and size from
+# transferSize. Pagination calls report fn on paginationHooks as
+# fn(api, pages) once the last page is read.
+requestHooks = []
+paginationHooks = []
+
+# Bytes of a response body as transferred: its Content-Length (the
+# compressed size when the body came gzipped), or the decoded size for a
+# response sent without one (chunked)
+def transferSize(headers, content):
+    try:
+        return int(headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        return len(content)
+
+def addRequestHook(fn):
+    requestHooks.append(fn)
+
+def addPaginationHook(fn):
+    paginationHooks.append(fn)
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Path segments that identify one object rather than an endpoint
+ID_SEGMENT = re.compile(r'^(?=.*\d)[0-9a-fA-F-]{8,}$|^\d+$')
+
+# The endpoint of an API URL, with IDs replaced by "{id}" so that all calls
+# of one kind are counted together
+def endpointName(api):
+    path = urlsplit(api).path
+    return '/'.join('{id}' if ID_SEGMENT.match(part) else part
+                    for part in path.split('/'))
+
+# Upper bound of the histogram bucket holding the given fraction of the
+# requests (the slowest request for the last bucket, and never above it):
+# the latency percentiles are only as fine as LATENCY_BUCKETS
+def bucketPercentile(buckets, fraction, slowest):
+    rank = max(1, math.ceil(fraction * sum(buckets)))
+    count = 0
+    for bound, n in zip(LATENCY_BUCKETS, buckets):
+        count += n
+        if count >= rank:
+            return min(bound, slowest)
+    return slowest
+
+# Per endpoint request counts, latency histograms, bytes, retries and pages
+# per pagination, collected through the hooks above. Only the histogram
+# buckets are kept per endpoint, so memory use does not grow with the
+# number of requests.
+#   metrics = enableMetrics()
+#   ... API calls ...
+#   metrics.writeJson("metrics.json"); metrics.writeOpenMetrics("metrics.txt")
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.paginations = {}
+
+    def recordRequest(self, method, api, status, seconds, size, attempt):
+        key = (method, endpointName(api))
+        with self.lock:
+            entry = self.endpoints.get(key)
+            if entry is None:
+                entry = self.endpoints[key] = {'requests': 0, 'errors': 0,
+                  'retries': 0, 'bytes': 0, 'seconds': 0.0, 'statuses': {},
+                  'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'max': 0.0}
+            entry['requests'] += 1
+            if status is None or status >= 400:
+                entry['errors'] += 1
+            if attempt > 0:
+                entry['retries'] += 1
+            entry['bytes'] += size
+            entry['seconds'] += seconds
+            statusKey = str(status) if status is not None else 'unreachable'
+            entry['statuses'][statusKey] = entry['statuses'].get(statusKey, 0) + 1
+            bucket = 0
+            while bucket < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[bucket]:
+                bucket += 1
+            entry['buckets'][bucket] += 1
+            entry['max'] = max(entry['max'], seconds)
+
+    def recordPagination(self, api, pages):
+        endpoint = endpointName(api)
+        with self.lock:
+            entry = self.paginations.setdefault(endpoint,
+              {'paginations': 0, 'pages': 0, 'maxPages': 0})
+            entry['paginations'] += 1
+            entry['pages'] += pages
+            entry['maxPages'] = max(entry['maxPages'], pages)
+
+    # Summary as a JSON-compatible dict
+    def summary(self):
+        with self.lock:
+            endpoints = []
+            for (method, endpoint), entry in sorted(self.endpoints.items()):
+                def percentile(fraction):
+                    return bucketPercentile(entry['buckets'], fraction, entry['max'])
+                endpoints.append({
+                    'method': method, 'endpoint': endpoint,
+                    'requests': entry['requests'], 'errors': entry['errors'],
+                    'retries': entry['retries'], 'bytes': entry['bytes'],
+                    'seconds': round(entry['seconds'], 6),
+                    'statuses': dict(entry['statuses']),
+                    'latency': {
+                        'p50': round(percentile(0.50), 6),
+                        'p90': round(percentile(0.90), 6),
+                        'p99': round(percentile(0.99), 6),
+                        'max': round(entry['max'], 6),
+                        'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'],
+                                            entry['buckets'])),
+                    },
+                })
+            paginations = [dict(endpoint=endpoint, **entry)
+                           for endpoint, entry in sorted(self.paginations.items())]
+        return {
+            'requests': sum(e['requests'] for e in endpoints),
+            'retries': sum(e['retries'] for e in endpoints),
+            'bytes': sum(e['bytes'] for e in endpoints),
+            'endpoints': endpoints,
+            'paginations': paginations,
+        }
+
+    def writeJson(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    # OpenMetrics text exposition format
+    def openMetrics(self):
+        lines = []
+        def family(name, kind, help):
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'# HELP {name} {help}')
+        def labels(method, endpoint, extra=''):
+            endpoint = endpoint.replace('\\', '\\\\').replace('"', '\\"')
+            return f'{{method="{method}",endpoint="{endpoint}"{extra}}}'
+        with self.lock:
+            items = sorted(self.endpoints.items())
+            family('polaris_requests', 'counter', 'HTTP requests sent, including retries')
+            for (method, endpoint), e in items:
+                lines.append(f'polaris_requests_total{labels(method, endpoint)} {e["requests"]}')
+            family('polaris_request_errors', 'counter', 'Requests failing or unanswered')
+            for (method, endpoint), e in items:
+                lines.append(f'polaris_request_errors_total{labels(method, endpoint)} {e["errors"]}')
+            family('polaris_request_retries', 'counter', 'Requests that were retries')
+            for (method, endpoint), e in items:
+                lines.append(f'polaris_request_retries_total{labels(method, endpoint)} {e["retries"]}')
+            family('polaris_response_bytes', 'counter', 'Response body bytes received, as transferred')
+            for (method, endpoint), e in items:
+                lines.append(f'polaris_response_bytes_total{labels(method, endpoint)} {e["bytes"]}')
+            family('polaris_request_duration_seconds', 'histogram', 'Request latency')
+            for (method, endpoint), e in items:
+                count = 0
+                for bound, n in zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], e['buckets']):
+                    count += n
+                    le = ',le="' + bound + '"'
+                    lines.append('polaris_request_duration_seconds_bucket'
+                      f'{labels(method, endpoint, le)} {count}')
+                lines.append(f'polaris_request_duration_seconds_sum{labels(method, endpoint)} {e["seconds"]}')
+                lines.append(f'polaris_request_duration_seconds_count{labels(method, endpoint)} {count}')
+            family('polaris_pagination_pages', 'summary', 'Pages read per paginated call')
+            for endpoint, e in sorted(self.paginations.items()):
+                lines.append(f'polaris_pagination_pages_sum{labels("GET", endpoint)} {e["pages"]}')
+                lines.append(f'polaris_pagination_pages_count{labels("GET", endpoint)} {e["paginations"]}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def writeOpenMetrics(self, path):
+        with open(path, 'w') as f:
+            f.write(self.openMetrics())
+
+# The metrics collector registered by enableMetrics (None: not collecting)
+metrics = None
+
+# Start collecting request metrics, returns the Metrics object
+def enableMetrics():
+    global metrics
+    if metrics is None:
+        metrics = Metrics()
+        addRequestHook(metrics.recordRequest)
+        addPaginationHook(metrics.recordPagination)
+    return metrics
+
+# Seconds to wait before retry number "attempt" (0 based)
+def retryDelay(attempt, response=None):
+    if response is not None and response.headers.get('Retry-After'):
+        retryAfter = response.headers['Retry-After']
+        try:
+            return min(BACKOFF_MAX, max(0.0, float(retryAfter)))
+        except ValueError:
+            pass
+        from email.utils import parsedate_to_datetime
+        try:
+            date = parsedate_to_datetime(retryAfter)
+            return min(BACKOFF_MAX, max(0.0, date.timestamp() - time.time()))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+# Send a request, rate limited and with retries of transient failures
+# Arguments:
+#  - Session
+#  - HTTP method
+#  - full URL
+#  - anything else is passed on to session.request
+# Returns:
+#  - The last response, whatever its status. Raises PolarisError if the
+#    server could not be reached at all.
+def request(session, method, api, **kwargs):
+    import requests
+    retryStatuses = POST_RETRY_STATUSES if method == 'POST' else RETRY_STATUSES
+    attempt = 0
+    while True:
+        if rateLimiter is not None:
+            rateLimiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, api, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            for hook in requestHooks:
+                hook(method, api, None, time.perf_counter() - started, 0, attempt)
+            if method == 'POST' or attempt >= MAX_RETRIES:
+                raise PolarisError(f"{method} {api} failed: {e}") from e
+            time.sleep(retryDelay(attempt))
+            attempt += 1
+            continue
+        for hook in requestHooks:
+            hook(method, api, response.status_code, time.perf_counter() - started,
+              transferSize(response.headers, response.content), attempt)
+        if response.status_code not in retryStatuses or attempt >= MAX_RETRIES:
+            return response
+        time.sleep(retryDelay(attempt, response))
+        attempt += 1
+
+# Default size limit of an HttpCache
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Persistent cache of GET responses, used by getresp. Responses that carry
+# an ETag or Last-Modified header are stored on disk with them; the next
+# request for the same URL sends If-None-Match / If-Modified-Since and a 304
+# answer is served from the stored body. Each entry is a body file and a
+# small metadata file, named after a hash of the URL, parameters, headers
+# and API token fingerprint. Once the bodies take more than maxBytes the
+# least recently used entries are removed.
+class HttpCache:
+    def __init__(self, path, maxBytes=HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        # key -> [body size, last use], oldest use first
+        self.entries = OrderedDict()
+        self.size = 0
+        found = []
+        for name in os.listdir(path):
+            if name.endswith('.body'):
+                stat = os.stat(os.path.join(path, name))
+                found.append((stat.st_mtime, name[:-5], stat.st_size))
+        for used, key, size in sorted(found):
+            self.entries[key] = [size, used]
+            self.size += size
+        with self.lock:
+            self.evict()
+
+    def key(self, session, api, params, headers):
+        token = session.headers.get('API-TOKEN', '')
+        return hashlib.sha256(json.dumps([api, params, headers,
+          hashlib.sha256(token.encode()).hexdigest()[:16]],
+          sort_keys=True).encode()).hexdigest()
+
+    def file(self, key, suffix):
+        return os.path.join(self.path, key + suffix)
+
+    # Conditional request headers for key, or {} if nothing is stored
+    def validators(self, key):
+        if key not in self.entries:
+            return {}
+        try:
+            with open(self.file(key, '.meta')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('lastModified'):
+            headers['If-Modified-Since'] = meta['lastModified']
+        return headers
+
+    # The stored body of key (marking it as used), or None if it is gone
+    def body(self, key):
+        try:
+            with open(self.file(key, '.body'), 'rb') as f:
+                content = f.read()
+            os.utime(self.file(key, '.body'))
+        except OSError:
+            return None
+        with self.lock:
+            if key in self.entries:
+                self.entries[key][1] = time.time()
+                self.entries.move_to_end(key)
+        return content
+
+    # Store a 200 response if it can be revalidated later
+    def store(self, key, response):
+        etag = response.headers.get('ETag')
+        lastModified = response.headers.get('Last-Modified')
+        if not (etag or lastModified) or len(response.content) > self.maxBytes:
+            return
+        for suffix, data in [('.body', response.content),
+            ('.meta', json.dumps({'etag': etag, 'lastModified': lastModified,
+              'url': str(response.url)}).encode())]:
+            tmpPath = self.file(key, suffix + '.tmp')
+            with open(tmpPath, 'wb') as f:
+                f.write(data)
+            os.replace(tmpPath, self.file(key, suffix))
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[0]
+            self.entries[key] = [len(response.content), time.time()]
+            self.size += len(response.content)
+            self.evict()
+
+    # Drop least recently used entries until the size limit holds (called
+    # with the lock held)
+    def evict(self):
+        while self.size > self.maxBytes and len(self.entries) > 1:
+            key, (size, used) = self.entries.popitem(last=False)
+            self.size -= size
+            for suffix in ('.body', '.meta'):
+                try: os.remove(self.file(key, suffix))
+                except OSError: pass
+
+# The HTTP cache used by getresp (None: no caching). Set POLARIS_HTTP_CACHE
+# to a directory to enable it, or call setHttpCache.
+if os.environ.get('POLARIS_HTTP_CACHE'):
+    httpCache = HttpCache(os.environ['POLARIS_HTTP_CACHE'])
+else:
+    httpCache = None
+
+# Cache GET responses in directory "path" (None disables the cache)
+def setHttpCache(path, maxBytes=HTTP_CACHE_MAX_BYTES):
+    global httpCache
+    httpCache = HttpCache(path, maxBytes) if path else None
+
 def getresp(session, api, params=None, headers=None):
     if params == None:
         params = {}
     if headers == None:
         headers = {}
-    response = session.get(api, params=params, headers=headers)
-    # for debugging
-    #print(f"API call: {response.url}")
+    cache = httpCache
+    if cache is None:
+        response = request(session, 'GET', api, params=params, headers=headers)
+        if (response.status_code >= 300):
+            raise httpError('GET', api, response)
+        return(jsoncodec.loads(response.content))
+
+    key = cache.key(session, api, params, headers)
+    validators = cache.validators(key)
+    response = request(session, 'GET', api, params=params,
+      headers=dict(headers, **validators))
+    if response.status_code == 304 and validators:
+        content = cache.body(key)
+        if content is not None:
+            return(jsoncodec.loads(content))
+        # Evicted in the meantime, ask again without validators
+        response = request(session, 'GET', api, params=params, headers=headers)
     if (response.status_code >= 300):
-        print("ERROR: GET failed: ", api)
-        print("Response: ", response)
-        try: pp.pprint(response.json())
-        except: print("No json data returned")
-        sys.exit(1)
-    return(response.json())
+        raise httpError('GET', api, response)
+    if response.status_code == 200:
+        cache.store(key, response)
+    return(jsoncodec.loads(response.content))
 
 # Given the _links from an API call, find the "next" and "first" links
 # If one does not exist, return None
@@ -77,33 +642,150 @@ def apiget(session, url, endpoint, params=None, headers=None):
     json = getresp(session, api, params, headers)
     return(json)
 
-# General GET function that performs some basic error checking and returns _items
+# Work out every remaining page URL of an offset/limit paginated response
+# Arguments:
+#  - json of the first page (must carry "_collection" with "itemCount")
+#  - the (already fixed) "next" link of the first page
+# Returns:
+#  - List of page URLs in server order, or None if the response does not
+#    use offset/limit paging and the pages must be walked one by one
+def getPageUrls(json, nextlink):
+    try:
+        total = int(json['_collection']['itemCount'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    parts = urlsplit(nextlink)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    keys = [k for k, v in query]
+    if '_offset' not in keys or '_limit' not in keys:
+        return None
+    try:
+        offset = int(dict(query)['_offset'])
+        limit = int(dict(query)['_limit'])
+    except ValueError:
+        return None
+    if limit <= 0:
+        return None
+    pages = []
+    for pageOffset in range(offset, total, limit):
+        pageQuery = [(k, str(pageOffset) if k == '_offset' else v) for k, v in query]
+        pages.append(urlunsplit(parts._replace(query=urlencode(pageQuery))))
+    return pages
+
+# Generator version of apigetitems: yields the _items of each page as soon as
+# that page arrives, so callers can start working before the last page is in.
+# When the response uses offset/limit paging the remaining pages are fetched
+# concurrently (at most "workers" at a time, and never more than 2 x workers
+# pages held back waiting for the caller), otherwise the "next" links are
+# followed one page at a time. Either way items come out in server order.
+# If a page still fails after the transport's retries, PolarisPaginationError
+# is raised with the URL of that page: pass it back as resumeFrom to carry on
+# where the previous call stopped.
 # Arguments:
 #  - Session
 #  - Polaris URL
 #  - API URL
 #  - parameters (optional)
 #  - headers (optional)
-# Returns:
-#  The _items returned by API
-def apigetitems(session, url, endpoint, params=None, headers=None):
+#  - workers (optional, defaults to MAX_PAGE_WORKERS; 1 disables prefetching)
+#  - resumeFrom (optional): page URL to start from instead of the first page
+# Yields:
+#  The _items returned by API, one at a time
+def iterItems(session, url, endpoint, params=None, headers=None, workers=None,
+              resumeFrom=None):
     if params == None:
         params = {}
-    api = url+endpoint
+    if workers == None:
+        workers = MAX_PAGE_WORKERS
+    if resumeFrom:
+        # The page URL already carries the query parameters
+        api, params = resumeFrom, {}
+    else:
+        api = url+endpoint
     json = getresp(session, api, params, headers)
-    
-    data = json['_items']
-    nextpage,firstpage = getNextAndFirst(json['_links'])
+    pages = [1]
+    try:
+        yield from pageItems(session, url, json, workers, pages)
+    finally:
+        for hook in paginationHooks:
+            hook(api, pages[0])
+
+# The items of a paginated response, starting from its first page (json),
+# counting pages read in pageCount[0]. See iterItems.
+def pageItems(session, url, json, workers, pageCount):
+    nextpage,firstpage = getNextAndFirst(json.get('_links', ()))
+    yield from json['_items']
+    if nextpage and nextpage != firstpage and workers > 1:
+        pages = getPageUrls(json, fixAuthUrl(url, nextpage))
+        if pages is not None:
+            json = None
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                try:
+                    for page in pages:
+                        if len(pending) >= 2 * workers:
+                            yield from nextPageItems(pending)
+                            pageCount[0] += 1
+                        pending.append((page, pool.submit(getresp, session, page)))
+                    while pending:
+                        yield from nextPageItems(pending)
+                        pageCount[0] += 1
+                finally:
+                    # Caller stopped early or a page failed: drop the rest
+                    for page, future in pending:
+                        future.cancel()
+            return
     while nextpage:
         if nextpage == firstpage:
-            # Nothing to paginate, just return what we got.
-            return(data)
+            # Nothing to paginate, we already yielded what we got.
+            return
         nextpage = fixAuthUrl(url, nextpage)
-        # Fetch another page of data and append it
-        json = getresp(session, nextpage)
+        # Fetch another page of data
+        try:
+            json = getresp(session, nextpage)
+        except PolarisError as e:
+            raise PolarisPaginationError(nextpage, e) from e
         # Assumption: We are generally only interested in _items...
-        data.extend(json['_items'])
-        nextpage,firstpage = getNextAndFirst(json['_links'])
+        pageCount[0] += 1
+        nextpage,firstpage = getNextAndFirst(json.get('_links', ()))
+        yield from json['_items']
+
+# Wait for the oldest prefetched page and return its _items
+def nextPageItems(pending):
+    page, future = pending.popleft()
+    try:
+        return(future.result()['_items'])
+    except PolarisError as e:
+        raise PolarisPaginationError(page, e) from e
+
+# General GET function that performs some basic error checking and returns _items
+# Arguments:
+#  - Session
+#  - Polaris URL
+#  - API URL
+#  - parameters (optional)
+#  - headers (optional)
+#  - workers (optional, see iterItems)
+#  - resumeFrom (optional, see iterItems)
+# Returns:
+#  The _items returned by API. If pagination fails part way the
+#  PolarisPaginationError carries the items fetched so far in "items".
+def apigetitems(session, url, endpoint, params=None, headers=None, workers=None,
+                resumeFrom=None):
+    return(collectItems(iterItems(session, url, endpoint, params, headers, workers,
+      resumeFrom)))
+
+# Collect the items of an iterItems style generator into a list. If
+# pagination fails part way the PolarisPaginationError carries the items
+# fetched so far in "items".
+def collectItems(items):
+    data = []
+    try:
+        for item in items:
+            data.append(item)
+    except PolarisPaginationError as e:
+        e.items = data
+        raise
     return(data)
 
 # General POST function 
@@ -117,42 +799,126 @@ def apigetitems(session, url, endpoint, params=None, headers=None):
 #  - The API json response,  if relevant
 def apipost(session, url, endpoint, body, contentType):
     headers = {'content-type': contentType}
-    response = session.post(url + endpoint, headers=headers, data=json.dumps(body))
+    response = request(session, 'POST', url + endpoint, headers=headers, data=jsoncodec.dumps(body))
     if (response.status_code == 409):
         # This means the item already exists
-        try: print("WARNING: ", response.json()['detail'])
+        try: print("WARNING: ", jsoncodec.loads(response.content)['detail'])
         except: print("No detail provided")
-        return(response.json())
+        return(jsoncodec.loads(response.content))
     if (response.status_code >= 300):
-        print(f"ERROR: POST failed: endpoint={endpoint}, body={body}")
-        print("Response: ", response)
-        print(f"endpoint: {url + endpoint}")
-        print(f"body: {body}")
-        print(f"headers: {headers}")
-        try: pp.pprint(response.json())
-        except: print("No json data returned")
-        sys.exit(1)
+        raise httpError('POST', url + endpoint, response)
     if (response.status_code == 204):
         # No content but post was OK
         return
     else:
-        return(response.json())
+        return(jsoncodec.loads(response.content))
 
 def apipatch(session, url, endpoint, body, contentType, params=None):
     headers = {'content-type': contentType}
     if params == None:
         params = {}
-    response = session.patch(url + endpoint, headers=headers, json=body,
-      params=params)
+    response = request(session, 'PATCH', url + endpoint, headers=headers,
+      data=jsoncodec.dumps(body), params=params)
     if (response.status_code >= 300):
-        print("ERROR: POST failed: ", endpoint, body)
-        print("Response: ", response)
-        try: pp.pprint(response.json())
-        except: print("No json data returned")
-        sys.exit(1)
-    try: return(response.json())
+        raise httpError('PATCH', url + endpoint, response)
+    try: return(jsoncodec.loads(response.content))
     except: return None
 
+# Cache for near-static lookups (portfolio ID, tenant ID, entitlements,
+# roles, ...). Entries are keyed on the Polaris URL, endpoint and parameters
+# (plus a fingerprint of the API token, so tenants never share entries),
+# expire after "ttl" seconds and the least recently used entry is dropped
+# once "maxsize" entries are held.
+class LookupCache:
+    def __init__(self, ttl=300, maxsize=256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    # Returns (True, value) on a hit, (False, None) on a miss
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.time():
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            self.changed()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.changed()
+
+    # Called with the lock held whenever the entries changed
+    def changed(self):
+        pass
+
+# LookupCache that is persisted to a JSON file, so repeated CLI runs can
+# skip the lookups altogether until the entries expire
+class DiskLookupCache(LookupCache):
+    def __init__(self, path, ttl=3600, maxsize=1024):
+        super().__init__(ttl, maxsize)
+        self.path = path
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = []
+        now = time.time()
+        for key, expires, value in stored:
+            if expires >= now:
+                self.entries[key] = (expires, value)
+
+    def changed(self):
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w") as f:
+            json.dump([[k, e, v] for k, (e, v) in self.entries.items()], f)
+        os.replace(tmpPath, self.path)
+
+# The cache used by the lookup helpers below. Set POLARIS_LOOKUP_CACHE to a
+# file name to persist it between runs, or call setLookupCache.
+if os.environ.get('POLARIS_LOOKUP_CACHE'):
+    lookupCache = DiskLookupCache(os.environ['POLARIS_LOOKUP_CACHE'])
+else:
+    lookupCache = LookupCache()
+
+# Replace the lookup cache (None disables caching)
+def setLookupCache(cache):
+    global lookupCache
+    lookupCache = cache
+
+# Call fn (apiget or apigetitems) through the lookup cache
+# Arguments:
+#  - fn: apiget or apigetitems
+#  - Session, Polaris URL, API URL, parameters and headers as for fn
+# Returns:
+#  - What fn returns, possibly from the cache
+def cachedget(fn, session, url, endpoint, params=None, headers=None):
+    cache = lookupCache
+    if cache is None:
+        return(fn(session, url, endpoint, params, headers))
+    token = session.headers.get('API-TOKEN', '')
+    key = json.dumps([fn.__name__, url, endpoint, params, headers,
+      hashlib.sha256(token.encode()).hexdigest()[:16]], sort_keys=True)
+    hit, value = cache.get(key)
+    if hit:
+        return(value)
+    value = fn(session, url, endpoint, params, headers)
+    cache.set(key, value)
+    return(value)
+
 # Fetch Portfolio Id
 # Arguments:
 #  - Session
@@ -160,9 +926,22 @@ def apipatch(session, url, endpoint, body, contentType, params=None):
 # Returns:
 #  - Portfolio ID
 def getPortfolioId(session, url):
-    resp = apigetitems(session, url, "/api/portfolio/portfolios")
+    resp = cachedget(apigetitems, session, url, "/api/portfolio/portfolios")
     return(resp[0]['id'])
 
+# Fetch the projects of a portfolio
+# Arguments:
+#  - Session
+#  - Polaris URL
+#  - Portfolio ID
+#  - limit (optional): projects per page
+# Returns:
+#  - List of projects
+def getPortfolioProjects(session, url, portfolioId, limit=100):
+    headers = {'accept': "application/vnd.polaris.portfolios.projects-1+json"}
+    return(apigetitems(session, url, f"/api/portfolios/{portfolioId}/projects",
+      {'_limit': limit}, headers))
+
 # Fetch Application ID
 # Arguments:
 #  - Session
@@ -179,9 +958,8 @@ def getApplicationId(session, url, pid, name):
       params)
     try:
         return(resp[0]['id'])
-    except:
-        print(f"ERROR: Application {name} not found")
-        sys.exit(1)
+    except IndexError:
+        raise PolarisNotFoundError(f"Application {name} not found")
 
 # Fetch Project ID
 # Arguments:
@@ -199,9 +977,8 @@ def getProjectId(session, url, aid, name):
       params)
     try:
         return(resp[0]['id'])
-    except:
-        print(f"ERROR: Project {name} not found")
-        sys.exit(1)
+    except IndexError:
+        raise PolarisNotFoundError(f"Project {name} not found")
 
 # Fetch Branch ID
 # Arguments:
@@ -210,7 +987,7 @@ def getProjectId(session, url, aid, name):
 #  - Project ID
 #  - Branch Name
 #  - nonfatal? optional, will return None if branch not found.
-#              otherwise, prints error message + exit code 1
+#              otherwise, raises PolarisNotFoundError
 # Returns:
 #  - Branch ID
 def getBranchId(session, url, pid, name, nonfatal=False):
@@ -222,39 +999,374 @@ def getBranchId(session, url, pid, name, nonfatal=False):
       params, headers)
     try:
         return(resp[0]['id'])
-    except:
+    except IndexError:
         if (nonfatal):
             return None
         else:
-            print(f"ERROR: Branch {name} not found")
-            sys.exit(1)
+            raise PolarisNotFoundError(f"Branch {name} not found")
+
+# In-memory index of the portfolio: applications, their projects and the
+# projects' branches, loaded in bulk (projects and branches concurrently)
+# so name <-> ID lookups need no requests of their own. A lookup that
+# misses reloads just the level it looked in (application list, projects of
+# one application, branches of one project), once until the next refresh,
+# to pick up new entries.
+# refresh(maxAge) reloads the application list plus whatever was loaded
+# more than maxAge seconds ago, or everything with maxAge=None. With a path
+# the index is kept in that JSON file between runs; with an HttpCache set,
+# reloads are revalidations of unchanged pages. portfolioId picks the
+# portfolio, by default the tenant's (see getPortfolioId).
+#
+#     index = PortfolioIndex(session, url, "portfolio_index.json")
+#     aid = index.applicationId("My App")
+#     pid = index.projectId(aid, "My Project")
+#     bid = index.branchId(pid, "main")
+class PortfolioIndex:
+    def __init__(self, session, url, path=None, workers=None, portfolioId=None):
+        self.session = session
+        self.url = url
+        self.path = path
+        self.workers = workers or MAX_PAGE_WORKERS
+        token = session.headers.get('API-TOKEN', '')
+        self.token = hashlib.sha256(token.encode()).hexdigest()[:16]
+        self.lock = threading.Lock()
+        self.portfolioId = portfolioId
+        self.loaded = False
+        # id -> {'name', 'loaded', 'projects': [project IDs]}
+        self.applications = {}
+        # id -> {'name', 'applicationId', 'loaded', 'branches': {id: name}}
+        self.projects = {}
+        # Levels reloaded after a miss: 'applications', or the application or
+        # project ID
+        self.reloaded = set()
+        if path:
+            self.read()
+        self.reindex()
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                stored = jsoncodec.load(f)
+        except (OSError, ValueError):
+            return
+        if stored.get('url') != self.url or stored.get('token') != self.token:
+            return
+        if self.portfolioId not in (None, stored['portfolioId']):
+            return
+        self.portfolioId = stored['portfolioId']
+        self.applications = stored['applications']
+        self.projects = stored['projects']
+        self.loaded = True
+
+    def save(self):
+        if not self.path:
+            return
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w") as f:
+            jsoncodec.dump({'url': self.url, 'token': self.token,
+              'portfolioId': self.portfolioId, 'applications': self.applications,
+              'projects': self.projects}, f)
+        os.replace(tmpPath, self.path)
+
+    # Rebuild the name -> ID and ID -> name maps
+    def reindex(self):
+        self.applicationIds = {a['name']: aid for aid, a in self.applications.items()}
+        self.projectIds = {(p['applicationId'], p['name']): pid
+                           for pid, p in self.projects.items()}
+        self.branchIds = {(pid, name): bid for pid, p in self.projects.items()
+                          for bid, name in p['branches'].items()}
+        self.names = {id: name for name, id in self.applicationIds.items()}
+        self.names.update((pid, p['name']) for pid, p in self.projects.items())
+        self.names.update((bid, name) for (pid, name), bid in self.branchIds.items())
+
+    # Whether a lookup miss may reload "level"
+    def reload(self, level):
+        with self.lock:
+            if level in self.reloaded:
+                return False
+            self.reloaded.add(level)
+            return True
+
+    # Fetch fn(id) for every ID, "workers" at a time. Returns {id: result}.
+    def fetchAll(self, fn, ids):
+        ids = list(ids)
+        if len(ids) <= 1 or self.workers <= 1:
+            return {i: fn(i) for i in ids}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip(ids, pool.map(fn, ids)))
+
+    def fetchProjects(self, aid):
+        return apigetitems(self.session, self.url,
+          f"/api/portfolio/portfolio-items/{aid}/portfolio-sub-items")
+
+    def fetchBranches(self, pid):
+        headers = {'content-type': "application/vnd.synopsys.pm.branches-1+json"}
+        return apigetitems(self.session, self.url,
+          f"/api/portfolio/portfolio-sub-items/{pid}/branches", None, headers)
+
+    # (Re)load the projects of the given applications, then their branches
+    def loadApplications(self, aids):
+        now = time.time()
+        found = self.fetchAll(self.fetchProjects, aids)
+        with self.lock:
+            for aid, items in found.items():
+                old = set(self.applications[aid]['projects'])
+                self.applications[aid]['projects'] = [item['id'] for item in items]
+                self.applications[aid]['loaded'] = now
+                for pid in old - set(self.applications[aid]['projects']):
+                    self.projects.pop(pid, None)
+                for item in items:
+                    branches = self.projects.get(item['id'], {}).get('branches', {})
+                    self.projects[item['id']] = {'name': item['name'],
+                      'applicationId': aid, 'loaded': 0, 'branches': branches}
+        self.loadBranches([item['id'] for items in found.values() for item in items])
+
+    def loadBranches(self, pids):
+        now = time.time()
+        found = self.fetchAll(self.fetchBranches, pids)
+        with self.lock:
+            for pid, items in found.items():
+                self.projects[pid]['branches'] = {item['id']: item['name'] for item in items}
+                self.projects[pid]['loaded'] = now
+            self.reindex()
+        self.save()
+
+    # Reload the application list; returns the IDs of new applications
+    def loadApplicationList(self):
+        if self.portfolioId is None:
+            self.portfolioId = getPortfolioId(self.session, self.url)
+        items = apigetitems(self.session, self.url,
+          f"/api/portfolio/portfolios/{self.portfolioId}/portfolio-items")
+        with self.lock:
+            current = {item['id']: item['name'] for item in items}
+            for aid in set(self.applications) - set(current):
+                for pid in self.applications.pop(aid)['projects']:
+                    self.projects.pop(pid, None)
+            new = [aid for aid in current if aid not in self.applications]
+            for aid, name in current.items():
+                entry = self.applications.setdefault(aid,
+                  {'loaded': 0, 'projects': []})
+                entry['name'] = name
+            self.reindex()
+            self.loaded = True
+        return new
+
+    # Reload the application list, and the projects and branches of new
+    # applications and of those loaded more than maxAge seconds ago (all of
+    # them with maxAge None)
+    def refresh(self, maxAge=None):
+        self.reloaded.clear()
+        self.loadApplicationList()
+        cutoff = time.time() - maxAge if maxAge is not None else None
+        self.loadApplications([aid for aid, a in self.applications.items()
+          if cutoff is None or a['loaded'] < cutoff])
+        if cutoff is not None:
+            self.loadBranches([pid for pid, p in self.projects.items()
+              if p['loaded'] < cutoff])
+        return self
+
+    def ensureLoaded(self):
+        if not self.loaded:
+            self.refresh()
+
+    def applicationId(self, name):
+        self.ensureLoaded()
+        if name not in self.applicationIds and self.reload('applications'):
+            self.loadApplications(self.loadApplicationList())
+        try:
+            return self.applicationIds[name]
+        except KeyError:
+            raise PolarisNotFoundError(f"Application {name} not found")
+
+    def projectId(self, aid, name):
+        self.ensureLoaded()
+        if ((aid, name) not in self.projectIds and aid in self.applications
+                and self.reload(aid)):
+            self.loadApplications([aid])
+        try:
+            return self.projectIds[(aid, name)]
+        except KeyError:
+            raise PolarisNotFoundError(f"Project {name} not found")
+
+    def branchId(self, pid, name, nonfatal=False):
+        self.ensureLoaded()
+        if ((pid, name) not in self.branchIds and pid in self.projects
+                and self.reload(pid)):
+            self.loadBranches([pid])
+        if (pid, name) in self.branchIds:
+            return self.branchIds[(pid, name)]
+        if nonfatal:
+            return None
+        raise PolarisNotFoundError(f"Branch {name} not found")
+
+    # Name of an application, project or branch ID (None if unknown)
+    def name(self, id):
+        self.ensureLoaded()
+        return self.names.get(id)
+
+    # Project entries (see above) of one application, or of all of them
+    def projectList(self, aid=None):
+        self.ensureLoaded()
+        return [dict(p, id=pid) for pid, p in self.projects.items()
+                if aid is None or p['applicationId'] == aid]
+
+# Build the query parameters for the issues endpoint
+# The optional parts of an issue and the query flag that includes each one
+ISSUE_INCLUDES = {
+    'issueProperties': '_includeIssueProperties',
+    'type': '_includeType',
+    'triage': '_includeTriageProperties',
+    'occurrence': '_includeOccurrenceProperties',
+    'context': '_includeContext',
+}
+
+# The cheapest include set for each kind of consumer:
+#  - full: everything (the default)
+#  - sarif: what sarif_builder reads, i.e. type names and descriptions,
+#    the dismissed flag and severity/cwe/score, and the context, whose links
+#    sarif_converter needs to build the issue links of a stored dump
+#  - triage: the triage properties only
+#  - ids: the bare issues (id, location, ...)
+ISSUE_PROFILES = {
+    'full': tuple(ISSUE_INCLUDES),
+    'sarif': ('type', 'triage', 'occurrence', 'context'),
+    'triage': ('triage',),
+    'ids': (),
+}
+
+# Query parameters of an issue request
+# Arguments:
+#  - Project ID
+#  - Parameters (Optional), updated in place
+#  - include (Optional): the ISSUE_INCLUDES parts to request, default all
+#  - pageSize (Optional): issues per page, default the server's
+# Returns:
+#  - the parameters
+def issueParams(pid, params=None, include=None, pageSize=None):
+    if params is None:
+        params = {}
+    if include is None:
+        include = ISSUE_INCLUDES
+    params['projectId'] = pid
+    for part in include:
+        params[ISSUE_INCLUDES[part]] = 'true'
+    if pageSize:
+        params['_limit'] = pageSize
+    return params
+
+# The include set of a profile (see ISSUE_PROFILES), or the explicit include
+# list if one is given
+def issueIncludes(profile=None, include=None):
+    if include is not None:
+        unknown = [part for part in include if part not in ISSUE_INCLUDES]
+        if unknown:
+            raise ValueError(f"Unknown issue include(s) {unknown}, "
+              f"choose from {list(ISSUE_INCLUDES)}")
+        return include
+    if profile is None:
+        return ISSUE_PROFILES['full']
+    if profile not in ISSUE_PROFILES:
+        raise ValueError(f"Unknown issue profile {profile}, "
+          f"choose from {list(ISSUE_PROFILES)}")
+    return ISSUE_PROFILES[profile]
+
+# Server-side (RSQL "_filter") forms of the issue filters below
+NOT_DISMISSED_FILTER = "triageProperties:is-dismissed==false"
+NOT_INFORMATIONAL_FILTER = "occurrenceProperties:severity!=informational"
+
+# Filters a server answered with 400, per Polaris URL: not tried again
+unsupportedFilters = set()
+
+def issueDismissed(issue):
+    for prop in issue.get('triageProperties', ()):
+        if prop.get('key') == 'is-dismissed' and prop.get('value') is True:
+            return True
+    return False
+
+def issueInformational(issue):
+    for prop in issue.get('occurrenceProperties', ()):
+        if prop.get('key') == 'severity':
+            return str(prop.get('value', '')).lower() == 'informational'
+    return False
+
+# AND an extra RSQL expression onto an (optional) existing filter
+def andFilter(existing, extra):
+    if not existing:
+        return extra
+    return f"({existing});{extra}"
+
+# The "_filter" expression leaving out dismissed and/or informational issues
+def issueFilter(skipDismissed, skipInformational):
+    expressions = []
+    if skipDismissed:
+        expressions.append(NOT_DISMISSED_FILTER)
+    if skipInformational:
+        expressions.append(NOT_INFORMATIONAL_FILTER)
+    return ";".join(expressions)
+
+# Client-side version of issueFilter
+def skipIssue(issue, skipDismissed, skipInformational):
+    return ((skipDismissed and issueDismissed(issue)) or
+            (skipInformational and issueInformational(issue)))
+
+# Iterate issues with dismissed and/or informational issues left out. The
+# filter is sent to the server as part of "_filter"; if the server rejects
+# it (400 on the first page), the issues are fetched unfiltered and the
+# filter is applied here instead.
+def iterFilteredIssues(session, url, params, skipDismissed, skipInformational):
+    serverFilter = issueFilter(skipDismissed, skipInformational)
+    if (url, serverFilter) not in unsupportedFilters:
+        filtered = dict(params)
+        filtered['_filter'] = andFilter(params.get('_filter'), serverFilter)
+        started = False
+        try:
+            for issue in iterItems(session, url, "/api/findings/issues", filtered):
+                started = True
+                yield issue
+            return
+        except PolarisHTTPError as e:
+            if started or e.status != 400:
+                raise
+            unsupportedFilters.add((url, serverFilter))
+    for issue in iterItems(session, url, "/api/findings/issues", params):
+        if not skipIssue(issue, skipDismissed, skipInformational):
+            yield issue
+
+# Iterate Issues, page by page as they arrive
+# Arguments:
+#  - Session
+#  - Polaris URL
+#  - Project ID
+#  - Parameters (Optional)
+#  - pageSize (Optional): issues per page; bigger pages mean fewer requests
+#  - profile (Optional): name of the include set to use, see ISSUE_PROFILES
+#  - include (Optional): explicit list of ISSUE_INCLUDES parts, overrides profile
+#  - skipDismissed, skipInformational (Optional): leave out dismissed /
+#    informational issues, filtered by the server where it can
+# Yields:
+#  - raw issue data from API response, one issue at a time
+def iterIssues(session, url, pid, params=None, pageSize=None, profile=None,
+               include=None, skipDismissed=False, skipInformational=False):
+    params = issueParams(pid, params, issueIncludes(profile, include), pageSize)
+    if skipDismissed or skipInformational:
+        return(iterFilteredIssues(session, url, params, skipDismissed,
+          skipInformational))
+    return(iterItems(session, url, "/api/findings/issues", params))
 
 # Get Issues
 # Arguments:
 #  - Session
 #  - Polaris URL
 #  - Project ID
-#  - Branch Id
 #  - Parameters (Optional)
+#  - pageSize, profile, include, skipDismissed, skipInformational (Optional):
+#    see iterIssues
 # Returns:
 #  - raw issue data from API response
-def getIssues(session, url, pid, params=None):
-    if params is None:
-        params = {}
-    params['projectId'] = pid
-    params['_includeIssueProperties'] = 'true'
-    params['_includeType'] = 'true'
-    params['_includeTriageProperties'] = 'true'
-    params['_includeOccurrenceProperties'] = 'true'
-    params['_includeContext'] = 'true' 
-    resp = apigetitems(session, url,
-      "/api/findings/issues",
-      params)
-    try:
-        return(resp)
-    except:
-        print(f"ERROR: No issues found")
-        sys.exit(1)
+def getIssues(session, url, pid, params=None, pageSize=None, profile=None,
+              include=None, skipDismissed=False, skipInformational=False):
+    return(collectItems(iterIssues(session, url, pid, params, pageSize, profile,
+      include, skipDismissed, skipInformational)))
 
 # def getIssues(session, url, pid, bid, params=None):
 #     if params == None:
@@ -281,7 +1393,7 @@ def getIssues(session, url, pid, params=None):
 # Returns:
 # - Dictionary of roles, keyed on the human-readable name
 def getRoles(session, url):
-    resp = apigetitems(session, url, "/api/ciam/roles")
+    resp = cachedget(apigetitems, session, url, "/api/ciam/roles")
     roles = {}
     for item in resp:
         roles[item['name']] = item['id']
@@ -294,7 +1406,7 @@ def getRoles(session, url):
 # Returns:
 # - Dictionary of roles, keyed on the human-readable name
 def getAppRoles(session, url):
-    resp = apigetitems(session, url, "/api/ciam/resources/applications/roles")
+    resp = cachedget(apigetitems, session, url, "/api/ciam/resources/applications/roles")
     roles = {}
     for item in resp:
         roles[item['name']] = item['id']
@@ -343,9 +1455,35 @@ def getGroupId(session, url, name):
     try: return(resp[0]['id'])
     except: return(None)
 
+# List every user of the tenant
+# Arguments:
+# - session
+# - url
+# Returns:
+# - Dictionary of user ids, keyed on the (lower case) email address
+def getUsers(session, url):
+    resp = apigetitems(session, url, "/api/ciam/users")
+    users = {}
+    for item in resp:
+        users[item['email'].lower()] = item['id']
+    return(users)
+
+# List every group of the tenant
+# Arguments:
+# - session
+# - url
+# Returns:
+# - Dictionary of group ids, keyed on the group name
+def getGroups(session, url):
+    resp = apigetitems(session, url, "/api/ciam/groups")
+    groups = {}
+    for item in resp:
+        groups[item['name']] = item['id']
+    return(groups)
+
 # Returns tenant id
 def getTenantId(session, url):
-    resp = apiget(session, url, "/api/ciam/openid-connect/userinfo")
+    resp = cachedget(apiget, session, url, "/api/ciam/openid-connect/userinfo")
     return(resp['organization']['id'])
 
 # Return list of available subscription ids
@@ -378,7 +1516,7 @@ def getEntitlements(session, url):
     headers = {'content-type': "application/vnd.synopsys.ses.entitlement-3+json", \
                'accept': "application/vnd.synopsys.ses.entitlement-3+json"}
     tenant = getTenantId(session, url)
-    resp = apigetitems(session, url,
+    resp = cachedget(apigetitems, session, url,
       f"/api/entitlement-service/tenants/{tenant}/entitlements", params=params,
       headers=headers)
     entitle = []
@@ -401,7 +1539,7 @@ def getExecutionMode(session, url):
     headers = {'content-type': "application/vnd.synopsys.ses.entitlement-3+json", \
                'accept': "application/vnd.synopsys.ses.entitlement-3+json"}
     tenant = getTenantId(session, url)
-    resp = apigetitems(session, url,
+    resp = cachedget(apigetitems, session, url,
       f"/api/entitlement-service/tenants/{tenant}/entitlements", params=params,
       headers=headers)
     try: return(resp[0]['executionMode'].upper())
@@ -461,8 +1599,20 @@ def setUserRole(session, url, userId, roleId):
 # Returns:
 # - Nothing
 def setUserAppRole(session, url, userId, appId, roleId):
+    setUsersAppRole(session, url, [userId], appId, roleId)
+
+# Give a list of users the same application role in one request
+# Arguments:
+# - session
+# - url
+# - list of user IDs
+# - application ID
+# - desired app role ID to set
+# Returns:
+# - Nothing
+def setUsersAppRole(session, url, userIds, appId, roleId):
     data = {
-        'userIds': [userId]
+        'userIds': list(userIds)
     }
     # Failures should be reported in apipost
     resp = apipost(session, url, "/api/ciam/resources/applications/" + appId + \
@@ -506,20 +1656,48 @@ def createGroup(session, url, name):
         return None
 
 # Add a user to a group
-# TODO this could be a list of users...
 # Arguments:
 # - session
 # - url
 # - user id
 # - group id
 # Returns:
-# - Nothing. apipatch exits with a fatal error if there was a non-successful patch
+# - Nothing. apipatch raises PolarisHTTPError if there was a non-successful patch
 def addUserToGroup(session, url, userid, groupid):
-    data = [{"userId":userid}]
+    addUsersToGroup(session, url, [userid], groupid)
+
+# Add a list of users to a group in one request
+# Arguments:
+# - session
+# - url
+# - list of user ids
+# - group id
+# Returns:
+# - Nothing. apipatch raises PolarisHTTPError if there was a non-successful patch
+def addUsersToGroup(session, url, userids, groupid):
+    data = [{"userId":userid} for userid in userids]
     resp = apipatch(session, url, f"/api/ciam/groups/{groupid}/users", data,
       'application/vnd.synopsys.ciam.group-user-1+json')
     return
 
+# List the users of a group
+# Arguments:
+# - session
+# - url
+# - group id
+# Returns:
+# - List of user ids
+def getGroupUsers(session, url, groupid):
+    resp = apigetitems(session, url, f"/api/ciam/groups/{groupid}/users")
+    return([item.get('userId', item.get('id')) for item in resp])
+
+# Most issue families triaged by one bulk triage request, and the longest
+# "filter" value such a request may carry
+MAX_TRIAGE_BATCH = 500
+MAX_TRIAGE_FILTER_LENGTH = 16000
+# Bulk triage requests in flight at the same time
+MAX_TRIAGE_WORKERS = 4
+
 # Update existing issue with new triage data
 # Arguments:
 # - session
@@ -529,7 +1707,7 @@ def addUserToGroup(session, url, userid, groupid):
 # - branch Id
 # - triage data (See format below)
 # Returns:
-# - Nothing. apipatch exits with a fatal error if there was a non-successful patch
+# - Nothing. apipatch raises PolarisHTTPError if there was a non-successful patch
 def setTriage(session, url, issueId, projectId, branchId, data):
     # Data structure looks like this. We'll handle the filter/issueProperties part
     # based on the issueId provided.
@@ -552,12 +1730,100 @@ def setTriage(session, url, issueId, projectId, branchId, data):
     #  ]
     #}
 
-    data['filter'] = f"issueProperties:family-id=in=('{issueId}')"
+    setTriageBulk(session, url, [issueId], projectId, branchId, data)
+    return
+
+# Build the bulk triage filter selecting a list of issue families
+def triageFilter(issueIds):
+    ids = ",".join(f"'{issueId}'" for issueId in issueIds)
+    return f"issueProperties:family-id=in=({ids})"
+
+# Split issue IDs into chunks whose filter stays within the batch limits
+def triageChunks(issueIds):
+    chunk = []
+    # length of "issueProperties:family-id=in=()"
+    length = len(triageFilter([]))
+    for issueId in issueIds:
+        # quotes plus the separating comma
+        idLength = len(issueId) + 3
+        if chunk and (len(chunk) >= MAX_TRIAGE_BATCH
+                      or length + idLength > MAX_TRIAGE_FILTER_LENGTH):
+            yield chunk
+            chunk = []
+            length = len(triageFilter([]))
+        chunk.append(issueId)
+        length += idLength
+    if chunk:
+        yield chunk
+
+# Send bulk triage requests, in parallel
+# Arguments:
+# - session
+# - url
+# - list of (triage data, list of issue Ids) pairs
+# - project Id
+# - branch Id
+# - workers (optional, defaults to MAX_TRIAGE_WORKERS)
+def sendTriages(session, url, groups, projectId, branchId, workers=None):
+    if workers == None:
+        workers = MAX_TRIAGE_WORKERS
     params = {'projectId': projectId, 'branchId': branchId}
     contentType = "application/vnd.synopsys.polaris-one.issue-management.issue-family-bulk-triage-attributes-1+json"
-    json = apipatch(session, url,
-      f"/api/specialization-layer-service/issue-families", data, contentType,
-      params)
+    def patch(batch):
+        data, chunk = batch
+        body = {k: v for k, v in data.items() if k != 'filter'}
+        body['filter'] = triageFilter(chunk)
+        return apipatch(session, url,
+          f"/api/specialization-layer-service/issue-families", body, contentType,
+          params)
+    batches = []
+    for data, issueIds in groups:
+        for chunk in triageChunks(list(dict.fromkeys(issueIds))):
+            batches.append((data, chunk))
+    if len(batches) == 1 or workers <= 1:
+        for batch in batches:
+            patch(batch)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(patch, batches))
+
+# Apply the same triage data to many issues with as few requests as possible:
+# the issue IDs are packed into chunked "=in=(...)" filters which are sent
+# in parallel
+# Arguments:
+# - session
+# - url
+# - list of issue Ids
+# - project Id
+# - branch Id
+# - triage data (See setTriage, without the filter)
+# - workers (optional, defaults to MAX_TRIAGE_WORKERS)
+# Returns:
+# - Nothing. apipatch raises PolarisHTTPError if there was a non-successful patch
+def setTriageBulk(session, url, issueIds, projectId, branchId, data, workers=None):
+    sendTriages(session, url, [(data, issueIds)], projectId, branchId, workers)
+    return
+
+# Triage many issues, each with its own triage data. Issues with identical
+# triage data are grouped into the same requests.
+# Arguments:
+# - session
+# - url
+# - dictionary of triage data (See setTriage, without the filter), keyed on issue Id
+# - project Id
+# - branch Id
+# - workers (optional, defaults to MAX_TRIAGE_WORKERS)
+# Returns:
+# - Nothing. apipatch raises PolarisHTTPError if there was a non-successful patch
+def setTriages(session, url, triages, projectId, branchId, workers=None):
+    groups = {}
+    for issueId, data in triages.items():
+        key = json.dumps({k: v for k, v in data.items() if k != 'filter'},
+          sort_keys=True)
+        groups.setdefault(key, []).append(issueId)
+    sendTriages(session, url,
+      [(json.loads(key), issueIds) for key, issueIds in groups.items()],
+      projectId, branchId, workers)
     return
 
 # Create an Application
@@ -573,8 +1839,7 @@ def createApplication(session, url, name, description=None):
     exec = getExecutionMode(session, url)
     if exec is None:
         # This is a fatal error, we must have a valid subscription type
-        print("ERROR: No valid subscription for tenant")
-        sys.exit(1)
+        raise PolarisError("No valid subscription for tenant")
     data = {
         'name': name,
         'itemType': "APPLICATION",
@@ -613,8 +1878,6 @@ def createBranch(session, url, pid, name, description=None):
         'autoDeleteSettingsCustomized':None
     }
 
-    portfolioId = getPortfolioId(session, url)
-
     resp = apipost(session, url, f"/api/portfolio/portfolio-sub-items/{pid}/branches", data,
       'application/vnd.synopsys.pm.branches-1+json')
 
@@ -0,0 +1,485 @@
+import aiohttp
+import asyncio
+import contextlib
+import jsoncodec
+import polarislib
+from polarislib import (getNextAndFirst, fixAuthUrl, getPageUrls, issueParams,
+    issueIncludes, issueFilter, andFilter, skipIssue, retryDelay, PolarisError,
+    PolarisHTTPError, PolarisNotFoundError, PolarisPaginationError, RETRY_STATUSES,
+    POST_RETRY_STATUSES, MAX_RETRIES)
+import time
+'''
+asyncio flavour of polarislib.
+
+Every function mirrors the one of the same name in polarislib.py, takes the
+same arguments and returns the same data, but is a coroutine (or an async
+generator for the iter* functions) running on an aiohttp.ClientSession.
+The session's connector is the connection pool: it caps how many requests
+are in flight at once, so many projects can be pulled from one process by
+gathering coroutines without flooding the API.
+
+    async def main():
+        async with createSession(url, token, maxConcurrency=20) as session:
+            issues = await asyncio.gather(
+                *[getIssues(session, url, pid) for pid in projectIds])
+    asyncio.run(main())
+
+Errors are raised as the same PolarisError types as polarislib, after the
+same retry policy (RETRY_STATUSES, MAX_RETRIES, Retry-After), and requests
+share polarislib's rate limit (setRateLimit).
+
+The Polaris URL is only ever used as a prefix, so a local stub server
+(e.g. "http://127.0.0.1:8080") works just as well as the real thing.
+'''
+
+# Default number of requests a session keeps in flight at the same time
+MAX_CONCURRENCY = 10
+
+# Create a session, as "async with createSession(...) as session:". The
+# connector is only built on entering, inside the running event loop it
+# belongs to, and the pooled connections are closed on leaving.
+# Arguments:
+#  - Polaris URL
+#  - API token
+#  - maxConcurrency (optional): total open connections / requests in flight
+#  - maxPerHost (optional): open connections per host
+# Returns:
+#  - async context manager yielding an aiohttp.ClientSession
+@contextlib.asynccontextmanager
+async def createSession(url, token, maxConcurrency=None, maxPerHost=None):
+    if maxConcurrency == None:
+        maxConcurrency = MAX_CONCURRENCY
+    # aiohttp asks for the encodings it can decode itself
+    headers = {'API-TOKEN': token}
+    connector = aiohttp.TCPConnector(limit=maxConcurrency,
+      limit_per_host=maxPerHost or 0)
+    async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+        yield session
+
+# Wait for polarislib's rate limiter (if any) without blocking the loop
+async def rateLimit():
+    limiter = polarislib.rateLimiter
+    if limiter is None:
+        return
+    while True:
+        wait = limiter.tryAcquire()
+        if not wait:
+            return
+        await asyncio.sleep(wait)
+
+# Send a request, retrying transient failures like polarislib.request
+# Returns:
+#  - (response, body bytes) of the last attempt, whatever its status
+async def request(session, method, api, **kwargs):
+    retryStatuses = POST_RETRY_STATUSES if method == 'POST' else RETRY_STATUSES
+    attempt = 0
+    while True:
+        await rateLimit()
+        started = time.perf_counter()
+        try:
+            async with session.request(method, api, **kwargs) as response:
+                body = await response.read()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            for hook in polarislib.requestHooks:
+                hook(method, api, None, time.perf_counter() - started, 0, attempt)
+            if method == 'POST' or attempt >= MAX_RETRIES:
+                raise PolarisError(f"{method} {api} failed: {e}") from e
+            await asyncio.sleep(retryDelay(attempt))
+            attempt += 1
+            continue
+        for hook in polarislib.requestHooks:
+            hook(method, api, response.status, time.perf_counter() - started,
+              polarislib.transferSize(response.headers, body), attempt)
+        if response.status not in retryStatuses or attempt >= MAX_RETRIES:
+            return response, body
+        await asyncio.sleep(retryDelay(attempt, response))
+        attempt += 1
+
+def decode(body):
+    try: return(jsoncodec.loads(body))
+    except ValueError: return(body.decode('utf-8', 'replace'))
+
+async def getresp(session, api, params=None, headers=None):
+    if params == None:
+        params = {}
+    if headers == None:
+        headers = {}
+    response, body = await request(session, 'GET', api, params=params, headers=headers)
+    if (response.status >= 300):
+        raise PolarisHTTPError('GET', api, response.status, decode(body), response)
+    return(jsoncodec.loads(body))
+
+# General GET function, see polarislib.apiget
+async def apiget(session, url, endpoint, params=None, headers=None):
+    if params == None:
+        params = {}
+    api = url+endpoint
+    json = await getresp(session, api, params, headers)
+    return(json)
+
+# Async generator version of apigetitems, see polarislib.iterItems.
+# Offset/limit paginated responses have their remaining pages fetched
+# concurrently (bounded by the session's connection pool, with at most
+# "window" pages requested ahead of the caller). Items come out in server order.
+# A page that keeps failing raises PolarisPaginationError; pass its resumeUrl
+# back as resumeFrom to carry on from there.
+# Arguments:
+#  - Session
+#  - Polaris URL
+#  - API URL
+#  - parameters (optional)
+#  - headers (optional)
+#  - window (optional, defaults to MAX_CONCURRENCY; 1 disables prefetching)
+#  - resumeFrom (optional): page URL to start from instead of the first page
+# Yields:
+#  The _items returned by API, one at a time
+async def iterItems(session, url, endpoint, params=None, headers=None, window=None,
+                    resumeFrom=None):
+    if params == None:
+        params = {}
+    if window == None:
+        window = MAX_CONCURRENCY
+    if resumeFrom:
+        api, params = resumeFrom, {}
+    else:
+        api = url+endpoint
+    json = await getresp(session, api, params, headers)
+    pages = [1]
+    try:
+        async for item in pageItems(session, url, json, window, pages):
+            yield item
+    finally:
+        for hook in polarislib.paginationHooks:
+            hook(api, pages[0])
+
+# The items of a paginated response, starting from its first page (json),
+# counting pages read in pageCount[0]. See iterItems.
+async def pageItems(session, url, json, window, pageCount):
+    nextpage,firstpage = getNextAndFirst(json.get('_links', ()))
+    for item in json['_items']:
+        yield item
+    if nextpage and nextpage != firstpage and window > 1:
+        pages = getPageUrls(json, fixAuthUrl(url, nextpage))
+        if pages is not None:
+            pending = []
+            try:
+                for page in pages:
+                    if len(pending) >= window:
+                        for item in await nextPageItems(pending):
+                            yield item
+                        pageCount[0] += 1
+                    pending.append((page, asyncio.ensure_future(getresp(session, page))))
+                while pending:
+                    for item in await nextPageItems(pending):
+                        yield item
+                    pageCount[0] += 1
+            finally:
+                # Caller stopped early (or a page failed): drop the rest
+                for page, task in pending:
+                    task.cancel()
+            return
+    while nextpage:
+        if nextpage == firstpage:
+            # Nothing to paginate, we already yielded what we got.
+            return
+        nextpage = fixAuthUrl(url, nextpage)
+        try:
+            json = await getresp(session, nextpage)
+        except PolarisError as e:
+            raise PolarisPaginationError(nextpage, e) from e
+        pageCount[0] += 1
+        nextpage,firstpage = getNextAndFirst(json.get('_links', ()))
+        for item in json['_items']:
+            yield item
+
+# Wait for the oldest prefetched page and return its _items
+async def nextPageItems(pending):
+    page, task = pending.pop(0)
+    try:
+        return((await task)['_items'])
+    except PolarisError as e:
+        raise PolarisPaginationError(page, e) from e
+
+# General GET function that returns every _items, see polarislib.apigetitems
+async def apigetitems(session, url, endpoint, params=None, headers=None, window=None,
+                      resumeFrom=None):
+    return(await collectItems(iterItems(session, url, endpoint, params, headers,
+      window, resumeFrom)))
+
+async def collectItems(items):
+    data = []
+    try:
+        async for item in items:
+            data.append(item)
+    except PolarisPaginationError as e:
+        e.items = data
+        raise
+    return(data)
+
+# General POST function, see polarislib.apipost
+async def apipost(session, url, endpoint, body, contentType):
+    headers = {'content-type': contentType}
+    response, content = await request(session, 'POST', url + endpoint,
+      headers=headers, data=jsoncodec.dumps(body))
+    if (response.status == 409):
+        # This means the item already exists
+        try: print("WARNING: ", jsoncodec.loads(content)['detail'])
+        except: print("No detail provided")
+        return(jsoncodec.loads(content))
+    if (response.status >= 300):
+        raise PolarisHTTPError('POST', url + endpoint, response.status,
+          decode(content), response)
+    if (response.status == 204):
+        # No content but post was OK
+        return
+    else:
+        return(jsoncodec.loads(content))
+
+# General PATCH function, see polarislib.apipatch
+async def apipatch(session, url, endpoint, body, contentType, params=None):
+    headers = {'content-type': contentType}
+    if params == None:
+        params = {}
+    response, content = await request(session, 'PATCH', url + endpoint,
+      headers=headers, data=jsoncodec.dumps(body), params=params)
+    if (response.status >= 300):
+        raise PolarisHTTPError('PATCH', url + endpoint, response.status,
+          decode(content), response)
+    try: return(jsoncodec.loads(content))
+    except: return None
+
+async def getPortfolioId(session, url):
+    resp = await apigetitems(session, url, "/api/portfolio/portfolios")
+    return(resp[0]['id'])
+
+async def getApplicationId(session, url, pid, name):
+    params = {'name': name}
+    resp = await apigetitems(session, url,
+      f"/api/portfolio/portfolios/{pid}/portfolio-items",
+      params)
+    try:
+        return(resp[0]['id'])
+    except IndexError:
+        raise PolarisNotFoundError(f"Application {name} not found")
+
+async def getProjectId(session, url, aid, name):
+    params = {'name': name}
+    resp = await apigetitems(session, url,
+      f"/api/portfolio/portfolio-items/{aid}/portfolio-sub-items",
+      params)
+    try:
+        return(resp[0]['id'])
+    except IndexError:
+        raise PolarisNotFoundError(f"Project {name} not found")
+
+async def getBranchId(session, url, pid, name, nonfatal=False):
+    headers = {'content-type':
+      "application/vnd.synopsys.pm.branches-1+json"}
+    params = {'_filter' : f"name=={name}"}
+    resp = await apigetitems(session, url,
+      f"/api/portfolio/portfolio-sub-items/{pid}/branches",
+      params, headers)
+    try:
+        return(resp[0]['id'])
+    except IndexError:
+        if (nonfatal):
+            return None
+        else:
+            raise PolarisNotFoundError(f"Branch {name} not found")
+
+def iterIssues(session, url, pid, params=None, pageSize=None, profile=None,
+               include=None, skipDismissed=False, skipInformational=False):
+    params = issueParams(pid, params, issueIncludes(profile, include), pageSize)
+    if skipDismissed or skipInformational:
+        return(iterFilteredIssues(session, url, params, skipDismissed,
+          skipInformational))
+    return(iterItems(session, url, "/api/findings/issues", params))
+
+async def iterFilteredIssues(session, url, params, skipDismissed, skipInformational):
+    serverFilter = issueFilter(skipDismissed, skipInformational)
+    if (url, serverFilter) not in polarislib.unsupportedFilters:
+        filtered = dict(params)
+        filtered['_filter'] = andFilter(params.get('_filter'), serverFilter)
+        started = False
+        try:
+            async for issue in iterItems(session, url, "/api/findings/issues",
+                                         filtered):
+                started = True
+                yield issue
+            return
+        except PolarisHTTPError as e:
+            if started or e.status != 400:
+                raise
+            polarislib.unsupportedFilters.add((url, serverFilter))
+    async for issue in iterItems(session, url, "/api/findings/issues", params):
+        if not skipIssue(issue, skipDismissed, skipInformational):
+            yield issue
+
+async def getIssues(session, url, pid, params=None, pageSize=None, profile=None,
+                    include=None, skipDismissed=False, skipInformational=False):
+    return(await collectItems(iterIssues(session, url, pid, params, pageSize,
+      profile, include, skipDismissed, skipInformational)))
+
+async def getRoles(session, url):
+    resp = await apigetitems(session, url, "/api/ciam/roles")
+    return({item['name']: item['id'] for item in resp})
+
+async def getAppRoles(session, url):
+    resp = await apigetitems(session, url, "/api/ciam/resources/applications/roles")
+    return({item['name']: item['id'] for item in resp})
+
+async def getUserRoles(session, url, userid):
+    resp = await apigetitems(session, url, f"/api/ciam/users/{userid}/roles")
+    return({item['name']: item['id'] for item in resp})
+
+async def getUserId(session, url, email):
+    params = {'_filter': f'email=={email}'}
+    resp = await apigetitems(session, url, "/api/ciam/users", params=params)
+    try: return(resp[0]['id'])
+    except: return(None)
+
+async def getGroupId(session, url, name):
+    params = {'_filter': f'search=="{name}"'}
+    resp = await apigetitems(session, url, "/api/ciam/groups", params=params)
+    try: return(resp[0]['id'])
+    except: return(None)
+
+async def getTenantId(session, url):
+    resp = await apiget(session, url, "/api/ciam/openid-connect/userinfo")
+    return(resp['organization']['id'])
+
+async def getSubscriptions(session, url):
+    params = {'_filter': 'isActive==true'}
+    headers = {'content-type': "application/vnd.synopsys.ses.subscription-2+json", \
+               'accept': "application/vnd.synopsys.ses.subscription-2+json"}
+    tenant = await getTenantId(session, url)
+    resp = await apigetitems(session, url,
+      f"/api/entitlement-service/tenants/{tenant}/subscriptions", params=params,
+      headers=headers)
+    return([item['id'] for item in resp])
+
+async def getEntitlements(session, url):
+    params = {'_filter': 'isActive==true'}
+    headers = {'content-type': "application/vnd.synopsys.ses.entitlement-3+json", \
+               'accept': "application/vnd.synopsys.ses.entitlement-3+json"}
+    tenant = await getTenantId(session, url)
+    resp = await apigetitems(session, url,
+      f"/api/entitlement-service/tenants/{tenant}/entitlements", params=params,
+      headers=headers)
+    return([item['id'] for item in resp])
+
+async def getExecutionMode(session, url):
+    params = {'_filter': 'isActive==true'}
+    headers = {'content-type': "application/vnd.synopsys.ses.entitlement-3+json", \
+               'accept': "application/vnd.synopsys.ses.entitlement-3+json"}
+    tenant = await getTenantId(session, url)
+    resp = await apigetitems(session, url,
+      f"/api/entitlement-service/tenants/{tenant}/entitlements", params=params,
+      headers=headers)
+    try: return(resp[0]['executionMode'].upper())
+    except: return None
+
+async def createUser(session, url, email, first, last):
+    data = {
+        'email': email,
+        'firstName': first,
+        'lastName': last,
+        'enabled': 'true'
+    }
+    resp = await apipost(session, url, "/api/ciam/users", data, 'application/vnd.synopsys.ciam.user-1+json')
+    try:
+        return(resp['id'])
+    except:
+        # Non-fatal warning, probably that the user already existed
+        return None
+
+async def setUserRole(session, url, userId, roleId):
+    data = {'roles': [{'id': roleId}]}
+    await apipost(session, url, "/api/ciam/users/" + userId + "/roles", data, \
+      'application/vnd.synopsys.ciam.user-role-1+json')
+
+async def setUserAppRole(session, url, userId, appId, roleId):
+    data = {'userIds': [userId]}
+    await apipost(session, url, "/api/ciam/resources/applications/" + appId + \
+      "/roles/" + roleId + "/users", data, \
+      'application/vnd.synopsys.ciam.application-role-user-1+json')
+
+async def setGroupAppRole(session, url, groupId, appId, roleId):
+    data = {'assignments': [{"groupId": groupId, "roleId": roleId}]}
+    await apipost(session, url, "/api/ciam/applications/" + appId + \
+      "/groups", data, \
+      'application/vnd.synopsys.ciam.application-group-role-1+json')
+
+async def createGroup(session, url, name):
+    data = {'name': name}
+    resp = await apipost(session, url, "/api/ciam/groups", data, 'application/vnd.synopsys.ciam.group-1+json')
+    try:
+        return(resp['id'])
+    except:
+        # Non-fatal warning, probably that the group already existed
+        return None
+
+async def addUserToGroup(session, url, userid, groupid):
+    data = [{"userId":userid}]
+    await apipatch(session, url, f"/api/ciam/groups/{groupid}/users", data,
+      'application/vnd.synopsys.ciam.group-user-1+json')
+
+async def setTriage(session, url, issueId, projectId, branchId, data):
+    # See polarislib.setTriage for the layout of data
+    data = dict(data, filter=polarislib.triageFilter([issueId]))
+    params = {'projectId': projectId, 'branchId': branchId}
+    contentType = "application/vnd.synopsys.polaris-one.issue-management.issue-family-bulk-triage-attributes-1+json"
+    await apipatch(session, url,
+      "/api/specialization-layer-service/issue-families", data, contentType,
+      params)
+
+async def createApplication(session, url, name, description=None):
+    entitle, exec, portfolioId = await asyncio.gather(
+      getEntitlements(session, url), getExecutionMode(session, url),
+      getPortfolioId(session, url))
+    if exec is None:
+        # This is a fatal error, we must have a valid subscription type
+        raise PolarisError("No valid subscription for tenant")
+    data = {
+        'name': name,
+        'itemType': "APPLICATION",
+        'description': description,
+        'subscriptionTypeUsed': exec,
+        'entitlements': {'entitlementIds' :  entitle }
+    }
+    resp = await apipost(session, url, f"/api/portfolio/portfolios/{portfolioId}/portfolio-items", data,
+      'application/vnd.synopsys.pm.portfolio-items-2+json')
+    try:
+        return(resp['id'])
+    except:
+        # Non-fatal warning, probably due to application already existing
+        return None
+
+async def createBranch(session, url, pid, name, description=None):
+    data = {
+        'name':name,
+        'isDefault':"false",
+        'source':"USER",
+        'description':description,
+        'autoDeleteSetting':"false",
+        'branchRetentionPeriodSetting':None,
+        'autoDeleteSettingsCustomized':None
+    }
+    resp = await apipost(session, url, f"/api/portfolio/portfolio-sub-items/{pid}/branches", data,
+      'application/vnd.synopsys.pm.branches-1+json')
+    try:
+        return(resp['id'])
+    except:
+        # Non-fatal warning, probably due to branch already existing
+        return None
+
+async def setBranchPolicyDefault(session, url, branchId):
+    data = {
+        "enable":"true",
+        "inheritParentPolicies":"true",
+        "associationId":branchId,
+        "associationType":"branch",
+        "assignedPolicies":[]
+    }
+    await apipost(session, url, "/api/policies/portfolio-policy-configuration", data,
+      'application/vnd.synopsys.polaris.policy.portfolio-policy-configuration-1+json')
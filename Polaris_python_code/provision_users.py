@@ -0,0 +1,243 @@
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from polarislib import (createSession, getUsers, getGroups, getRoles, getAppRoles,
+    getUserRoles, getGroupUsers, createUser, createGroup, getUserId, getGroupId,
+    setUserRole, addUsersToGroup, setUsersAppRole, RateLimiter, PolarisError)
+
+# Bulk user/group provisioning on top of polarislib.
+#
+# The roster is a CSV file with the columns
+#   email, firstName, lastName, role, groups, applications
+# where "groups" is a ";" separated list of group names and "applications" a
+# ";" separated list of "<application id>=<application role name>" pairs,
+# or a JSON file with a list of objects using the same keys ("groups" as a
+# list, "applications" as an object mapping application id to role name).
+#
+# Current state is read with a handful of list calls (all users, all groups,
+# roles) plus one call per group / per user role that needs checking, then
+# only the missing users, groups, roles and memberships are sent. Group
+# memberships and application roles go out as one request per group and
+# per (application, role) pair instead of one per user.
+#
+# Known API limit: the CIAM API has no bulk listing of user roles, so
+# checking the global role still costs one request per existing user with a
+# "role" in the roster (benchmark.py: about 1060 requests in all for 1000
+# users, 1000 of them role lookups). Leave "role" empty for users whose role
+# should not be managed. Application roles are not read back; their
+# (idempotent) requests are sent on every run.
+#
+# Users and groups that can neither be created nor found are reported and
+# left out of the later steps; the script then exits with status 1.
+
+# Requests in flight at the same time
+DEFAULT_WORKERS = 8
+# Requests per second sent to the API
+DEFAULT_RATE = 10
+# Users per group PATCH / application role POST
+BATCH_SIZE = 100
+
+# argparse type for --workers and --rate
+def positive(convert):
+    def parse(value):
+        number = convert(value)
+        if number <= 0:
+            raise argparse.ArgumentTypeError(f"must be greater than 0: {value}")
+        return number
+    return parse
+
+def split_list(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [v.strip() for v in value if v.strip()]
+    return [v.strip() for v in value.split(";") if v.strip()]
+
+def split_applications(value):
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return dict(value)
+    applications = {}
+    for pair in split_list(value):
+        app_id, _, role = pair.partition("=")
+        applications[app_id.strip()] = role.strip()
+    return applications
+
+# Read a CSV or JSON roster into a list of normalized entries
+def load_roster(path):
+    with open(path, newline="") as f:
+        if path.lower().endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+    roster = []
+    for row in rows:
+        roster.append({
+            "email": row["email"].strip(),
+            "firstName": (row.get("firstName") or "").strip(),
+            "lastName": (row.get("lastName") or "").strip(),
+            "role": (row.get("role") or "").strip() or None,
+            "groups": split_list(row.get("groups")),
+            "applications": split_applications(row.get("applications")),
+        })
+    return roster
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class Provisioner:
+    def __init__(self, session, url, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+                 dry_run=False):
+        self.session = session
+        self.url = url
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.dry_run = dry_run
+        self.mutations = 0
+        self.failures = []
+
+    # Run fn(*args) for every args tuple, concurrently and rate limited.
+    # Returns the results in order.
+    def run(self, fn, calls):
+        def limited(args):
+            self.limiter.acquire()
+            return fn(self.session, self.url, *args)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(limited, calls))
+
+    # Same as run, but only counts (and prints) the calls in dry-run mode
+    def mutate(self, description, fn, calls):
+        calls = list(calls)
+        if not calls:
+            return []
+        self.mutations += len(calls)
+        print(f"{description}: {len(calls)} request(s)")
+        if self.dry_run:
+            return [None] * len(calls)
+        return self.run(fn, calls)
+
+    # ID of a user or group that was just created (created_id), or found by
+    # lookup if it already existed. In dry-run mode nothing was created and a
+    # placeholder stands in for the new ID. Returns None if neither worked.
+    def resolve(self, kind, name, created_id, lookup):
+        if self.dry_run:
+            return f"<new:{name}>"
+        if created_id is None:
+            # Created concurrently by someone else, look it up
+            created_id = lookup(self.session, self.url, name)
+        if created_id is None:
+            print(f"ERROR: Could not create or find {kind} {name}")
+            self.failures.append((kind, name))
+        return created_id
+
+    def provision(self, roster):
+        # Current state, fetched in parallel
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            users_f = pool.submit(getUsers, self.session, self.url)
+            groups_f = pool.submit(getGroups, self.session, self.url)
+            roles_f = pool.submit(getRoles, self.session, self.url)
+            app_roles_f = pool.submit(getAppRoles, self.session, self.url)
+            users, groups = users_f.result(), groups_f.result()
+            roles, app_roles = roles_f.result(), app_roles_f.result()
+
+        # Users
+        missing = [entry for entry in roster if entry["email"].lower() not in users]
+        created = self.mutate("Create users", createUser,
+            [(e["email"], e["firstName"], e["lastName"]) for e in missing])
+        for entry, user_id in zip(missing, created):
+            user_id = self.resolve("user", entry["email"], user_id, getUserId)
+            if user_id is not None:
+                users[entry["email"].lower()] = user_id
+        roster = [e for e in roster if e["email"].lower() in users]
+        missing = [e for e in missing if e["email"].lower() in users]
+        user_ids = {e["email"]: users[e["email"].lower()] for e in roster}
+
+        # Global roles: only existing users can already have the right one
+        wanted = [e for e in roster if e["role"]]
+        for entry in wanted:
+            if entry["role"] not in roles:
+                print(f"ERROR: Unknown role {entry['role']} for {entry['email']}")
+                sys.exit(1)
+        missing_emails = {e["email"] for e in missing}
+        existing = [e for e in wanted if e["email"] not in missing_emails]
+        current = self.run(getUserRoles, [(user_ids[e["email"]],) for e in existing])
+        needs_role = [e for e in missing if e["role"]]
+        needs_role += [e for e, have in zip(existing, current) if e["role"] not in have]
+        self.mutate("Set user roles", setUserRole,
+            [(user_ids[e["email"]], roles[e["role"]]) for e in needs_role])
+
+        # Groups
+        group_members = {}
+        for entry in roster:
+            for name in entry["groups"]:
+                group_members.setdefault(name, []).append(user_ids[entry["email"]])
+        new_groups = [name for name in group_members if name not in groups]
+        for name, group_id in zip(new_groups, self.mutate("Create groups",
+                createGroup, [(name,) for name in new_groups])):
+            group_id = self.resolve("group", name, group_id, getGroupId)
+            if group_id is not None:
+                groups[name] = group_id
+        group_members = {name: ids for name, ids in group_members.items()
+                         if name in groups}
+        old_groups = [name for name in group_members if name not in new_groups]
+        current = self.run(getGroupUsers, [(groups[name],) for name in old_groups])
+        members = dict(zip(old_groups, [set(ids) for ids in current]))
+        additions = []
+        for name, ids in group_members.items():
+            todo = [i for i in dict.fromkeys(ids) if i not in members.get(name, ())]
+            for batch in batches(todo, BATCH_SIZE):
+                additions.append((batch, groups[name]))
+        self.mutate("Add users to groups", addUsersToGroup, additions)
+
+        # Application roles, one request per (application, role)
+        assignments = {}
+        for entry in roster:
+            for app_id, role in entry["applications"].items():
+                if role not in app_roles:
+                    print(f"ERROR: Unknown application role {role} for {entry['email']}")
+                    sys.exit(1)
+                assignments.setdefault((app_id, app_roles[role]), []).append(
+                    user_ids[entry["email"]])
+        calls = []
+        for (app_id, role_id), ids in assignments.items():
+            for batch in batches(list(dict.fromkeys(ids)), BATCH_SIZE):
+                calls.append((batch, app_id, role_id))
+        self.mutate("Set application roles", setUsersAppRole, calls)
+
+        print(f"Done: {self.mutations} mutation request(s) for {len(roster)} user(s)")
+        return self.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Provision Polaris users, groups and roles from a roster.")
+    parser.add_argument("url", help="Polaris URL")
+    parser.add_argument("token", help="Polaris API token")
+    parser.add_argument("roster", help="CSV or JSON roster file")
+    parser.add_argument("--workers", type=positive(int), default=DEFAULT_WORKERS,
+        help="Requests in flight at the same time (default: %(default)s)")
+    parser.add_argument("--rate", type=positive(float), default=DEFAULT_RATE,
+        help="Maximum requests per second (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true",
+        help="Only print which changes would be made")
+    args = parser.parse_args()
+
+    roster = load_roster(args.roster)
+    session = createSession(args.url, args.token, poolSize=args.workers)
+    try:
+        failures = Provisioner(session, args.url, args.workers, args.rate,
+                               args.dry_run).provision(roster)
+    except PolarisError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    if failures:
+        print(f"ERROR: {len(failures)} user(s)/group(s) could not be provisioned")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
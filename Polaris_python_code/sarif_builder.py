@@ -0,0 +1,843 @@
+import glob
+import gzip
+import json
+import jsoncodec
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from collections import deque
+from itertools import islice
+
+from issue_loader import split_json_dump, read_json_range
+from polarislib import issueDismissed
+from issue_store import is_store, iter_issues
+
+# SARIF construction shared by extract_findings.py and sarif_converter.py.
+#
+# SarifBuilder converts Polaris issues one at a time in a single pass:
+#  - the occurrence and triage properties are read in one scan per list,
+#    picking out only the keys the SARIF output needs
+#  - rules and artifacts are deduplicated through dicts (O(1) per issue),
+#    and every result of an artifact shares that artifact's location entry
+#  - the Polaris issue link prefix is built once per project
+#
+# rule_mode picks what a SARIF rule stands for:
+#  - "issue" (default): one rule per issue, with the issue ID as rule ID and
+#    the issue's Polaris link as help URI
+#  - "type": one rule per issue type, so each description is written once
+#    however many issues share it. type.id is unique per issue in Polaris, so
+#    the rule ID is the weakness ID plus the type name ("w-0/Crawl Report"),
+#    which stays the same across issues and runs (see type_rule_id). The
+#    issue ID and Polaris link go into each result's properties instead, and
+#    the rule gets the highest security-severity of its issues.
+#
+#     builder = SarifBuilder(portfolio_id, application_id, project_id)
+#     for issue in issues:
+#         builder.add_issue(issue)
+#     json.dump(builder.document(), f, indent=2)
+#
+# SarifWriter streams the results to disk instead of keeping them in the
+# builder, for issue sets too big to hold as one document in memory.
+#
+# Both take add_issues(issues, jobs=N), and SarifWriter also
+# add_dump(path, jobs=N), to convert in N processes: the issues are cut into
+# shards, each shard is converted with its own rule and artifact tables, and
+# the shards are merged in order, so the output is the same as with a single
+# process.
+#
+# ShardedSarifWriter splits the output over several SARIF files, each with
+# its own rule table, to stay within upload limits on size and result count.
+
+SARIF_VERSION = "2.1.0"
+TOOL_NAME = "DAST-Scanner"
+POLARIS_UI_URL = "https://eu.polaris.blackduck.com"
+ISSUE_URL_FILTER = "?filter=triage%3Astatus%3Dnot-dismissed%2Cto-be-fixed"
+
+# portfolio/application/project IDs in the "context" links of an issue
+CONTEXT_LINK = re.compile(
+    r"/portfolios/(?P<portfolio>[^/]+)/applications/(?P<application>[^/]+)"
+    r"/projects/(?P<project>[^/?]+)")
+
+# Occurrence properties used in the SARIF output
+SEVERITY = "severity"
+CWE = "cwe"
+OVERALL_SCORE = "overall-score"
+OCCURRENCE_KEYS = frozenset((SEVERITY, CWE, OVERALL_SCORE))
+
+RULE_MODES = ("issue", "type")
+
+# Ways ShardedSarifWriter can group results into files
+SPLIT_BY = ("severity", "artifact")
+
+# Issues per shard for parallel conversion
+SHARD_SIZE = 2000
+# Bytes of issue dump per shard for parallel conversion
+SHARD_BYTES = 8 << 20
+
+
+# Single pass over occurrenceProperties.
+# Returns (severity, cwe, overall score, informational?)
+def occurrence_properties(issue):
+    severity = cwe = overall_score = None
+    informational = False
+    for prop in issue.get("occurrenceProperties", ()):
+        key = prop.get("key")
+        if key not in OCCURRENCE_KEYS:
+            continue
+        if key == SEVERITY:
+            severity = str(prop.get("value", ""))
+            if severity.lower() == "informational":
+                informational = True
+        elif key == CWE:
+            cwe = prop.get("value")
+        else:
+            overall_score = prop.get("value")
+    return severity, cwe, overall_score, informational
+
+def score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def issue_description(issue_type):
+    localized = issue_type.get("_localized", {})
+    if isinstance(localized, dict):
+        other_details = localized.get("otherDetails", [])
+        if isinstance(other_details, list):
+            for detail in other_details:
+                if detail.get("key") == "description":
+                    return detail.get("value")
+    return None
+
+# Rule ID of the issue's type for rule_mode "type"
+def type_rule_id(issue):
+    issue_type = issue.get("type", {})
+    name = issue_type.get("altName") or issue_type.get("name")
+    weakness = issue.get("weaknessId")
+    parts = [str(part) for part in (weakness, name) if part]
+    return ("/".join(parts) or "PolarisIssueType")[:255]
+
+# (portfolio ID, application ID, project ID) from the issue's context links,
+# or None if the issue does not carry them
+def context_ids(issue):
+    for link in issue.get("context", {}).get("_links", ()):
+        match = CONTEXT_LINK.search(link.get("href", ""))
+        if match:
+            return match.group("portfolio", "application", "project")
+    return None
+
+
+class SarifBuilder:
+    # portfolio_id, application_id and project_id build the Polaris issue
+    # links; leave them out to take them from each issue's context instead.
+    # Dismissed and informational issues are skipped unless asked otherwise.
+    # With keep_results=False results are only returned by add_issue, not
+    # collected (see SarifWriter). rule_mode is one of RULE_MODES.
+    # automation_id sets the run's automationDetails.id (the upload category).
+    def __init__(self, portfolio_id=None, application_id=None, project_id=None,
+                 tool_name=TOOL_NAME, information_uri=None,
+                 skip_dismissed=True, skip_informational=True, keep_results=True,
+                 rule_mode="issue", automation_id=None):
+        if rule_mode not in RULE_MODES:
+            raise ValueError(f"Unknown rule mode {rule_mode!r}")
+        # Everything a shard builder needs to convert like this one
+        self.options = dict(portfolio_id=portfolio_id, application_id=application_id,
+                            project_id=project_id, tool_name=tool_name,
+                            information_uri=information_uri,
+                            skip_dismissed=skip_dismissed,
+                            skip_informational=skip_informational,
+                            rule_mode=rule_mode, automation_id=automation_id)
+        self.tool_name = tool_name
+        self.automation_id = automation_id
+        self.rule_mode = rule_mode
+        self.keep_results = keep_results
+        self.information_uri = information_uri
+        self.skip_dismissed = skip_dismissed
+        self.skip_informational = skip_informational
+        self.issue_url_prefix = None
+        if portfolio_id and application_id and project_id:
+            self.issue_url_prefix = self.url_prefix(
+                portfolio_id, application_id, project_id)
+        self.url_prefixes = {}
+        self.rules = []
+        self.rule_index = {}
+        self.artifacts = []
+        self.artifact_index = {}
+        self.artifact_locations = []
+        self.results = []
+
+    @staticmethod
+    def url_prefix(portfolio_id, application_id, project_id):
+        return (f"{POLARIS_UI_URL}/portfolio/portfolios/{portfolio_id}"
+                f"/portfolio-items/{application_id}/projects/{project_id}/issues/")
+
+    def issue_url(self, issue, rule_id):
+        prefix = self.issue_url_prefix
+        if prefix is None:
+            ids = context_ids(issue)
+            prefix = self.url_prefixes.get(ids)
+            if prefix is None:
+                prefix = self.url_prefix(*ids) if ids else f"{POLARIS_UI_URL}/issues/"
+                self.url_prefixes[ids] = prefix
+        return prefix + rule_id + ISSUE_URL_FILTER
+
+    # Index of the artifact for file_path, adding it on first use
+    def artifact(self, file_path):
+        index = self.artifact_index.get(file_path)
+        if index is None:
+            index = len(self.artifacts)
+            self.artifact_index[file_path] = index
+            self.artifacts.append({
+                "location": {
+                    "uri": file_path,
+                    "uriBaseId": "SRCROOT"
+                },
+                "sourceLanguage": "python"
+            })
+            self.artifact_locations.append({
+                "uri": file_path,
+                "uriBaseId": "SRCROOT",
+                "index": index
+            })
+        return index
+
+    # Index of the rule for this issue, adding it on first use. issue_url is
+    # the issue's Polaris link for per-issue rules, None for per-type rules.
+    def rule(self, issue, rule_id, rule_name, overall_score, issue_url):
+        index = self.rule_index.get(rule_id)
+        if index is not None:
+            if self.rule_mode == "type":
+                self.raise_severity(index, overall_score)
+            return index
+        index = len(self.rules)
+        self.rule_index[rule_id] = index
+        description = issue_description(issue.get("type", {})) or rule_name
+        rule_entry = {
+            "id": rule_id,
+            "name": rule_name,
+            "shortDescription": {
+                "text": rule_name
+            },
+            "fullDescription": {
+                "text": description
+            }
+        }
+        if issue_url is None:
+            # The description is already in fullDescription; repeating it
+            # here would store it three times per rule
+            rule_entry["help"] = {
+                "text": "See the rule description; each result links to its issue in Polaris."
+            }
+        else:
+            # Direct link to the specific issue in Polaris
+            rule_entry["helpUri"] = issue_url
+            rule_entry["help"] = {
+                "text": "Detailed explanation of the issue.",
+                "markdown": f"[View issue details in Polaris]({issue_url}) \n {description}"
+            }
+        if overall_score is not None:
+            rule_entry["properties"] = {"security-severity": str(overall_score)}
+        self.rules.append(rule_entry)
+        return index
+
+    # A per-type rule is as severe as its most severe issue
+    def raise_severity(self, index, overall_score):
+        new = score(overall_score)
+        if new is None:
+            return
+        properties = self.rules[index].setdefault("properties", {})
+        old = score(properties.get("security-severity"))
+        if old is None or new > old:
+            properties["security-severity"] = str(overall_score)
+
+    # Convert one issue. Returns the SARIF result, or None if it was skipped.
+    def add_issue(self, issue):
+        if self.skip_dismissed and issueDismissed(issue):
+            return None
+        severity, cwe, overall_score, informational = occurrence_properties(issue)
+        if self.skip_informational and informational:
+            return None
+
+        # Use issue ID (or type) as rule id, but include CWE in rule name if present
+        issue_id = str(issue.get("id", "PolarisIssueID"))[:255]
+        issue_type = issue.get("type", {})
+        base_rule_name = issue_type.get("altName", "Polaris Issue")
+        rule_name = f"{base_rule_name} ({cwe})" if cwe else base_rule_name
+        if self.rule_mode == "type":
+            rule_id = type_rule_id(issue)
+            rule_index = self.rule(issue, rule_id, rule_name, overall_score, None)
+        else:
+            rule_id = issue_id
+            rule_index = self.rule(issue, rule_id, rule_name, overall_score,
+                                   self.issue_url(issue, issue_id))
+
+        location = issue.get("location", {})
+        artifact_index = self.artifact(location.get("filePath", "POLARIS"))
+
+        physical_location = {
+            "artifactLocation": self.artifact_locations[artifact_index],
+            "region": {
+                "startLine": location.get("line", 1)
+            }
+        }
+        sarif_location = {"physicalLocation": physical_location}
+        logical_name = issue.get("function", None) or issue.get("logicalLocation", None)
+        if logical_name:
+            sarif_location["logicalLocations"] = [{"fullyQualifiedName": logical_name}]
+        result = {
+            "ruleId": rule_id,
+            "ruleIndex": rule_index,
+            "message": {
+                # Use a human-readable message
+                "text": issue.get("message") or rule_name
+            },
+            "locations": [sarif_location],
+        }
+        if self.rule_mode == "type":
+            result["properties"] = {
+                "polarisIssueId": issue_id,
+                "polarisIssueUrl": self.issue_url(issue, issue_id)
+            }
+        if self.keep_results:
+            self.results.append(result)
+        return result
+
+    def add_issues(self, issues, jobs=1):
+        if jobs > 1:
+            for result in convert_parallel(self, issue_tasks(issues), jobs):
+                if self.keep_results:
+                    self.results.append(result)
+            return self
+        for issue in issues:
+            self.add_issue(issue)
+        return self
+
+    # Take over the results of a shard converted by another builder (see
+    # convert_shard): its rules and artifacts are added to this builder's
+    # tables like add_issue would, and the results are re-indexed to match.
+    # Returns the re-indexed results.
+    def merge(self, rules, artifacts, results):
+        rule_map = []
+        for rule in rules:
+            index = self.rule_index.get(rule["id"])
+            if index is None:
+                index = len(self.rules)
+                self.rule_index[rule["id"]] = index
+                self.rules.append(rule)
+            elif self.rule_mode == "type":
+                self.raise_severity(index,
+                    rule.get("properties", {}).get("security-severity"))
+            rule_map.append(index)
+        artifact_map = [self.artifact(artifact["location"]["uri"])
+                        for artifact in artifacts]
+        for result in results:
+            result["ruleIndex"] = rule_map[result["ruleIndex"]]
+            physical_location = result["locations"][0]["physicalLocation"]
+            physical_location["artifactLocation"] = self.artifact_locations[
+                artifact_map[physical_location["artifactLocation"]["index"]]]
+        return results
+
+    def run(self):
+        driver = {"name": self.tool_name}
+        if self.information_uri:
+            driver["informationUri"] = self.information_uri
+        driver["rules"] = self.rules
+        run = {
+            "tool": {
+                "driver": driver
+            },
+            "artifacts": self.artifacts,
+            "results": self.results
+        }
+        if self.automation_id:
+            run["automationDetails"] = {"id": self.automation_id}
+        return run
+
+    # The complete SARIF log
+    def document(self):
+        return {
+            "version": SARIF_VERSION,
+            "runs": [self.run()]
+        }
+
+
+# Convert one shard of issues in a worker process.
+# Returns (rules, artifacts, results) for SarifBuilder.merge.
+def convert_shard(options, issues):
+    builder = SarifBuilder(**options)
+    builder.add_issues(issues)
+    return builder.rules, builder.artifacts, builder.results
+
+# Same for a byte range of an issue dump, decoded by the worker itself
+def convert_range(options, path, start, end, details):
+    return convert_shard(options, read_json_range(path, start, end, details))
+
+def shards(issues, size):
+    issues = iter(issues)
+    while True:
+        shard = list(islice(issues, size))
+        if not shard:
+            return
+        yield shard
+
+# Run (fn, args) shard conversions in jobs processes, yielding the results in
+# shard order, with the rules and artifacts collected in builder. At most two
+# shards per process are in flight, so the input can be streamed.
+# The workers are spawned rather than forked: extract_findings converts
+# several projects at once from threads, and forking a threaded process
+# can copy locks (HTTP pools, logging) in a held state.
+def convert_parallel(builder, tasks, jobs):
+    # multiprocessing is only imported when it is used
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=get_context("spawn")) as pool:
+        pending = deque()
+        for fn, args in tasks:
+            pending.append(pool.submit(fn, builder.options, *args))
+            if len(pending) >= 2 * jobs:
+                yield from builder.merge(*pending.popleft().result())
+        while pending:
+            yield from builder.merge(*pending.popleft().result())
+
+def issue_tasks(issues, shard_size=SHARD_SIZE):
+    return ((convert_shard, (shard,)) for shard in shards(issues, shard_size))
+
+# Tasks converting an issue dump or store. Dumps written with indent=2 are
+# cut into byte ranges, so reading and decoding happen in the workers too;
+# anything else is decoded here and sent over in shards.
+def dump_tasks(path, jobs, details=None, shard_bytes=SHARD_BYTES):
+    ranges = None
+    if not is_store(path):
+        parts = max(jobs, os.path.getsize(path) // shard_bytes)
+        ranges = split_json_dump(path, parts)
+    if ranges is None:
+        return issue_tasks(iter_issues(path, details))
+    return ((convert_range, (path, start, end, details)) for start, end in ranges)
+
+
+# Placeholders marking where the streamed lists go in the document
+RESULTS_MARKER = "__SARIF_RESULTS__"
+RULES_MARKER = "__SARIF_RULES__"
+ARTIFACTS_MARKER = "__SARIF_ARTIFACTS__"
+# Line starts of the list elements: results and artifacts sit four levels
+# deep in the document, rules six
+RESULT_INDENT = "\n" + " " * 8
+RULE_INDENT = "\n" + " " * 12
+ARTIFACT_INDENT = RESULT_INDENT
+
+# One element of a list in a SARIF document as SarifWriter writes it: after a
+# comma unless it is the first, on its own line at the given indent unless
+# the document is compact
+def list_element(obj, indent, first, compact):
+    text = jsoncodec.dumps(obj, None if compact else 2)
+    if compact:
+        return text if first else "," + text
+    text = text.replace("\n", indent)
+    return text if first else "," + indent + text
+
+# Writes a SARIF file while issues are converted. Results are spooled to a
+# temporary file as they come in; close() writes the rules and artifacts
+# header (only complete once every issue has been seen) followed by the
+# spooled results, so memory use does not grow with the number of results.
+# The default output is byte-identical to
+# json.dump(builder.document(), f, indent=2); compact=True drops the
+# indentation and whitespace, compress=True gzips the file.
+#
+#     with SarifWriter("polaris_issues.sarif", builder) as writer:
+#         for issue in issues:
+#             writer.add_issue(issue)
+class SarifWriter:
+    def __init__(self, path, builder, compact=False, compress=False):
+        self.path = path
+        self.builder = builder
+        self.builder.keep_results = False
+        self.compact = compact
+        self.compress = compress
+        self.result_count = 0
+        # Characters of results written so far
+        self.result_size = 0
+        self.spool = tempfile.TemporaryFile(
+            "w+", encoding="utf-8", dir=os.path.dirname(os.path.abspath(path)))
+
+    def encoder(self):
+        if self.compact:
+            return json.JSONEncoder(separators=(",", ":"))
+        return json.JSONEncoder(indent=2)
+
+    def dumps(self, obj):
+        return jsoncodec.dumps(obj, None if self.compact else 2)
+
+    def add_issue(self, issue):
+        result = self.builder.add_issue(issue)
+        if result is not None:
+            self.add_result(result)
+        return result
+
+    def add_issues(self, issues, jobs=1):
+        if jobs > 1:
+            for result in convert_parallel(self.builder, issue_tasks(issues), jobs):
+                self.add_result(result)
+        else:
+            for issue in issues:
+                self.add_issue(issue)
+
+    # Convert an issue dump or store (see issue_store.iter_issues for details)
+    def add_dump(self, path, jobs=1, details=None):
+        if jobs > 1:
+            for result in convert_parallel(self.builder,
+                                           dump_tasks(path, jobs, details), jobs):
+                self.add_result(result)
+        else:
+            self.add_issues(iter_issues(path, details))
+
+    # One element of a list in the document, indented to its depth
+    def element(self, obj, indent, first):
+        return list_element(obj, indent, first, self.compact)
+
+    def add_result(self, result):
+        text = self.element(result, RESULT_INDENT, not self.result_count)
+        self.spool.write(text)
+        self.result_count += 1
+        self.result_size += len(text)
+
+    def close(self):
+        if self.spool is None:
+            return
+        document = self.builder.document()
+        run = document["runs"][0]
+        # The long lists are written element by element in place of their
+        # placeholder, the rest of the document is encoded piece by piece
+        # (like json.dump), so none of it is held as one big string
+        lists = {}
+        if self.result_count:
+            run["results"] = [RESULTS_MARKER]
+            lists[json.dumps(RESULTS_MARKER)] = None
+        if run["tool"]["driver"]["rules"]:
+            lists[json.dumps(RULES_MARKER)] = (run["tool"]["driver"]["rules"], RULE_INDENT)
+            run["tool"]["driver"]["rules"] = [RULES_MARKER]
+        if run["artifacts"]:
+            lists[json.dumps(ARTIFACTS_MARKER)] = (run["artifacts"], ARTIFACT_INDENT)
+            run["artifacts"] = [ARTIFACTS_MARKER]
+        tmp_path = self.path + ".tmp"
+        if self.compress:
+            f = gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6)
+        else:
+            f = open(tmp_path, "w", encoding="utf-8")
+        with f:
+            for chunk in self.encoder().iterencode(document):
+                for marker, items in lists.items():
+                    if marker not in chunk:
+                        continue
+                    head, chunk = chunk.split(marker, 1)
+                    f.write(head)
+                    if items is None:
+                        self.spool.seek(0)
+                        shutil.copyfileobj(self.spool, f)
+                    else:
+                        items, indent = items
+                        for index, item in enumerate(items):
+                            f.write(self.element(item, indent, index == 0))
+                    break
+                f.write(chunk)
+        os.replace(tmp_path, self.path)
+        self.spool.close()
+        self.spool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    # Drop the output (after an error)
+    def discard(self):
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+
+
+# Characters of the document around the results, rules and artifacts
+DOCUMENT_OVERHEAD = 1024
+
+# Severity groups a severity split always writes, so a severity that has no
+# issues left gets an empty file that clears its category
+SEVERITY_GROUPS = ("critical", "high", "medium", "low")
+# Most files one group is split into by size (each is open while the group
+# is written)
+MAX_SHARDS = 256
+
+# A fixed number of shards cannot hold a group within the limits
+class ShardLimitError(ValueError):
+    pass
+
+# [group, file count] pairs recorded by the last ShardedSarifWriter run
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return [tuple(entry) for entry in jsoncodec.load(f)["groups"]]
+    except FileNotFoundError:
+        return []
+
+def save_manifest(path, counts):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        jsoncodec.dump({"groups": counts}, f)
+    os.replace(tmp_path, path)
+
+# Results of one group of a ShardedSarifWriter, converted once and spooled
+# until close() knows how many files the group needs
+class ShardGroup:
+    def __init__(self, writer):
+        self.builder = SarifBuilder(**writer.options)
+        self.builder.keep_results = False
+        self.spool = tempfile.TemporaryFile(
+            "w+", encoding="utf-8", dir=os.path.dirname(os.path.abspath(writer.root)))
+        # Per result: (bucket hash, encoded size, rule index, artifact index)
+        self.entries = []
+        # Encoded rule and artifact sizes, once check() needs them
+        self.sizes = None
+
+    def add_issue(self, issue, compact):
+        result = self.builder.add_issue(issue)
+        if result is None:
+            return None
+        location = result["locations"][0]["physicalLocation"]["artifactLocation"]
+        text = jsoncodec.dumps(result)
+        self.spool.write(text)
+        self.spool.write("\n")
+        key = str(issue.get("id", "PolarisIssueID")).encode("utf-8")
+        self.entries.append((zlib.crc32(key),
+                             len(list_element(result, RESULT_INDENT, False, compact)),
+                             result["ruleIndex"], location["index"]))
+        return result
+
+    # Whether every file stays within the limits with count buckets
+    # (bucket = hash % count). Returns (fits, most results in one bucket).
+    def check(self, count, max_results, max_bytes, compact):
+        if self.sizes is None:
+            self.sizes = (
+                [len(list_element(rule, RULE_INDENT, False, compact))
+                 for rule in self.builder.rules],
+                [len(list_element(artifact, ARTIFACT_INDENT, False, compact))
+                 for artifact in self.builder.artifacts])
+        rule_sizes, artifact_sizes = self.sizes
+        buckets = [[0, DOCUMENT_OVERHEAD, set(), set()] for _ in range(count)]
+        for key, size, rule, artifact in self.entries:
+            bucket = buckets[key % count]
+            bucket[0] += 1
+            bucket[1] += size
+            bucket[2].add(rule)
+            bucket[3].add(artifact)
+        fits = True
+        for results, size, rules, artifacts in buckets:
+            size += sum(rule_sizes[i] for i in rules)
+            size += sum(artifact_sizes[i] for i in artifacts)
+            if ((max_results and results > max_results)
+                    or (max_bytes and size > max_bytes)):
+                fits = False
+        return fits, max(bucket[0] for bucket in buckets)
+
+    # Smallest power of two number of buckets whose files all stay within
+    # the limits
+    def bucket_count(self, max_results, max_bytes, compact):
+        if not (max_results or max_bytes) or not self.entries:
+            return 1
+        count = 1
+        while True:
+            fits, largest = self.check(count, max_results, max_bytes, compact)
+            if fits or largest <= 1 or count >= MAX_SHARDS:
+                return count
+            count *= 2
+
+    # Yield (bucket hash, result) for every spooled result, with the rule
+    # and artifact it refers to
+    def results(self):
+        self.spool.seek(0)
+        for (key, size, rule, artifact), line in zip(self.entries, self.spool):
+            yield key, jsoncodec.loads(line), self.builder.rules[rule], \
+                self.builder.artifacts[artifact]
+
+    def close(self):
+        self.spool.close()
+
+# Writes issues to several SARIF files ("shards"), each with its own rule
+# and artifact tables, so every file stays within upload limits:
+#  - max_results: results per file
+#  - max_bytes: (uncompressed) size per file, unless one issue alone is
+#    bigger
+#  - split_by: also keep apart the results of each severity ("severity")
+#    or of each top-level directory of the artifacts ("artifact")
+# An issue's file is picked by its group and a hash of its ID modulo the
+# number of files of the group, never by the order or number of the other
+# issues. That number is either:
+#  - fixed (shards=N files per group): an issue then keeps its file, and its
+#    code scanning category, from run to run. Files are written even when
+#    empty, and close() raises ShardLimitError if one would break a limit.
+#  - or worked out per run (no shards): the smallest power of two whose
+#    files all fit. Whenever it grows from N to 2N, about half the issues of
+#    every file move to file i + N and get a new category, so code scanning
+#    closes their alerts and opens new ones. Use shards for stable alerts.
+# Every file the last run wrote but this one has no results for is written
+# empty, to clear its category: the file counts of each group are recorded
+# in a manifest next to the output (polaris_issues.shards.json), which has
+# to be kept between runs for that. A severity split also always writes the
+# SEVERITY_GROUPS, so a severity without issues is cleared without it.
+# Hashing does not fill the files evenly: expect them about half full.
+# Files are named after path: polaris_issues.sarif becomes
+# polaris_issues-001.sarif, polaris_issues-002.sarif, ... or, split by
+# severity, polaris_issues-high-001.sarif, ...; with compress=True they are
+# gzipped (.sarif.gz). Each run gets an automationDetails.id of its own
+# ("<category>/high-001/", category defaulting to the file name,
+# "polaris_issues"), so the files can be uploaded side by side.
+# builder is the template for the builders of the shards. Results are
+# converted once and spooled; files are written on close().
+#
+#     with ShardedSarifWriter("polaris_issues.sarif", builder, max_results=5000,
+#                             shards=4, split_by="severity") as writer:
+#         for issue in issues:
+#             writer.add_issue(issue)
+#     print(writer.paths)
+class ShardedSarifWriter:
+    def __init__(self, path, builder, max_results=None, max_bytes=None,
+                 split_by=None, compact=False, compress=False, category=None,
+                 shards=None):
+        if split_by is not None and split_by not in SPLIT_BY:
+            raise ValueError(f"Unknown split {split_by!r}")
+        if shards is not None and not 1 <= shards <= MAX_SHARDS:
+            raise ValueError(f"shards must be between 1 and {MAX_SHARDS}")
+        self.options = dict(builder.options)
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.split_by = split_by
+        self.compact = compact
+        self.compress = compress
+        self.shards = shards
+        self.root, self.ext = os.path.splitext(path)
+        self.category = category or os.path.basename(self.root)
+        self.manifest_path = self.root + ".shards.json"
+        # group -> number of files the last run wrote
+        self.previous = dict(load_manifest(self.manifest_path))
+        self.result_count = 0
+        self.groups = {}
+        self.paths = []
+
+    def group(self, issue):
+        if self.split_by == "severity":
+            severity = occurrence_properties(issue)[0]
+            return severity.lower() if severity else "unknown"
+        if self.split_by == "artifact":
+            file_path = issue.get("location", {}).get("filePath", "POLARIS")
+            top, sep, _ = file_path.lstrip("/").partition("/")
+            return top if sep else "root"
+        return None
+
+    def shard_writer(self, group, number):
+        name = f"{number:03d}"
+        if group is not None:
+            name = re.sub(r"[^A-Za-z0-9_.-]", "_", group) + "-" + name
+        path = f"{self.root}-{name}{self.ext}" + (".gz" if self.compress else "")
+        builder = SarifBuilder(**dict(self.options,
+                                      automation_id=f"{self.category}/{name}/"))
+        return SarifWriter(path, builder, self.compact, self.compress)
+
+    def add_issue(self, issue):
+        group = self.group(issue)
+        if group not in self.groups:
+            self.groups[group] = ShardGroup(self)
+        result = self.groups[group].add_issue(issue, self.compact)
+        if result is not None:
+            self.result_count += 1
+        return result
+
+    def add_issues(self, issues):
+        for issue in issues:
+            self.add_issue(issue)
+
+    # Convert an issue dump or store (see issue_store.iter_issues for details)
+    def add_dump(self, path, details=None):
+        self.add_issues(iter_issues(path, details))
+
+    # Number of files with results for one group
+    def file_count(self, name, group):
+        if self.shards is None:
+            return group.bucket_count(self.max_results, self.max_bytes, self.compact)
+        if (self.max_results or self.max_bytes) and group.entries:
+            fits, largest = group.check(self.shards, self.max_results,
+                                        self.max_bytes, self.compact)
+            if not fits and largest > 1:
+                raise ShardLimitError(
+                    f"{self.root}: {self.shards} file(s) per group are not enough "
+                    f"for the {len(group.entries)} results of group {name or 'all'} "
+                    f"within the size limits, use more shards")
+        return self.shards
+
+    # Write the files of one group: count of them with results, and empty
+    # ones for the rest of those the last run wrote. Returns count.
+    def write_group(self, name, group):
+        count = self.file_count(name, group)
+        total = max(count, self.previous.get(name, 0))
+        writers = [self.shard_writer(name, number + 1) for number in range(total)]
+        try:
+            for key, result, rule, artifact in group.results():
+                writer = writers[key % count]
+                result["ruleIndex"] = 0
+                result["locations"][0]["physicalLocation"]["artifactLocation"]["index"] = 0
+                writer.add_result(writer.builder.merge([rule], [artifact], [result])[0])
+            for writer in writers:
+                writer.close()
+                self.paths.append(writer.path)
+        finally:
+            for writer in writers:
+                writer.discard()
+        return count
+
+    def close(self):
+        # Groups whose issues were all skipped get no files of their own
+        for name in [name for name, group in self.groups.items() if not group.entries]:
+            self.groups.pop(name).close()
+        if self.split_by == "severity":
+            for name in SEVERITY_GROUPS:
+                self.groups.setdefault(name, None)
+        for name in self.previous:
+            self.groups.setdefault(name, None)
+        if not self.groups:
+            # No results: still write (empty) files to upload
+            self.groups[None] = None
+        counts = []
+        try:
+            for name, group in self.groups.items():
+                counts.append([name, self.write_group(name, group or ShardGroup(self))])
+        finally:
+            self.discard()
+        save_manifest(self.manifest_path, counts)
+        self.paths.sort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    # Drop the spooled results
+    def discard(self):
+        for group in self.groups.values():
+            if group is not None:
+                group.close()
+        self.groups = {}
+
+
+# Existing SARIF outputs for path: the file itself, gzipped, or sharded
+def sarif_outputs(path):
+    root, ext = os.path.splitext(path)
+    paths = [p for p in (path, path + ".gz") if os.path.exists(p)]
+    return paths + sorted(glob.glob(glob.escape(root) + "-*" + ext) +
+                          glob.glob(glob.escape(root) + "-*" + ext + ".gz"))
@@ -1,56 +1,37 @@
-import json
+import argparse
+
+from sarif_builder import SarifBuilder, SarifWriter, RULE_MODES
 
 # I have tried to maka an easy converter from JSON to SARIF format.
 # Denner er kun i bruk for testing og proof of concept
 
-# Load your issues
-with open("issues_output.json") as f:
-    issues = json.load(f)
-
-# Build SARIF skeleton
-sarif = {
-    "version": "2.1.0",
-    "runs": [{
-        "tool": {
-            "driver": {
-                "name": "Polaris Custom Import",
-                "informationUri": "https://www.synopsys.com/",
-                "rules": []
-            }
-        },
-        "results": []
-    }]
-}
-
-# Map issues to SARIF results
-for issue in issues:
-    rule_id = issue.get("issueType", "PolarisIssue")
-    message = issue.get("message", str(issue))
-    location = issue.get("location", {})
-    file_path = location.get("filePath", "UNKNOWN")
-    line = location.get("line", 1)
-
-    # Add rule if not already present
-    if not any(r["id"] == rule_id for r in sarif["runs"][0]["tool"]["driver"]["rules"]):
-        sarif["runs"][0]["tool"]["driver"]["rules"].append({
-            "id": rule_id,
-            "name": rule_id,
-            "shortDescription": {"text": rule_id}
-        })
-
-    sarif["runs"][0]["results"].append({
-        "ruleId": rule_id,
-        "message": {"text": message},
-        "locations": [{
-            "physicalLocation": {
-                "artifactLocation": {"uri": file_path},
-                "region": {"startLine": line}
-            }
-        }]
-    })
-
-# Write SARIF file
-with open("polaris_issues.sarif", "w") as f:
-    json.dump(sarif, f, indent=2)
-
-print("SARIF file written to polaris_issues.sarif")
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a Polaris issue dump to SARIF.")
+    parser.add_argument("issues", nargs="?", default="issues_output.json",
+        help="issues_output.json dump or issue store (extract_findings.py --store)")
+    parser.add_argument("--output", default="polaris_issues.sarif",
+        help="SARIF file to write (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, default=1,
+        help="Processes converting in parallel (default: %(default)s)")
+    parser.add_argument("--rule-mode", choices=RULE_MODES, default="issue",
+        help="One SARIF rule per 'issue' or per issue 'type' (default: %(default)s)")
+    args = parser.parse_args()
+
+    # Map issues to SARIF results. The Polaris issue links are built from each
+    # issue's context, since the dump does not say which project it came from.
+    builder = SarifBuilder(tool_name="Polaris Custom Import",
+                           information_uri="https://www.synopsys.com/",
+                           rule_mode=args.rule_mode)
+
+    # Write SARIF file, streaming the results to disk as they are converted.
+    # The issues are read one at a time (or in shards with --jobs), keeping
+    # only the description of the localized type details, so big dumps
+    # convert without loading them whole.
+    with SarifWriter(args.output, builder) as writer:
+        writer.add_dump(args.issues, args.jobs, details=("description",))
+
+    print(f"SARIF file written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import polarislib
+from fake_polaris import FakePolaris
+
+
+# Every test starts from the module defaults: a fresh lookup cache, no HTTP
+# cache, rate limit, hooks or metrics
+@pytest.fixture(autouse=True)
+def polarislib_defaults(monkeypatch):
+    monkeypatch.setattr(polarislib, "lookupCache", polarislib.LookupCache())
+    monkeypatch.setattr(polarislib, "httpCache", None)
+    monkeypatch.setattr(polarislib, "rateLimiter", None)
+    monkeypatch.setattr(polarislib, "requestHooks", [])
+    monkeypatch.setattr(polarislib, "paginationHooks", [])
+    monkeypatch.setattr(polarislib, "unsupportedFilters", set())
+    monkeypatch.setattr(polarislib, "metrics", None)
+
+
+@pytest.fixture
+def fake():
+    with FakePolaris(issues=250, users=30, page_size=20) as server:
+        yield server
+
+
+@pytest.fixture
+def session(fake):
+    return polarislib.createSession(fake.url, "test-token")
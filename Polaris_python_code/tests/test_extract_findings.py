@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import extract_findings
+import polarislib
+from extract_findings import project_by_name, select_projects
+
+
+def test_select_projects_by_name(fake, session):
+    projects = polarislib.getPortfolioProjects(session, fake.url, fake.portfolio_id)
+    index = polarislib.PortfolioIndex(session, fake.url, portfolioId=fake.portfolio_id)
+    resolve = lambda name: project_by_name(index, name)
+
+    assert select_projects(projects, fake.project_id, resolve) == projects
+    assert select_projects(projects, "Application 1/Project 1", resolve) == projects
+    assert select_projects(projects, "Project 1", resolve) == projects
+    assert index.name(fake.application_id) == "Application 1"
+    with pytest.raises(SystemExit):
+        select_projects(projects, "Application 1/Nope", resolve)
+
+
+def test_failing_project_does_not_stop_the_others(fake, session, tmp_path, monkeypatch):
+    projects = polarislib.getPortfolioProjects(session, fake.url, fake.portfolio_id)
+    # No application ID: extract_project gives up on this one
+    broken = {"id": "project-2", "name": "Broken"}
+    monkeypatch.setattr(extract_findings, "getPortfolioProjects",
+                        lambda *args: projects + [broken])
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("sys.argv", ["extract_findings.py", fake.url, "token",
+                                     fake.portfolio_id, "all"])
+    with pytest.raises(SystemExit) as exit:
+        extract_findings.main()
+    assert exit.value.code == 1
+    assert (tmp_path / f"polaris_issues_{fake.project_id}.sarif").exists()
+    assert not (tmp_path / "polaris_issues_project-2.sarif").exists()
+
+
+def test_fixed_shards(fake, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    argv = ["extract_findings.py", fake.url, "token", fake.portfolio_id,
+            fake.project_id, "--shards", "4", "--max-results", "100"]
+    monkeypatch.setattr("sys.argv", argv)
+    extract_findings.main()
+    assert sorted(path.name for path in tmp_path.glob("polaris_issues-*.sarif")) == [
+        f"polaris_issues-00{n}.sarif" for n in range(1, 5)]
+
+    monkeypatch.setattr("sys.argv", argv[:-4] + ["--shards", "1", "--max-results", "100"])
+    with pytest.raises(SystemExit) as exit:
+        extract_findings.main()
+    assert exit.value.code == 1
+    assert "use more shards" in capsys.readouterr().out
+
+
+def test_projects_get_categories_of_their_own(fake, session, tmp_path, monkeypatch):
+    projects = polarislib.getPortfolioProjects(session, fake.url, fake.portfolio_id)
+    other = dict(projects[0], id="project-2")
+    monkeypatch.setattr(extract_findings, "getPortfolioProjects",
+                        lambda *args: projects + [other])
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("sys.argv", ["extract_findings.py", fake.url, "token",
+        fake.portfolio_id, "all", "--category", "polaris", "--shards", "2"])
+    extract_findings.main()
+    categories = set()
+    for path in tmp_path.glob("polaris_issues_*.sarif"):
+        with open(path) as f:
+            categories.add(json.load(f)["runs"][0]["automationDetails"]["id"])
+    assert categories == {f"polaris_{project}/{shard}/" for project in
+                          ("project-1", "project-2") for shard in ("001", "002")}
+
+
+def test_incremental_rewrites_outputs_when_options_change(fake, tmp_path, monkeypatch,
+                                                          capsys):
+    monkeypatch.chdir(tmp_path)
+    def extract(*options):
+        monkeypatch.setattr("sys.argv", ["extract_findings.py", fake.url, "token",
+            fake.portfolio_id, fake.project_id, "--incremental", *options])
+        extract_findings.main()
+        return capsys.readouterr().out
+
+    extract()
+    assert "No changes" in extract()
+    out = extract("--compact")
+    assert "Output options changed" in out
+    assert b"\n" not in (tmp_path / "polaris_issues.sarif").read_bytes().strip()
+    assert "No changes" in extract("--compact")
+
+    extract("--compact", "--shards", "2")
+    assert not (tmp_path / "polaris_issues.sarif").exists()
+    assert (tmp_path / "polaris_issues-002.sarif").exists()
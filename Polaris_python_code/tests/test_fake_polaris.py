@@ -0,0 +1,24 @@
+import polarislib
+from fake_polaris import make_issue
+
+
+def test_tenant_and_entitlements(fake, session):
+    assert polarislib.getTenantId(session, fake.url) == "tenant-1"
+    assert polarislib.getEntitlements(session, fake.url) == ["entitlement-1"]
+    assert polarislib.getExecutionMode(session, fake.url) == "PARALLEL"
+    assert polarislib.getSubscriptions(session, fake.url) == ["subscription-1"]
+
+
+def test_create_application(fake, session):
+    application_id = polarislib.createApplication(session, fake.url, "New app")
+    assert application_id == "application-2"
+    assert polarislib.getApplicationId(
+        session, fake.url, fake.portfolio_id, "New app") == application_id
+    # Already exists: non-fatal
+    assert polarislib.createApplication(session, fake.url, "New app") is None
+
+
+def test_issue_types_are_unique_per_issue():
+    issues = [make_issue(n) for n in range(80)]
+    assert len({issue["type"]["id"] for issue in issues}) == 80
+    assert len({issue["weaknessId"] for issue in issues}) == 40
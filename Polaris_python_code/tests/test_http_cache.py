@@ -0,0 +1,65 @@
+import os
+
+import polarislib
+from polarislib import getIssues, setHttpCache
+
+
+def statuses():
+    seen = []
+    polarislib.addRequestHook(
+        lambda method, api, status, seconds, size, attempt: seen.append(status))
+    return seen
+
+
+def ids(items):
+    return [item["id"] for item in items]
+
+
+def test_unchanged_pages_are_revalidated(fake, session, tmp_path):
+    setHttpCache(str(tmp_path / "cache"))
+    seen = statuses()
+    first = getIssues(session, fake.url, fake.project_id, None)
+    assert seen == [200] * 13
+
+    del seen[:]
+    assert getIssues(session, fake.url, fake.project_id, None) == first
+    assert seen == [304] * 13
+
+    # Only the page holding the changed issue comes back in full
+    fake.issues[45]["location"]["line"] += 1
+    del seen[:]
+    issues = getIssues(session, fake.url, fake.project_id, None)
+    assert sorted(seen) == [200] + [304] * 12
+    assert issues[45]["location"]["line"] == first[45]["location"]["line"] + 1
+    assert ids(issues) == ids(first)
+
+
+def test_cache_survives_a_restart(fake, session, tmp_path):
+    path = str(tmp_path / "cache")
+    setHttpCache(path)
+    first = getIssues(session, fake.url, fake.project_id, None)
+    setHttpCache(path)
+    seen = statuses()
+    assert getIssues(session, fake.url, fake.project_id, None) == first
+    assert seen == [304] * 13
+
+
+def test_tokens_do_not_share_entries(fake, session, tmp_path):
+    setHttpCache(str(tmp_path / "cache"))
+    getIssues(session, fake.url, fake.project_id, None)
+    seen = statuses()
+    other = polarislib.createSession(fake.url, "other-token")
+    getIssues(other, fake.url, fake.project_id, None)
+    assert seen == [200] * 13
+
+
+def test_size_limit(fake, session, tmp_path):
+    path = tmp_path / "cache"
+    setHttpCache(str(path), maxBytes=50_000)
+    issues = getIssues(session, fake.url, fake.project_id, None)
+    bodies = [name for name in os.listdir(path) if name.endswith(".body")]
+    assert 0 < len(bodies) < 13
+    assert sum(os.path.getsize(path / name) for name in bodies) <= 50_000
+
+    # Evicted pages are simply fetched again
+    assert getIssues(session, fake.url, fake.project_id, None) == issues
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from extract_findings import write_json
+from fake_polaris import make_issue
+from issue_loader import iter_json_issues, read_json_range, split_json_dump
+from test_sarif_builder import sample_issues
+
+VALUES = [1.5, -2e10, 123456, 0, 7E-3, True, None, "x, ]", [1, [2.25]], {"a": -0.5}]
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 9))
+def test_elements_cut_at_any_chunk_boundary(tmp_path, chunk_size):
+    path = tmp_path / "values.json"
+    for text in (json.dumps(VALUES), json.dumps(VALUES, indent=2), "[ 12.75 ,3e2]"):
+        path.write_text(text)
+        assert list(iter_json_issues(str(path), chunk_size=chunk_size)) == json.loads(text)
+
+
+def test_truncated_dump_is_an_error(tmp_path):
+    path = tmp_path / "values.json"
+    path.write_text("[1, 2.")
+    with pytest.raises(ValueError):
+        list(iter_json_issues(str(path), chunk_size=2))
+
+
+def test_dump_ranges(tmp_path):
+    issues = sample_issues() + [make_issue(n) for n in range(200)]
+    path = str(tmp_path / "issues_output.json")
+    write_json(path, issues)
+    assert list(iter_json_issues(path, chunk_size=1000)) == issues
+    ranges = split_json_dump(path, 7)
+    assert len(ranges) > 1
+    assert [issue for start, end in ranges
+            for issue in read_json_range(path, start, end)] == issues
@@ -0,0 +1,14 @@
+import polarislib
+from sarif_builder import SarifBuilder
+
+
+def test_sarif_profile_keeps_issue_links(fake, session):
+    issues = polarislib.getIssues(session, fake.url, fake.project_id, None,
+                                  profile="sarif")
+    assert issues and all("context" in issue for issue in issues)
+    assert all("issueProperties" not in issue for issue in issues)
+    # As sarif_converter does for a dump: links from each issue's context
+    builder = SarifBuilder().add_issues(issues)
+    for result in builder.results:
+        uri = builder.rules[result["ruleIndex"]]["helpUri"]
+        assert f"/projects/{fake.project_id}/issues/" in uri
@@ -0,0 +1,44 @@
+import json
+
+from fake_polaris import make_issue
+from issue_store import IssueStore, iter_issues, write_store
+from test_sarif_builder import sample_issues
+
+
+def test_round_trip(tmp_path):
+    issues = sample_issues() + [make_issue(n) for n in range(50)]
+    path = tmp_path / "issues.zip"
+    assert write_store(path, iter(issues)) == len(issues)
+    with IssueStore(path) as store:
+        assert len(store) == len(issues)
+        # Byte-for-byte, key order included
+        assert json.dumps(list(store)) == json.dumps(issues)
+        # Types are shared by issues of the same weakness and name, though
+        # every issue has its own type.id
+        assert len(store.table("type")) == len(
+            {(issue["weaknessId"], issue["type"]["altName"]) for issue in issues})
+
+
+def test_scan_and_select(tmp_path):
+    issues = [make_issue(n) for n in range(50)]
+    path = tmp_path / "issues.zip"
+    write_store(path, issues)
+    with IssueStore(path) as store:
+        rows = store.scan(severity="HIGH", dismissed=False)
+        expected = [n for n, issue in enumerate(issues)
+                    if store.column("severity")[n] == "high"
+                    and not store.column("dismissed")[n]]
+        assert rows and rows == expected
+        assert [issue["id"] for issue in store.issues(rows)] == [
+            issues[n]["id"] for n in rows]
+
+
+def test_pruned_issues_do_not_share_types(tmp_path):
+    issues = sample_issues()
+    path = tmp_path / "issues.zip"
+    write_store(path, issues)
+    pruned = list(iter_issues(str(path), details=["description"]))
+    with IssueStore(path) as store:
+        assert json.dumps(list(store)) == json.dumps(issues)
+    assert all(len(issue["type"]["_localized"]["otherDetails"]) == 1
+               for issue in pruned)
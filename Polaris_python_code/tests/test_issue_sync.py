@@ -0,0 +1,55 @@
+import json
+
+from extract_findings import write_json
+from issue_sync import has_changes, save_state, sync_issues
+from fake_polaris import make_issue
+
+
+def sync(fake, session, tmp_path, since_filter=None):
+    store_path = str(tmp_path / "issues_output.json")
+    state_path = str(tmp_path / "issues_state.json")
+    issues, changes, state = sync_issues(session, fake.url, fake.project_id,
+        store_path, state_path, since_filter, {"profile": "sarif"})
+    # Written over the previous dump, like extract_findings does
+    count = write_json(store_path, issues)
+    save_state(state_path, state)
+    return count, changes
+
+
+def stored(tmp_path):
+    with open(tmp_path / "issues_output.json") as f:
+        return json.load(f)
+
+
+def test_sync_detects_changes(fake, session, tmp_path):
+    count, changes = sync(fake, session, tmp_path)
+    assert count == len(fake.issues) == len(changes["added"])
+
+    count, changes = sync(fake, session, tmp_path)
+    assert not has_changes(changes)
+
+    fake.issues[3]["location"]["line"] += 1
+    removed = fake.issues.pop(7)
+    fake.issues.append(make_issue(len(fake.issues) + 1))
+    count, changes = sync(fake, session, tmp_path)
+    assert changes == {"added": [fake.issues[-1]["id"]],
+                       "changed": [fake.issues[3]["id"]],
+                       "removed": [removed["id"]]}
+    assert [issue["id"] for issue in stored(tmp_path)] == [
+        issue["id"] for issue in fake.issues]
+
+
+def test_delta_sync_merges_into_stored_issues(fake, session, tmp_path, monkeypatch):
+    sync(fake, session, tmp_path)
+    full = stored(tmp_path)
+
+    # The delta: one changed and one new issue, in the fake's order
+    fake.issues[5]["location"]["line"] += 1
+    new = make_issue(len(fake.issues) + 1)
+    monkeypatch.setattr(fake, "issues", [fake.issues[5], new])
+    count, changes = sync(fake, session, tmp_path, "context.date=gt={since}")
+    assert changes["added"] == [new["id"]]
+    assert changes["changed"] == [full[5]["id"]]
+    merged = stored(tmp_path)
+    assert [issue["id"] for issue in merged] == [issue["id"] for issue in full] + [new["id"]]
+    assert merged[5]["location"]["line"] == full[5]["location"]["line"] + 1
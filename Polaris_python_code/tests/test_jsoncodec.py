@@ -0,0 +1,100 @@
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+import jsoncodec
+from fake_polaris import make_issue
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "issues_output.json")
+
+DOCUMENTS = [
+    {},
+    [],
+    {"nested": {"list": [1, 2, {"empty": {}}], "none": None, "flag": False}},
+    {"text": "Sårbarhet i «cookie» – 漏洞 😀", "escapes": "tab\t quote\" slash\\ \u0001"},
+    {"floats": [0.1, 1.5, 2.0, 9.9, 1 / 3, 123456.789, -0.0]},
+    {"big": 2 ** 70, "negative": -2 ** 63},
+    {"b": 1, "a": [{"d": 2, "c": 3}]},
+]
+
+
+@pytest.fixture
+def orjson_backend(monkeypatch):
+    pytest.importorskip("orjson")
+    monkeypatch.setattr(jsoncodec, "BACKEND", "orjson")
+
+
+def encoded(monkeypatch, backend, obj, **options):
+    monkeypatch.setattr(jsoncodec, "BACKEND", backend)
+    return jsoncodec.dumps(obj, **options)
+
+
+@pytest.mark.parametrize("obj", DOCUMENTS)
+@pytest.mark.parametrize("options", [{}, {"indent": 2}, {"sort_keys": True},
+                                     {"indent": 2, "sort_keys": True}])
+def test_backends_write_the_same(orjson_backend, monkeypatch, obj, options):
+    text = encoded(monkeypatch, "orjson", obj, **options)
+    assert text == encoded(monkeypatch, "json", obj, **options)
+    assert text == json.dumps(obj, indent=options.get("indent"),
+                              sort_keys=options.get("sort_keys", False),
+                              separators=None if "indent" in options else (",", ":"))
+
+
+def test_backends_write_issues_the_same(orjson_backend, monkeypatch):
+    with open(SAMPLE) as f:
+        issues = json.load(f) + [make_issue(n) for n in range(100)]
+    for options in ({}, {"indent": 2}):
+        assert encoded(monkeypatch, "orjson", issues, **options) == \
+            encoded(monkeypatch, "json", issues, **options)
+
+
+def test_exponent_floats_keep_their_value(orjson_backend, monkeypatch):
+    # Spelled differently by the two backends (see jsoncodec), same value
+    values = [1e-05, 1e16, 6.02e23]
+    for backend in ("orjson", "json"):
+        assert json.loads(encoded(monkeypatch, backend, values)) == values
+
+
+@pytest.mark.parametrize("backend", ["orjson", "json"])
+def test_loads(orjson_backend, monkeypatch, backend):
+    monkeypatch.setattr(jsoncodec, "BACKEND", backend)
+    for obj in DOCUMENTS:
+        text = json.dumps(obj)
+        assert jsoncodec.loads(text) == obj
+        assert jsoncodec.loads(text.encode()) == obj
+    # What orjson rejects is decided (and reported) by json
+    assert jsoncodec.loads("[NaN]")[0] != jsoncodec.loads("[NaN]")[0]
+    with pytest.raises(jsoncodec.JSONDecodeError):
+        jsoncodec.loads("{broken")
+
+
+def reloaded(monkeypatch, orjson=True, env=None):
+    if not orjson:
+        monkeypatch.setitem(sys.modules, "orjson", None)
+    if env is not None:
+        monkeypatch.setenv("POLARIS_JSON", env)
+    return importlib.reload(jsoncodec)
+
+
+@pytest.fixture
+def reload_afterwards(monkeypatch):
+    yield
+    # Back to the module as the rest of the tests see it
+    monkeypatch.undo()
+    importlib.reload(jsoncodec)
+
+
+def test_falls_back_without_orjson(monkeypatch, reload_afterwards):
+    codec = reloaded(monkeypatch, orjson=False)
+    assert codec.orjson is None and codec.BACKEND == "json"
+    assert codec.dumps(DOCUMENTS[3], indent=2) == json.dumps(DOCUMENTS[3], indent=2)
+    assert codec.loads(b'{"a": [1]}') == {"a": [1]}
+
+
+def test_json_backend_can_be_forced(monkeypatch, reload_afterwards):
+    pytest.importorskip("orjson")
+    assert reloaded(monkeypatch, env="json").BACKEND == "json"
@@ -0,0 +1,59 @@
+import polarislib
+from polarislib import (DiskLookupCache, LookupCache, getPortfolioId, getRoles,
+    getTenantId, setLookupCache)
+
+
+def count_requests():
+    sent = []
+    polarislib.addRequestHook(
+        lambda method, api, status, seconds, size, attempt: sent.append(api))
+    return sent
+
+
+def test_repeated_lookups_are_cached(fake, session):
+    sent = count_requests()
+    for _ in range(3):
+        assert getPortfolioId(session, fake.url) == fake.portfolio_id
+        assert getTenantId(session, fake.url) == "tenant-1"
+        assert "Contributor" in getRoles(session, fake.url)
+    assert len(sent) == 3
+
+
+def test_tokens_do_not_share_entries(fake, session):
+    sent = count_requests()
+    getPortfolioId(session, fake.url)
+    other = polarislib.createSession(fake.url, "other-token")
+    getPortfolioId(other, fake.url)
+    assert len(sent) == 2
+
+
+def test_expired_and_evicted_entries_are_fetched_again(fake, session):
+    sent = count_requests()
+    setLookupCache(LookupCache(ttl=-1))
+    getPortfolioId(session, fake.url)
+    getPortfolioId(session, fake.url)
+    assert len(sent) == 2
+
+    setLookupCache(LookupCache(maxsize=1))
+    getPortfolioId(session, fake.url)
+    getTenantId(session, fake.url)
+    getPortfolioId(session, fake.url)
+    assert len(sent) == 5
+
+
+def test_disk_cache_survives_a_restart(fake, session, tmp_path):
+    path = str(tmp_path / "lookups.json")
+    sent = count_requests()
+    setLookupCache(DiskLookupCache(path))
+    roles = getRoles(session, fake.url)
+    setLookupCache(DiskLookupCache(path))
+    assert getRoles(session, fake.url) == roles
+    assert len(sent) == 1
+
+
+def test_disabled_cache(fake, session):
+    sent = count_requests()
+    setLookupCache(None)
+    getPortfolioId(session, fake.url)
+    getPortfolioId(session, fake.url)
+    assert len(sent) == 2
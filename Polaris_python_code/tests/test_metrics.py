@@ -0,0 +1,94 @@
+import json
+
+import extract_findings
+import polarislib
+from fake_polaris import FakePolaris
+from polarislib import LATENCY_BUCKETS, bucketPercentile, enableMetrics, transferSize
+
+ISSUES = ("GET", "/api/findings/issues")
+
+
+def endpoint(summary, method, name):
+    return next(entry for entry in summary["endpoints"]
+                if (entry["method"], entry["endpoint"]) == (method, name))
+
+
+def test_percentiles_from_buckets():
+    buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+    buckets[2] = 90     # <= 0.025 s
+    buckets[5] = 9      # <= 0.25 s
+    buckets[-1] = 1     # over 10 s
+    assert bucketPercentile(buckets, 0.5, 12.0) == 0.025
+    assert bucketPercentile(buckets, 0.9, 12.0) == 0.025
+    assert bucketPercentile(buckets, 0.99, 12.0) == 0.25
+    assert bucketPercentile(buckets, 1.0, 12.0) == 12.0
+    # Never above the slowest request
+    assert bucketPercentile(buckets, 0.5, 0.02) == 0.02
+
+
+def test_transfer_size():
+    assert transferSize({"Content-Length": "120"}, b"x" * 1000) == 120
+    assert transferSize({}, b"x" * 1000) == 1000
+
+
+def test_summary(fake, session):
+    metrics = enableMetrics()
+    issues = polarislib.getIssues(session, fake.url, fake.project_id, None)
+    polarislib.getTenantId(session, fake.url)
+    summary = metrics.summary()
+
+    entry = endpoint(summary, *ISSUES)
+    assert entry["requests"] == 13 and entry["errors"] == entry["retries"] == 0
+    assert entry["statuses"] == {"200": 13}
+    assert entry["bytes"] > len(json.dumps(issues))
+    latency = entry["latency"]
+    assert sum(latency["buckets"].values()) == 13
+    assert latency["p50"] <= latency["p90"] <= latency["p99"] <= latency["max"]
+    assert summary["requests"] == 14
+    assert summary["paginations"] == [{"endpoint": "/api/findings/issues",
+                                       "paginations": 1, "pages": 13, "maxPages": 13}]
+    # Nothing per request is kept
+    assert all(len(value) <= len(LATENCY_BUCKETS) + 1
+               for value in metrics.endpoints[ISSUES].values() if isinstance(value, list))
+
+
+def test_retries_are_counted():
+    metrics = enableMetrics()
+    with FakePolaris(issues=250, page_size=20, error_rate=0.3, seed=1) as fake:
+        session = polarislib.createSession(fake.url, "test-token")
+        polarislib.apigetitems(session, fake.url, ISSUES[1], workers=1)
+        entry = endpoint(metrics.summary(), *ISSUES)
+        assert entry["statuses"] == {"200": 13, "503": fake.errors}
+        assert entry["retries"] == entry["errors"] == fake.errors
+
+
+def test_open_metrics(fake, session):
+    metrics = enableMetrics()
+    polarislib.getIssues(session, fake.url, fake.project_id, None)
+    text = metrics.openMetrics()
+    lines = text.splitlines()
+    labels = '{method="GET",endpoint="/api/findings/issues"'
+    assert f"polaris_requests_total{labels}}} 13" in lines
+    assert f'polaris_request_duration_seconds_bucket{labels},le="+Inf"}} 13' in lines
+    assert f"polaris_request_duration_seconds_count{labels}}} 13" in lines
+    assert f"polaris_pagination_pages_sum{labels}}} 13" in lines
+    assert text.endswith("# EOF\n")
+    # Every family is declared before its samples
+    declared = set()
+    for line in lines[:-1]:
+        if line.startswith("# TYPE "):
+            declared.add(line.split()[2])
+        elif not line.startswith("#"):
+            assert any(line.startswith(name) for name in declared), line
+
+
+def test_metrics_options(fake, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("sys.argv", ["extract_findings.py", fake.url, "token",
+        fake.portfolio_id, fake.project_id, "--metrics", "metrics.json",
+        "--openmetrics", "metrics.txt"])
+    extract_findings.main()
+    summary = json.loads((tmp_path / "metrics.json").read_text())
+    assert endpoint(summary, *ISSUES)["requests"] == 13
+    assert (tmp_path / "metrics.txt").read_text().endswith("# EOF\n")
+    assert f"{summary['requests']} API requests (0 retries)" in capsys.readouterr().out
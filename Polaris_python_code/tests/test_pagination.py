@@ -0,0 +1,39 @@
+import pytest
+
+import polarislib
+from polarislib import apigetitems, getIssues, getUsers, iterItems
+
+ISSUES = "/api/findings/issues"
+
+
+def ids(items):
+    return [item["id"] for item in items]
+
+
+@pytest.mark.parametrize("workers", [1, 4, 16])
+def test_items_come_in_server_order(fake, session, workers):
+    pages = []
+    polarislib.addPaginationHook(lambda api, count: pages.append(count))
+    items = apigetitems(session, fake.url, ISSUES, workers=workers)
+    assert ids(items) == ids(fake.issues)
+    # 250 issues, 20 per page
+    assert pages == [13]
+
+
+def test_issues_in_server_order(fake, session):
+    issues = getIssues(session, fake.url, fake.project_id, None)
+    assert ids(issues) == ids(fake.issues)
+
+
+def test_broken_user_links_are_followed(fake, session):
+    # The user listing's "next" links lack the /api/auth prefix
+    assert list(getUsers(session, fake.url).values()) == ids(fake.users)
+
+
+def test_stopping_early_drops_the_remaining_pages(fake, session):
+    items = iterItems(session, fake.url, ISSUES, workers=2)
+    first = [next(items) for _ in range(30)]
+    items.close()
+    assert ids(first) == ids(fake.issues[:30])
+    # The first page, plus at most 2 x workers pages fetched ahead
+    assert fake.requests <= 1 + 4
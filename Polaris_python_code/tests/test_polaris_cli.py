@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import get_all_projects
+import polaris_cli
+from extract_findings import write_json
+from fake_polaris import make_issue
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def argv(monkeypatch):
+    # main() hands the command its arguments through sys.argv
+    monkeypatch.setattr(sys, "argv", ["polaris"])
+
+
+def test_extract(fake, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    polaris_cli.main(["extract", fake.url, "token", fake.portfolio_id, fake.project_id])
+    assert (tmp_path / "issues_output.json").exists()
+    assert (tmp_path / "polaris_issues.sarif").exists()
+
+
+def test_sarif(tmp_path, capsys):
+    dump = str(tmp_path / "issues_output.json")
+    write_json(dump, [make_issue(n) for n in range(10)])
+    output = str(tmp_path / "out.sarif")
+    polaris_cli.main(["sarif", dump, "--output", output])
+    assert os.path.exists(output)
+    assert f"SARIF file written to {output}" in capsys.readouterr().out
+
+
+def test_projects(monkeypatch, capsys):
+    monkeypatch.setattr("builtins.input", lambda prompt: "token")
+    monkeypatch.setattr(get_all_projects, "getPortfolioProjects",
+                        lambda *args: [{"id": "project-1"}])
+    polaris_cli.main(["projects"])
+    assert '"id": "project-1"' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("command", ["extract", "sarif", "provision", "benchmark",
+                                     "fake-server"])
+def test_command_help(command, capsys):
+    with pytest.raises(SystemExit) as exit:
+        polaris_cli.main([command, "--help"])
+    assert exit.value.code == 0
+    assert capsys.readouterr().out.startswith(f"usage: polaris {command}")
+
+
+def test_usage(capsys):
+    assert polaris_cli.main([]) == 0
+    out = capsys.readouterr().out
+    assert all(command in out for command in polaris_cli.COMMANDS)
+
+
+def test_unknown_command(capsys):
+    assert polaris_cli.main(["nope"]) == 2
+    assert "unknown command 'nope'" in capsys.readouterr().err
+
+
+def test_exit_status():
+    def run(*args):
+        return subprocess.run([sys.executable, "polaris_cli.py", *args], cwd=HERE,
+                              capture_output=True, text=True)
+    assert run("--help").returncode == 0
+    unknown = run("nope")
+    assert unknown.returncode == 2
+    assert "unknown command" in unknown.stderr
+    assert run("extract").returncode == 2
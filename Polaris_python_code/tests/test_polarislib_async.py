@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+import pytest
+
+import polarislib
+
+aiohttp = pytest.importorskip("aiohttp")
+import polarislib_async
+
+
+def test_async_issues_match_sync(fake, session):
+    expected = polarislib.getIssues(session, fake.url, fake.project_id, None)
+
+    async def main():
+        async with polarislib_async.createSession(fake.url, "token") as s:
+            return await polarislib_async.getIssues(s, fake.url, fake.project_id)
+    # The session (and its connector) is only built inside the running loop
+    assert asyncio.run(main()) == expected
+
+
+def test_async_requests_are_rate_limited(fake, monkeypatch):
+    monkeypatch.setattr(polarislib, "rateLimiter", polarislib.RateLimiter(20, burst=1))
+    sent = []
+    polarislib.requestHooks.append(lambda *args: sent.append(time.monotonic()))
+
+    async def main():
+        async with polarislib_async.createSession(fake.url, "token") as s:
+            await asyncio.gather(*[polarislib_async.getTenantId(s, fake.url)
+                                   for _ in range(6)])
+    asyncio.run(main())
+    assert len(sent) == 6
+    # One token at a time, refilled 20 times a second
+    assert sent[-1] - sent[0] >= 5 / 20 * 0.9
@@ -0,0 +1,79 @@
+import pytest
+
+import polarislib
+import provision_users
+from provision_users import Provisioner, load_roster
+
+ROSTER = """email,firstName,lastName,role,groups,applications
+user1@example.com,User,1,Contributor,group-1;Team,application-1=Application Observer
+USER2@example.com,User,2,Observer,Team,
+new@example.com,New,User,Contributor,Team;group-1,application-1=Application Observer
+"""
+
+
+def roster(tmp_path):
+    path = tmp_path / "roster.csv"
+    path.write_text(ROSTER)
+    return load_roster(str(path))
+
+
+def user_id(fake, email):
+    return next(user["id"] for user in fake.users if user["email"] == email)
+
+
+def test_provision(fake, session, tmp_path):
+    provisioner = Provisioner(session, fake.url, rate=1000)
+    assert provisioner.provision(roster(tmp_path)) == []
+
+    new_id = user_id(fake, "new@example.com")
+    assert fake.user_roles == {"user-1": "role-Contributor", new_id: "role-Contributor"}
+    team = next(group["id"] for group in fake.groups if group["name"] == "Team")
+    assert fake.group_users[team] == ["user-1", "user-2", new_id]
+    assert fake.group_users["group-1"] == ["user-1", new_id]
+    assert fake.app_role_users == {
+        ("application-1", "app-role-Application Observer"): {"user-1", new_id}}
+    # createUser, 2 x setUserRole, createGroup, 2 x group PATCH, app role POST
+    assert provisioner.mutations == 7
+
+    # The second time only the application roles, which are not read back,
+    # are sent again
+    again = Provisioner(session, fake.url, rate=1000)
+    again.provision(roster(tmp_path))
+    assert again.mutations == 1
+
+
+def test_dry_run(fake, session, tmp_path, capsys):
+    users = len(fake.users)
+    provisioner = Provisioner(session, fake.url, rate=1000, dry_run=True)
+    assert provisioner.provision(roster(tmp_path)) == []
+    assert provisioner.mutations == 7
+    assert len(fake.users) == users
+    assert fake.user_roles == {} and fake.app_role_users == {}
+    assert "Create users: 1 request(s)" in capsys.readouterr().out
+
+
+def test_unresolved_user_is_left_out(fake, session, tmp_path, monkeypatch):
+    # Neither created nor found: no placeholder ID may reach the API
+    monkeypatch.setattr(provision_users, "createUser", lambda *args: None)
+    monkeypatch.setattr(provision_users, "getUserId", lambda *args: None)
+    provisioner = Provisioner(session, fake.url, rate=1000)
+    assert provisioner.provision(roster(tmp_path)) == [("user", "new@example.com")]
+    assert fake.user_roles == {"user-1": "role-Contributor"}
+    assert fake.group_users["group-1"] == ["user-1"]
+
+
+@pytest.mark.parametrize("option", [["--rate", "0"], ["--rate", "-1"], ["--workers", "0"]])
+def test_options_must_be_positive(option, tmp_path, monkeypatch, capsys):
+    path = tmp_path / "roster.csv"
+    path.write_text(ROSTER)
+    monkeypatch.setattr("sys.argv", ["provision_users.py", "http://localhost", "token",
+                                     str(path)] + option)
+    with pytest.raises(SystemExit) as exit:
+        provision_users.main()
+    assert exit.value.code == 2
+    assert "must be greater than 0" in capsys.readouterr().err
+
+
+def test_rate_limiter_needs_a_rate():
+    with pytest.raises(ValueError):
+        polarislib.RateLimiter(0)
@@ -0,0 +1,85 @@
+import email.utils
+import time
+
+import pytest
+import requests
+
+import polarislib
+from fake_polaris import FakePolaris
+from polarislib import PolarisPaginationError, apigetitems, createGroup, retryDelay
+
+ISSUES = "/api/findings/issues"
+
+
+def ids(items):
+    return [item["id"] for item in items]
+
+
+def response(retry_after):
+    resp = requests.Response()
+    resp.status_code = 503
+    resp.headers["Retry-After"] = retry_after
+    return resp
+
+
+def test_retry_after_seconds():
+    assert retryDelay(0, response("3")) == 3
+    assert retryDelay(0, response("3600")) == polarislib.BACKOFF_MAX
+
+
+def test_retry_after_date():
+    when = email.utils.formatdate(time.time() + 10, usegmt=True)
+    assert 8 <= retryDelay(0, response(when)) <= 10
+    past = email.utils.formatdate(time.time() - 10, usegmt=True)
+    assert retryDelay(0, response(past)) == 0
+
+
+def test_backoff_without_retry_after():
+    for attempt in range(8):
+        delay = retryDelay(attempt, response("soon"))
+        assert 0 <= delay <= min(polarislib.BACKOFF_MAX,
+                                 polarislib.BACKOFF_BASE * 2 ** attempt)
+
+
+def test_transient_failures_are_retried():
+    statuses = []
+    polarislib.addRequestHook(
+        lambda method, api, status, seconds, size, attempt: statuses.append(status))
+    with FakePolaris(issues=250, page_size=20, error_rate=0.3, seed=1) as fake:
+        session = polarislib.createSession(fake.url, "test-token")
+        items = apigetitems(session, fake.url, ISSUES, workers=1)
+        assert ids(items) == ids(fake.issues)
+        assert fake.errors > 0
+        assert statuses.count(503) == fake.errors
+        assert statuses.count(200) == 13
+
+        # POST is retried on 503: the server did not process the request
+        createGroup(session, fake.url, "Retried")
+        assert any(group["name"] == "Retried" for group in fake.groups)
+
+
+# Fail every request once "pages" pages have been answered
+def fail_after(fake, pages):
+    answered = []
+    def hook(method, api, status, seconds, size, attempt):
+        if status == 200:
+            answered.append(api)
+            if len(answered) == pages:
+                fake.error_rate = 1.0
+    polarislib.addRequestHook(hook)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_resume_after_pagination_failure(fake, session, monkeypatch, workers):
+    monkeypatch.setattr(polarislib, "MAX_RETRIES", 1)
+    fail_after(fake, 2 if workers == 1 else 1)
+    with pytest.raises(PolarisPaginationError) as failure:
+        apigetitems(session, fake.url, ISSUES, workers=workers)
+    fetched = failure.value.items
+    assert "_offset=%d" % len(fetched) in failure.value.resumeUrl
+    assert ids(fetched) == ids(fake.issues[:len(fetched)])
+
+    fake.error_rate = 0.0
+    rest = apigetitems(session, fake.url, ISSUES, workers=workers,
+                       resumeFrom=failure.value.resumeUrl)
+    assert ids(fetched + rest) == ids(fake.issues)
@@ -0,0 +1,169 @@
+import json
+import os
+import random
+
+from extract_findings import write_json
+from fake_polaris import make_issue
+import pytest
+
+from sarif_builder import (SarifBuilder, SarifWriter, ShardedSarifWriter,
+    ShardLimitError, convert_parallel, dump_tasks, issue_tasks)
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "issues_output.json")
+
+
+def sample_issues():
+    with open(SAMPLE) as f:
+        return json.load(f)
+
+
+def test_type_rules_are_shared_across_issues():
+    issues = sample_issues()
+    builder = SarifBuilder(rule_mode="type").add_issues(issues)
+    rules = builder.rules
+    assert len(rules) < len(builder.results)
+    assert len({rule["id"] for rule in rules}) == len(rules)
+    for rule in rules:
+        # The description is stored once, in fullDescription
+        assert rule["help"]["text"] != rule["fullDescription"]["text"]
+        assert "markdown" not in rule["help"]
+    for result in builder.results:
+        assert rules[result["ruleIndex"]]["id"] == result["ruleId"]
+        assert result["properties"]["polarisIssueId"]
+
+
+def test_type_rule_ids_are_stable():
+    issues = sample_issues()
+    first = SarifBuilder(rule_mode="type").add_issues(issues)
+    second = SarifBuilder(rule_mode="type").add_issues(reversed(issues))
+    assert {rule["id"] for rule in first.rules} == {rule["id"] for rule in second.rules}
+    assert "w-258/Missing CSP" in first.rule_index
+
+
+def test_type_mode_is_smaller():
+    issues = sample_issues()
+    sizes = {}
+    for mode in ("issue", "type"):
+        builder = SarifBuilder(rule_mode=mode).add_issues(issues)
+        sizes[mode] = len(json.dumps(builder.document()))
+    assert sizes["type"] < sizes["issue"]
+
+
+def test_parallel_output_is_byte_identical(tmp_path):
+    dump = str(tmp_path / "issues_output.json")
+    write_json(dump, [make_issue(n) for n in range(600)] + sample_issues())
+
+    def streamed(writer):
+        writer.add_dump(dump)
+
+    # Small shards, so every worker gets several and results arrive out of order
+    def ranges(writer):
+        for result in convert_parallel(writer.builder,
+                                       dump_tasks(dump, 2, shard_bytes=1 << 16), 2):
+            writer.add_result(result)
+
+    def shards(writer):
+        with open(dump) as f:
+            tasks = issue_tasks(json.load(f), shard_size=50)
+        for result in convert_parallel(writer.builder, tasks, 2):
+            writer.add_result(result)
+
+    outputs = []
+    for convert in (streamed, ranges, shards):
+        path = tmp_path / f"{convert.__name__}.sarif"
+        builder = SarifBuilder("portfolio-1", "application-1", "project-1")
+        with SarifWriter(str(path), builder) as writer:
+            convert(writer)
+        outputs.append(path.read_bytes())
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+def write_shards(directory, issues, **options):
+    directory.mkdir(exist_ok=True)
+    builder = SarifBuilder("portfolio-1", "application-1", "project-1")
+    with ShardedSarifWriter(str(directory / "polaris_issues.sarif"), builder,
+                            **options) as writer:
+        writer.add_issues(issues)
+    shards = {}
+    for path in writer.paths:
+        with open(path) as f:
+            run = json.load(f)["runs"][0]
+        ids = {result["ruleId"] for result in run.get("results", [])}
+        shards[run["automationDetails"]["id"]] = (ids, os.path.getsize(path))
+    return shards
+
+
+def test_shards_are_stable(tmp_path):
+    issues = [make_issue(n) for n in range(1000)]
+    first = write_shards(tmp_path / "first", issues, max_results=150)
+    assert len(first) > 2
+    assert all(len(ids) <= 150 for ids, size in first.values())
+    unsharded = SarifBuilder().add_issues(issues)
+    assert set().union(*(ids for ids, size in first.values())) == {
+        result["ruleId"] for result in unsharded.results}
+
+    # Neither the order nor a few fixed issues move the others
+    shuffled = random.Random(1).sample(issues[:-20], 980)
+    second = write_shards(tmp_path / "second", shuffled, max_results=150)
+    assert second.keys() == first.keys()
+    for category, (ids, size) in second.items():
+        assert ids <= first[category][0]
+
+
+def test_shards_within_max_bytes(tmp_path):
+    issues = [make_issue(n) for n in range(600)]
+    shards = write_shards(tmp_path / "shards", issues, max_bytes=200_000)
+    assert all(size <= 200_000 for ids, size in shards.values())
+
+
+def test_severity_split_clears_empty_severities(tmp_path):
+    shards = write_shards(tmp_path / "shards", sample_issues(), split_by="severity")
+    assert sorted(shards) == ["polaris_issues/critical-001/", "polaris_issues/high-001/",
+                              "polaris_issues/low-001/", "polaris_issues/medium-001/"]
+    assert shards["polaris_issues/critical-001/"][0] == set()
+
+
+def categories(shards):
+    return {issue_id: category
+            for category, (ids, size) in shards.items() for issue_id in ids}
+
+
+def test_fixed_shards_keep_categories_when_issues_grow(tmp_path):
+    issues = [make_issue(n) for n in range(2500)]
+    first = write_shards(tmp_path / "first", issues[:1000], max_results=1000, shards=8)
+    assert len(first) == 8
+    grown = write_shards(tmp_path / "grown", issues, max_results=1000, shards=8)
+    assert grown.keys() == first.keys()
+    before, after = categories(first), categories(grown)
+    assert all(after[issue_id] == category for issue_id, category in before.items())
+
+
+def test_growing_shard_count_moves_issues(tmp_path):
+    # Without shards the count doubles, and issues move to the new files
+    issues = [make_issue(n) for n in range(2500)]
+    first = write_shards(tmp_path / "first", issues[:1000], max_results=150)
+    grown = write_shards(tmp_path / "grown", issues, max_results=150)
+    assert len(grown) > len(first)
+    before, after = categories(first), categories(grown)
+    moved = [issue_id for issue_id in before if after[issue_id] != before[issue_id]]
+    assert 0 < len(moved) < len(before)
+    assert all(after[issue_id] not in first for issue_id in moved)
+
+
+def test_shrinking_clears_every_previous_file(tmp_path):
+    issues = [make_issue(n) for n in range(1000)]
+    first = write_shards(tmp_path / "shards", issues, max_results=100)
+    assert len(first) >= 8
+    # The manifest next to the output remembers the files to clear
+    second = write_shards(tmp_path / "shards", issues[:100], max_results=100)
+    assert second.keys() == first.keys()
+    assert sum(1 for ids, size in second.values() if ids) <= 2
+    third = write_shards(tmp_path / "shards", issues[:100], max_results=100)
+    assert len(third) <= 2
+
+
+def test_too_few_fixed_shards(tmp_path):
+    issues = [make_issue(n) for n in range(600)]
+    with pytest.raises(ShardLimitError):
+        write_shards(tmp_path / "shards", issues, max_results=100, shards=2)
@@ -0,0 +1,87 @@
+import pytest
+
+import extract_findings
+import polarislib
+from polarislib import (NOT_DISMISSED_FILTER, NOT_INFORMATIONAL_FILTER,
+    PolarisPaginationError, getIssues, iterIssues, skipIssue)
+
+
+def ids(items):
+    return [item["id"] for item in items]
+
+
+def expected(fake):
+    return [issue["id"] for issue in fake.issues if not skipIssue(issue, True, True)]
+
+
+def filtered(fake, session):
+    return getIssues(session, fake.url, fake.project_id, None,
+                     skipDismissed=True, skipInformational=True)
+
+
+def record_statuses():
+    sent = []
+    polarislib.addRequestHook(
+        lambda method, api, status, seconds, size, attempt: sent.append(status))
+    return sent
+
+
+def test_filtered_by_the_server(fake, session):
+    statuses = record_statuses()
+    issues = filtered(fake, session)
+    assert ids(issues) == expected(fake)
+    assert len(issues) < len(fake.issues)
+    # Fewer pages than the 13 of all issues
+    assert len(statuses) < 13
+
+
+def test_rejected_filter_falls_back_to_client_side(fake, session):
+    fake.unsupported_filters.add(NOT_INFORMATIONAL_FILTER)
+    statuses = record_statuses()
+    assert ids(filtered(fake, session)) == expected(fake)
+    assert statuses == [400] + [200] * 13
+
+    # The rejection is remembered
+    del statuses[:]
+    assert ids(filtered(fake, session)) == expected(fake)
+    assert statuses == [200] * 13
+
+    # The other filter is still sent to the server
+    issues = getIssues(session, fake.url, fake.project_id, None, skipDismissed=True)
+    assert ids(issues) == [issue["id"] for issue in fake.issues
+                           if not skipIssue(issue, True, False)]
+    assert statuses.count(400) == 0
+
+
+def test_rejection_after_the_first_page_is_not_retried_unfiltered(fake, session):
+    # A later page failing must not start over unfiltered: that would yield
+    # the issues of the first page twice
+    def reject_after_first_page(method, api, status, seconds, size, attempt):
+        fake.unsupported_filters.add(NOT_DISMISSED_FILTER)
+    polarislib.addRequestHook(reject_after_first_page)
+    seen = []
+    with pytest.raises(PolarisPaginationError):
+        for issue in iterIssues(session, fake.url, fake.project_id, None,
+                                skipDismissed=True):
+            seen.append(issue["id"])
+    assert len(seen) == len(set(seen)) > 0
+    assert seen == [issue["id"] for issue in fake.issues
+                    if not skipIssue(issue, True, False)][:len(seen)]
+    assert not polarislib.unsupportedFilters
+
+
+def sarif(fake, tmp_path, monkeypatch, name, *options):
+    directory = tmp_path / name
+    directory.mkdir()
+    monkeypatch.chdir(directory)
+    monkeypatch.setattr("sys.argv", ["extract_findings.py", fake.url, "token",
+                                     fake.portfolio_id, fake.project_id, *options])
+    extract_findings.main()
+    return (directory / "polaris_issues.sarif").read_bytes()
+
+
+def test_sarif_is_the_same_with_and_without_server_filter(fake, tmp_path, monkeypatch):
+    unfiltered = sarif(fake, tmp_path, monkeypatch, "off")
+    assert sarif(fake, tmp_path, monkeypatch, "server", "--server-filter") == unfiltered
+    fake.unsupported_filters.add(NOT_DISMISSED_FILTER)
+    assert sarif(fake, tmp_path, monkeypatch, "fallback", "--server-filter") == unfiltered
@@ -0,0 +1,97 @@
+import socket
+
+import pytest
+
+import polarislib
+from fake_polaris import FakePolaris
+from polarislib import (PolarisError, PolarisHTTPError, PolarisPaginationError,
+    apiget, apigetitems, createSession, getIssues, setHttpCache)
+
+ISSUES = "/api/findings/issues"
+
+
+# Every test runs with a requests session and with an httpx (http2=True) one
+@pytest.fixture(params=[False, True], ids=["requests", "http2"])
+def http2(request):
+    if request.param:
+        pytest.importorskip("httpx")
+        pytest.importorskip("h2")
+    return request.param
+
+
+@pytest.fixture
+def any_session(fake, http2):
+    session = createSession(fake.url, "test-token", http2=http2)
+    yield session
+    session.close()
+
+
+def ids(items):
+    return [item["id"] for item in items]
+
+
+def test_session_type(any_session, http2):
+    assert isinstance(any_session, polarislib.Http2Session) == http2
+    assert any_session.headers["API-TOKEN"] == "test-token"
+
+
+def test_pagination(fake, any_session):
+    assert ids(getIssues(any_session, fake.url, fake.project_id, None)) == ids(fake.issues)
+    # None parameters are left out, as requests does, and the page links
+    # keep their own query
+    items = apigetitems(any_session, fake.url, ISSUES, {"_filter": None}, workers=4)
+    assert ids(items) == ids(fake.issues)
+    items = apigetitems(any_session, fake.url, ISSUES, {"_limit": 10}, workers=1)
+    assert ids(items) == ids(fake.issues)
+
+
+def test_retries(http2):
+    statuses = []
+    polarislib.addRequestHook(
+        lambda method, api, status, seconds, size, attempt: statuses.append(status))
+    with FakePolaris(issues=250, page_size=20, error_rate=0.3, seed=1) as fake:
+        with createSession(fake.url, "test-token", http2=http2) as session:
+            items = apigetitems(session, fake.url, ISSUES, workers=1)
+        assert ids(items) == ids(fake.issues)
+        assert statuses.count(503) == fake.errors > 0
+
+
+def test_errors(fake, any_session, monkeypatch):
+    with pytest.raises(PolarisHTTPError) as failure:
+        apiget(any_session, fake.url, "/api/nothing-here")
+    assert failure.value.status == 404
+    assert failure.value.detail == {"detail": "no route for /api/nothing-here"}
+
+    monkeypatch.setattr(polarislib, "MAX_RETRIES", 0)
+    answered = []
+    def fail_after_first_page(method, api, status, seconds, size, attempt):
+        answered.append(api)
+        if len(answered) == 1:
+            fake.error_rate = 1.0
+    polarislib.addRequestHook(fail_after_first_page)
+    with pytest.raises(PolarisPaginationError) as failure:
+        apigetitems(any_session, fake.url, ISSUES, workers=1)
+    fake.error_rate = 0.0
+    rest = apigetitems(any_session, fake.url, ISSUES, workers=1,
+                       resumeFrom=failure.value.resumeUrl)
+    assert ids(failure.value.items + rest) == ids(fake.issues)
+
+
+def test_unreachable_server(http2, monkeypatch):
+    monkeypatch.setattr(polarislib, "MAX_RETRIES", 0)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:%d" % s.getsockname()[1]
+    with createSession(url, "test-token", http2=http2) as session:
+        with pytest.raises(PolarisError):
+            apiget(session, url, "/api/portfolio/portfolios")
+
+
+def test_http_cache(fake, any_session, tmp_path):
+    setHttpCache(str(tmp_path / "cache"))
+    statuses = []
+    polarislib.addRequestHook(
+        lambda method, api, status, seconds, size, attempt: statuses.append(status))
+    first = getIssues(any_session, fake.url, fake.project_id, None)
+    assert getIssues(any_session, fake.url, fake.project_id, None) == first
+    assert statuses == [200] * 13 + [304] * 13
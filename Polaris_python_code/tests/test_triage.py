@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+import polarislib
+from fake_polaris import FakePolaris
+from polarislib import (MAX_TRIAGE_BATCH, MAX_TRIAGE_FILTER_LENGTH, PolarisHTTPError,
+    setTriage, setTriageBulk, setTriages, triageChunks, triageFilter)
+
+COMMENT = {"triageProperties": [{"key": "comment", "value": "bulk"}]}
+
+
+def triage_value(issue, key):
+    return next((prop["value"] for prop in issue["triageProperties"]
+                 if prop["key"] == key), None)
+
+
+@pytest.mark.parametrize("length", [8, 32, 200])
+def test_chunks_stay_within_limits(length):
+    issue_ids = [f"{n:0{length}X}" for n in range(3000)]
+    chunks = list(triageChunks(issue_ids))
+    assert [issue_id for chunk in chunks for issue_id in chunk] == issue_ids
+    for chunk in chunks:
+        assert len(chunk) <= MAX_TRIAGE_BATCH
+        assert len(triageFilter(chunk)) <= MAX_TRIAGE_FILTER_LENGTH
+    # Every chunk but the last is full: one more ID would break a limit
+    for chunk, following in zip(chunks, chunks[1:]):
+        assert (len(chunk) == MAX_TRIAGE_BATCH or len(triageFilter(
+            chunk + following[:1])) > MAX_TRIAGE_FILTER_LENGTH)
+
+
+def test_bulk_triage():
+    with FakePolaris(issues=1200, users=1) as fake:
+        session = polarislib.createSession(fake.url, "test-token")
+        issue_ids = [issue["id"] for issue in fake.issues]
+        data = {"triageProperties": [{"key": "status", "value": "to-be-fixed"}]}
+        # Duplicates are sent once
+        setTriageBulk(session, fake.url, issue_ids + issue_ids[:10], fake.project_id,
+                      fake.branch_id, data)
+        assert data == {"triageProperties": [{"key": "status", "value": "to-be-fixed"}]}
+        assert len(fake.triage_requests) == 3
+        assert sorted(sum(fake.triage_requests, [])) == issue_ids
+        assert all(triage_value(issue, "status") == "to-be-fixed" for issue in fake.issues)
+
+
+def test_triages_with_the_same_data_are_grouped(fake, session):
+    triages = {}
+    for n, issue in enumerate(fake.issues[:30]):
+        triages[issue["id"]] = {"triageProperties": [
+            {"key": "status", "value": "to-be-fixed"},
+            {"key": "comment", "value": f"comment {n % 3}"}]}
+    setTriages(session, fake.url, triages, fake.project_id, fake.branch_id)
+    assert len(fake.triage_requests) == 3
+    for n, issue in enumerate(fake.issues[:30]):
+        assert triage_value(issue, "comment") == f"comment {n % 3}"
+    assert triage_value(fake.issues[30], "comment") is None
+
+
+def test_single_triage_keeps_the_callers_data(fake, session):
+    data = dict(COMMENT, filter="replaced")
+    setTriage(session, fake.url, fake.issues[0]["id"], fake.project_id, fake.branch_id, data)
+    assert data == dict(COMMENT, filter="replaced")
+    assert fake.triage_requests == [[fake.issues[0]["id"]]]
+
+
+def test_failures_are_raised(fake, session):
+    issue_ids = [f"{n:032X}" for n in range(2000)]
+    with pytest.raises(PolarisHTTPError) as failure:
+        setTriageBulk(session, fake.url, issue_ids, "project-2", fake.branch_id,
+                      COMMENT, workers=4)
+    assert failure.value.status == 404
+
+
+def test_async_triage_keeps_the_callers_data(fake):
+    pytest.importorskip("aiohttp")
+    import polarislib_async
+
+    data = dict(COMMENT)
+    async def main():
+        async with polarislib_async.createSession(fake.url, "token") as s:
+            await polarislib_async.setTriage(s, fake.url, fake.issues[1]["id"],
+                                             fake.project_id, fake.branch_id, data)
+    asyncio.run(main())
+    assert data == COMMENT
+    assert triage_value(fake.issues[1], "comment") == "bulk"